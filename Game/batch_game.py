@@ -0,0 +1,217 @@
+import numpy as np
+from typing import Dict, List, Optional, Union
+from Graph.compiled_graph import CompiledGraph, WINNER_TOP
+from Graph.graph_cache import get_compiled_graph
+from recorder import TrajectoryRecorder
+
+# position 94 is 'symmetric staggered standing', the node GameState.initialize starts half of all games from
+START_NODE = 94
+# edge index passed to BatchGame.step for a game whose player has no legal move and passes the turn
+PASS = -1
+# values of BatchGame.winner
+NO_WINNER, PLAYER1, PLAYER2 = -1, 0, 1
+# values of BatchGame.end_reason
+NOT_OVER, TAPPED, WINNING_POSITION, POINTS, TIE = 0, 1, 2, 3, 4
+
+
+class BatchGame:
+    """
+    Plays N matches in lockstep, holding the state of every match in NumPy arrays:
+
+        node: current node of each game
+        mover: player whose turn it is (PLAYER1 or PLAYER2)
+        mover_top: whether the player to move is on top. The other player is always in the opposite position
+        scores: (N, 2) points of player 1 and player 2
+        turn: turns played so far
+        done: games that are over
+        winner / end_reason: result of finished games (NO_WINNER for ties)
+
+    The rules are the same as Game.play_turn: points are added to the player that moved, a tap ends the game in
+    favour of the other player, reaching a 'winner' node ends the game in favour of the player in that position
+    before any swap, swapping moves exchange top and bottom, a player without a legal move passes, games that land on
+    a node without outgoing edges restart from a random position, and games that reach max_turns are decided on points
+
+    Every match started by reset gets a new id in game_ids, counting up from next_game_id. If a recorder is set, step
+    records the turn of every unfinished match to it under that id
+    """
+    def __init__(self, num_games: int, max_turns: int = 100,
+                 graph: Optional[CompiledGraph] = None, seed: Union[int, np.random.SeedSequence, None] = None,
+                 recorder: Optional[TrajectoryRecorder] = None):
+        self.graph = graph if graph is not None else get_compiled_graph()
+        self.num_games = num_games
+        self.max_turns = max_turns
+        self.rng = np.random.default_rng(seed)
+        self.recorder = recorder
+        self.next_game_id = 0
+
+        legal_moves = self.graph.legal_moves
+        self.legal_offsets, self.legal_edges, self.legal_counts = legal_moves.offsets, legal_moves.edges, legal_moves.counts
+        self.out_degree = np.diff(self.graph.offsets)
+        self.points = self.graph.points.astype(np.int32)
+        self._points_or_pass = np.append(self.points, 0).astype(np.int16)
+
+        self.node = np.zeros(num_games, dtype=np.int32)
+        self.mover = np.zeros(num_games, dtype=np.int8)
+        self.mover_top = np.zeros(num_games, dtype=bool)
+        self.scores = np.zeros((num_games, 2), dtype=np.int32)
+        self.turn = np.zeros(num_games, dtype=np.int32)
+        self.done = np.zeros(num_games, dtype=bool)
+        self.winner = np.full(num_games, NO_WINNER, dtype=np.int8)
+        self.end_reason = np.zeros(num_games, dtype=np.int8)
+        self.games = np.arange(num_games)
+        self.game_ids = np.arange(num_games, dtype=np.int64)
+
+    def reset(self, nodes: Optional[np.ndarray] = None, player1_top: Optional[np.ndarray] = None,
+              first_mover: Optional[np.ndarray] = None, games: Optional[np.ndarray] = None,
+              scores: Optional[np.ndarray] = None, turns: Optional[np.ndarray] = None):
+        """
+        Starts every match, or only the matches selected by `games` (indices or a boolean mask). Unless given
+        explicitly, the start node, player 1's position and the first player are drawn the same way as
+        Game.initialize_game. Matches start without points at turn 0, unless they continue from the given (n, 2)
+        scores and turns already played
+        """
+        games = self.games if games is None else self.games[games]
+        n = len(games)
+        if nodes is None:
+            nodes = self._respawn_nodes(n)
+        if player1_top is None:
+            player1_top = self.rng.random(n) < 0.5
+        if first_mover is None:
+            first_mover = self.rng.integers(2, size=n)
+        player1_top = np.asarray(player1_top, dtype=bool)
+        self.node[games] = nodes
+        self.mover[games] = first_mover
+        self.mover_top[games] = np.where(self.mover[games] == PLAYER1, player1_top, ~player1_top)
+        self.scores[games] = 0 if scores is None else scores
+        self.turn[games] = 0 if turns is None else turns
+        self.done[games] = False
+        self.winner[games] = NO_WINNER
+        self.end_reason[games] = NOT_OVER
+        self.game_ids[games] = self.next_game_id + np.arange(n)
+        self.next_game_id += n
+        self._respawn()
+
+    def _respawn_nodes(self, count: int) -> np.ndarray:
+        """random restart positions, drawn the same way as GameState.initialize"""
+        return np.where(self.rng.random(count) < 0.5, START_NODE, self.rng.integers(self.graph.num_nodes, size=count))
+
+    def _respawn(self):
+        # matches stuck on a node without outgoing edges move to a random position, like Game.play_turn does
+        stuck = ~self.done & (self.out_degree[self.node] == 0)
+        while stuck.any():
+            self.node[stuck] = self._respawn_nodes(int(stuck.sum()))
+            stuck &= self.out_degree[self.node] == 0
+
+    @property
+    def states(self) -> np.ndarray:
+        """state index node*2 + is_top of the player to move, matching gym_env.state_to_index"""
+        return self.node * 2 + self.mover_top
+
+    def sample_random_moves(self) -> np.ndarray:
+        """a uniformly random legal edge for every game (PASS if there is none), like Player.choose_move"""
+        states = self.states
+        counts = self.legal_counts[states]
+        choice = (self.rng.random(self.num_games) * counts).astype(np.int32)
+        moves = self.legal_edges[np.minimum(self.legal_offsets[states] + choice, len(self.legal_edges) - 1)]
+        return np.where(counts > 0, moves, PASS)
+
+    def step(self, edges: np.ndarray) -> np.ndarray:
+        """
+        Plays one turn in every unfinished game. edges holds the chosen edge index per game (PASS to pass the turn);
+        entries for finished games are ignored. Returns the done mask
+        """
+        edges = np.asarray(edges)
+        playing = ~self.done
+        moved = playing & (edges >= 0)
+        games, moves = self.games[moved], edges[moved]
+        movers = self.mover[moved]
+        if self.recorder is not None:
+            rows = self._record_turns(playing, edges)
+
+        self.scores[games, movers] += self.points[moves]
+        new_nodes = self.graph.targets[moves]
+        self.node[games] = new_nodes
+
+        # the player who moves along a tap edge loses
+        tapped = self.graph.tap[moves]
+        self._finish(games[tapped], 1 - movers[tapped], TAPPED)
+        # winning positions are awarded using the positions from before the move's swap
+        node_winner = self.graph.winner[new_nodes]
+        mover_top = self.mover_top[games]
+        reached = ~tapped & (node_winner != 0)
+        mover_won = (node_winner == WINNER_TOP) == mover_top
+        self._finish(games[reached], np.where(mover_won, movers, 1 - movers)[reached], WINNING_POSITION)
+        self.mover_top[games] ^= self.graph.swaps[moves]
+
+        # the other player moves next, from the opposite position
+        self.mover[playing] = 1 - self.mover[playing]
+        self.mover_top[playing] = ~self.mover_top[playing]
+        self.turn[playing] += 1
+
+        out_of_turns = ~self.done & (self.turn >= self.max_turns)
+        if out_of_turns.any():
+            self._finish_on_points(out_of_turns)
+        if self.recorder is not None:
+            self._record_end_reasons(rows)
+        self._respawn()
+        return self.done
+
+    def _record_turns(self, playing: np.ndarray, edges: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        records the turn about to be played in every unfinished game, from the state it is played in. Values are
+        gathered straight into the recorder's chunk; the end reasons are filled in by _record_end_reasons once known
+        """
+        played = slice(None) if playing.all() else np.flatnonzero(playing)
+        count = self.num_games if isinstance(played, slice) else len(played)
+        if count > self.recorder.chunk_size:
+            rows = {name: np.empty(count, dtype=values.dtype) for name, values in self.recorder.columns.items()}
+        else:
+            rows = self.recorder.reserve(count)
+        for name, values in (('game', self.game_ids), ('turn', self.turn), ('node', self.node), ('edge', edges),
+                             ('player', self.mover), ('on_top', self.mover_top)):
+            rows[name][...] = values[played]
+        rows['turn'] += 1
+        # passes index the 0 appended after the last edge's points
+        np.take(self._points_or_pass, rows['edge'], out=rows['points'])
+        rows['played'] = played
+        return rows
+
+    def _record_end_reasons(self, rows: Dict[str, np.ndarray]):
+        rows['end_reason'][...] = self.end_reason[rows.pop('played')]
+        if len(rows['game']) > self.recorder.chunk_size:
+            self.recorder.record_batch(**rows)
+
+    def _finish(self, games: np.ndarray, winners: np.ndarray, reason: int):
+        self.done[games] = True
+        self.winner[games] = winners
+        self.end_reason[games] = reason
+
+    def _finish_on_points(self, games: np.ndarray):
+        player1, player2 = self.scores[games, 0], self.scores[games, 1]
+        self.done[games] = True
+        self.winner[games] = np.where(player1 > player2, PLAYER1, np.where(player2 > player1, PLAYER2, NO_WINNER))
+        self.end_reason[games] = np.where(player1 == player2, TIE, POINTS)
+
+    def play_random(self) -> np.ndarray:
+        """plays every match to the end with random players and returns the winners"""
+        self.reset()
+        while not self.done.all():
+            self.step(self.sample_random_moves())
+        return self.winner
+
+    def results(self, name_prefix: str = 'Game') -> List[Dict]:
+        """per-game results in the same format as Simulation.play_single_game"""
+        results = []
+        for game in range(self.num_games):
+            game_name = f'{name_prefix}_{game}'
+            player_names = (f'Player1_{game_name}', f'Player2_{game_name}')
+            results.append({
+                'game_name': game_name,
+                'player1_name': player_names[0],
+                'player2_name': player_names[1],
+                'winner': player_names[self.winner[game]] if self.winner[game] != NO_WINNER else 'Tie',
+                'player1_points': int(self.scores[game, 0]),
+                'player2_points': int(self.scores[game, 1]),
+                'num_turns': int(self.turn[game])
+            })
+        return results
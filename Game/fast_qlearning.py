@@ -0,0 +1,227 @@
+import time
+import numpy as np
+from typing import Optional, Union
+from Graph.compiled_graph import CompiledGraph, WINNER_TOP
+from Graph.graph_cache import get_compiled_graph
+from batch_game import BatchGame, START_NODE, PASS
+from vector_env import WIN_REWARD, mover_rewards
+
+try:
+    from numba import njit
+except ImportError:  # numba is optional, the trainer falls back to the same loop in plain Python
+    njit = None
+
+
+def _train_episodes(q_table, starts, randoms, max_turns, learning_rate, discount_factor, epsilon,
+                    legal_offsets, legal_counts, legal_edges, targets, points, tap, swaps, winner) -> int:
+    """
+    Runs the q_learning TD loop over a block of episodes and returns the number of updates made. starts[episode]
+    holds the start node and whether the first player to move is on top, randoms[episode][turn] the two uniforms
+    that choose between exploring and exploiting and pick the exploratory move.
+
+    The rules are those of BJJEnv.step: a game ends on a tap, on a winning position (after which it is given to the
+    points leader, if there is one) or after max_turns + 1 steps, and an episode also stops as soon as the player to
+    move has no legal move. Like q_learning, the next state is bootstrapped even at the end of an episode, and a next
+    state without legal moves contributes q_table[next_state][0], since np.argmax of an all -inf row is 0.
+
+    This function is compiled with numba when it is installed and otherwise runs as is, on lists
+    """
+    num_updates = 0
+    for episode in range(len(starts)):
+        node = starts[episode][0]
+        top = starts[episode][1] == 1
+        mover_score = 0
+        other_score = 0
+        for turn in range(max_turns + 1):
+            state = node * 2 + top
+            count = legal_counts[state]
+            if count == 0:
+                break
+            offset = legal_offsets[state]
+            if randoms[episode][turn][0] < epsilon:
+                action = legal_edges[offset + int(randoms[episode][turn][1] * count)]
+            else:
+                # greedy move, the first of the best legal moves like np.argmax of the masked Q-values
+                action = legal_edges[offset]
+                best = q_table[state][action]
+                for index in range(offset + 1, offset + count):
+                    edge = legal_edges[index]
+                    if q_table[state][edge] > best:
+                        best = q_table[state][edge]
+                        action = edge
+
+            target = targets[action]
+            mover_score += points[action]
+            game_over = False
+            mover_won = False
+            if tap[action]:
+                game_over = True
+            elif winner[target] != 0:
+                game_over = True
+                mover_won = (winner[target] == WINNER_TOP) == top
+            if game_over:
+                # BJJEnv.step awards a finished game to the points leader
+                if mover_score != other_score:
+                    mover_won = mover_score > other_score
+                reward = mover_score - other_score + 0.5 * top
+                if mover_won:
+                    reward += WIN_REWARD
+            else:
+                # positions are swapped, then the other player moves
+                top = top == swaps[action]
+                mover_score, other_score = other_score, mover_score
+                reward = mover_score - other_score + 0.5 * top
+            next_state = target * 2 + top
+
+            next_offset = legal_offsets[next_state]
+            next_value = q_table[next_state][0]
+            if legal_counts[next_state] > 0:
+                next_value = q_table[next_state][legal_edges[next_offset]]
+                for index in range(next_offset + 1, next_offset + legal_counts[next_state]):
+                    next_value = max(next_value, q_table[next_state][legal_edges[index]])
+            q_table[state][action] += learning_rate * (reward + discount_factor * next_value - q_table[state][action])
+            num_updates += 1
+
+            node = target
+            if game_over or turn >= max_turns:
+                break
+    return num_updates
+
+
+_train_episodes_jit = njit(cache=True)(_train_episodes) if njit is not None else None
+
+
+class QTrainer:
+    """
+    Tabular Q-learning straight over the compiled graph arrays, with the same states (node*2 + is_top), actions (edge
+    indices) and TD update as gym_env.q_learning, but without the gym env, observation dicts or per-step mask
+    allocations. Moves are chosen through the graph's legal-move index.
+
+    Episodes are trained in blocks of block_size, whose start positions and uniforms are drawn from `seed` into
+    preallocated buffers before the block runs. The loop itself runs under numba when it is installed (use_numba=None
+    picks it automatically), and both paths give the same Q-table for the same seed
+    """
+    def __init__(self, graph: Optional[CompiledGraph] = None, learning_rate: float = 0.1,
+                 discount_factor: float = 0.95, epsilon: float = 0.5, max_turns: int = 100,
+                 seed: Union[int, np.random.SeedSequence, None] = None, use_numba: Optional[bool] = None,
+                 block_size: int = 1024):
+        if use_numba and njit is None:
+            raise ImportError('use_numba=True requires numba')
+        self.graph = graph if graph is not None else get_compiled_graph()
+        self.learning_rate = learning_rate
+        self.discount_factor = discount_factor
+        self.epsilon = epsilon
+        self.max_turns = max_turns
+        self.rng = np.random.default_rng(seed)
+        self.use_numba = njit is not None if use_numba is None else use_numba
+        self.block_size = block_size
+        self.q_table = np.zeros((self.graph.num_nodes * 2, self.graph.num_edges))
+        self.num_updates = 0
+        self.elapsed = 0.0
+
+        legal_moves = self.graph.legal_moves
+        graph_arrays = (legal_moves.offsets, legal_moves.counts, legal_moves.edges, self.graph.targets,
+                        self.graph.points.astype(np.int64), self.graph.tap, self.graph.swaps, self.graph.winner)
+        # numba wants arrays, while the plain Python loop is much faster on lists
+        self._graph_arrays = graph_arrays if self.use_numba else tuple(array.tolist() for array in graph_arrays)
+        self._starts = np.zeros((block_size, 2), dtype=np.int64)
+        self._randoms = np.zeros((block_size, max_turns + 1, 2))
+
+    def _draw_block(self, num_episodes: int):
+        """start positions drawn like Game.initialize_game, and the uniforms of every possible step"""
+        starts, randoms = self._starts[:num_episodes], self._randoms[:num_episodes]
+        respawn = self.rng.random(num_episodes) < 0.5
+        starts[:, 0] = np.where(respawn, START_NODE, self.rng.integers(self.graph.num_nodes, size=num_episodes))
+        starts[:, 1] = self.rng.integers(2, size=num_episodes)
+        self.rng.random(out=randoms)
+        return starts, randoms
+
+    def train(self, num_episodes: int) -> np.ndarray:
+        """trains for num_episodes more episodes and returns the Q-table"""
+        start = time.perf_counter()
+        q_table = self.q_table if self.use_numba else self.q_table.tolist()
+        train_episodes = _train_episodes_jit if self.use_numba else _train_episodes
+        for first in range(0, num_episodes, self.block_size):
+            starts, randoms = self._draw_block(min(self.block_size, num_episodes - first))
+            if not self.use_numba:
+                starts, randoms = starts.tolist(), randoms.tolist()
+            self.num_updates += train_episodes(q_table, starts, randoms, self.max_turns, self.learning_rate,
+                                               self.discount_factor, self.epsilon, *self._graph_arrays)
+        if not self.use_numba:
+            self.q_table[...] = q_table
+        self.elapsed += time.perf_counter() - start
+        return self.q_table
+
+    def learn(self, num_episodes: int, batch_size: int = 4096, collisions: str = 'mean') -> np.ndarray:
+        """
+        Trains for num_episodes more episodes, batch_size of them at a time on a BatchGame, and returns the Q-table.
+
+        Every step picks the moves of all unfinished episodes at once: an epsilon share of random legal moves, and
+        otherwise the greedy move, found with one masked argmax over the graph's padded legal-move table. The TD
+        updates of the step are then applied together from the same Q-table. When several episodes update the same
+        (state, action) pair, collisions='mean' applies their average, while 'sum' adds them all up (np.add.at). Summing
+        scales the learning rate by the number of collisions, so it is only stable when they are rare.
+
+        Episodes follow BatchGame's rules and get BJJVectorEnv's rewards. Like q_learning, a move is bootstrapped
+        from the state of the player to move next, but not past the end of an episode, and players that pass don't
+        update. Finished episodes are replaced by new ones until num_episodes have been started
+        """
+        if collisions not in ('sum', 'mean'):
+            raise ValueError(f"collisions must be 'sum' or 'mean', not {collisions!r}")
+        start = time.perf_counter()
+        batch_size = min(batch_size, num_episodes)
+        batch = BatchGame(batch_size, max_turns=self.max_turns, graph=self.graph, seed=self.rng.spawn(1)[0])
+        legal_counts, padded = self.graph.legal_moves.counts, self.graph.legal_moves.padded
+        flat_q = self.q_table.reshape(-1)
+        num_actions = self.graph.num_edges
+        # Q-values of each game's legal moves, padded with -inf
+        values = np.empty((batch_size, padded.shape[1]))
+        batch.reset()
+        started = batch_size
+
+        while not batch.done.all():
+            playing = ~batch.done
+            states = batch.states
+            # greedy moves: the first best legal move of each state, like np.argmax over the masked Q-values
+            legal_edges = padded[states]
+            np.take(flat_q, states[:, None] * num_actions + legal_edges, out=values, mode='clip')
+            values[legal_edges < 0] = -np.inf
+            greedy = legal_edges[batch.games, values.argmax(axis=1)]
+            explore = self.rng.random(batch_size) < self.epsilon
+            edges = np.where(explore, batch.sample_random_moves(), greedy)
+            edges = np.where(legal_counts[states] > 0, edges, PASS)
+
+            movers, mover_top = batch.mover.copy(), batch.mover_top.copy()
+            batch.step(edges)
+            rewards = mover_rewards(batch, movers, mover_top, edges)
+
+            updated = playing & (edges != PASS)
+            next_states = batch.states[updated]
+            next_edges = padded[next_states]
+            next_values = np.take(flat_q, next_states[:, None] * num_actions + next_edges, mode='clip')
+            next_values[next_edges < 0] = -np.inf
+            next_value = np.where(legal_counts[next_states] > 0, next_values.max(axis=1, initial=-np.inf), 0)
+            next_value[batch.done[updated]] = 0
+
+            pairs = states[updated] * num_actions + edges[updated]
+            td_errors = rewards[updated] + self.discount_factor * next_value - flat_q[pairs]
+            if collisions == 'sum':
+                np.add.at(flat_q, pairs, self.learning_rate * td_errors)
+            else:
+                unique_pairs, inverse = np.unique(pairs, return_inverse=True)
+                flat_q[unique_pairs] += self.learning_rate * (np.bincount(inverse, weights=td_errors) /
+                                                              np.bincount(inverse))
+            self.num_updates += len(pairs)
+
+            finished = np.flatnonzero(batch.done & playing)
+            if started < num_episodes and len(finished):
+                restart = finished[:num_episodes - started]
+                batch.reset(games=restart)
+                started += len(restart)
+
+        self.elapsed += time.perf_counter() - start
+        return self.q_table
+
+    @property
+    def updates_per_second(self) -> float:
+        return self.num_updates / self.elapsed if self.elapsed else 0.0
@@ -0,0 +1,62 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# verbosity levels, from least to most output
+QUIET = 0     # bulk simulation: no events are formatted, stored or printed
+RESULTS = 1   # how each game ended and the final scores
+VERBOSE = 2   # full turn-by-turn narration
+
+# narration of every structured event, used to print it when the log's level includes the event
+EVENT_FORMATS = {
+    'game_start': 'Initializing game: {game}',
+    'position_assigned': '{player} is on {role}',
+    'turn_start': '\nTurn {turn}:',
+    'moved_to': 'moving to position {description}',
+    'maneuver': '{maneuver} executed, player wins {points} points',
+    'move': "{player} performed '{description}'",
+    'points_earned': 'Player earned {points} points for that move',
+    'dead_end': 'Terminal position encountered. switching to random position ',
+    'no_moves': 'No moves available for {player}. Switching players.',
+    'tapped': '{player} tapped - {winner} has won! ',
+    'winning_position': '{winner} won by reaching a winning position!',
+    'points_win': '{winner} wins!',
+    'tie': "It's a tie!",
+    'game_over': '\nGame over! Final scores:\n{player1}: {player1_points}\n{player2}: {player2_points}',
+    'simulation_stage': '{stage}',
+}
+EVENT_LEVELS = {event: VERBOSE for event in EVENT_FORMATS}
+EVENT_LEVELS.update({'tapped': RESULTS, 'winning_position': RESULTS, 'points_win': RESULTS, 'tie': RESULTS,
+                     'game_over': RESULTS})
+
+
+class GameLog:
+    """
+    Leveled log of structured game events.
+
+    Call sites check the `verbose` / `results` flags before building an event, so at the QUIET level the game loop
+    does no string formatting, event construction or I/O. Enabled events are narrated through `sink` (print by default)
+    and, if `record` is set, also kept as (event, fields) tuples in `events`
+    """
+    def __init__(self, level: int = QUIET, sink: Optional[Callable[[str], Any]] = print, record: bool = False):
+        self.level = level
+        self.verbose = level >= VERBOSE
+        self.results = level >= RESULTS
+        self.sink = sink
+        self.events: Optional[List[Tuple[str, Dict[str, Any]]]] = [] if record else None
+
+    def emit(self, event: str, **fields):
+        if EVENT_LEVELS[event] > self.level:
+            return
+        if self.events is not None:
+            self.events.append((event, fields))
+        if self.sink is not None:
+            self.sink(narrate(event, fields))
+
+
+def narrate(event: str, fields: Dict[str, Any]) -> str:
+    """the text the game used to print for this event"""
+    return EVENT_FORMATS[event].format(**fields)
+
+
+def as_log(log) -> GameLog:
+    """accepts a GameLog or a verbosity level"""
+    return log if isinstance(log, GameLog) else GameLog(level=log)
@@ -2,24 +2,37 @@ import gymnasium as gym
 from gymnasium import spaces
 import numpy as np
 from play_game import Game, Board, GameState, Player, tqdm
-from typing import List, Tuple, Dict, Optional, Any
+from game_log import GameLog, QUIET
+from observation import ObservationEncoder
+from state_encoding import Q_DTYPE, StateEncoder, make_encoder, make_q_table
+from typing import List, Tuple, Dict, Optional, Any, Union
 import random
 def bool_to_int(value: bool) -> int:
     return 1 if value else 0
 class BJJEnv(gym.Env):
-    def __init__(self):
-        self.game = Game("BJJ Match")
+    def __init__(self, verbosity: Union[int, GameLog] = QUIET, board: Optional[Board] = None,
+                 observation: str = 'dict'):
+        """
+        verbosity selects the game_log level of the matches played in this env; training runs quiet by default.
+        observation is one of observation.OBSERVATION_MODES: 'dict' observations are dicts of scalars, and 'flat' and
+        'one_hot' ones are vectors written into a buffer that is reused, and overwritten, on every step
+        """
+        self.verbosity = verbosity
+        self.observation = observation
+        self.game = Game("BJJ Match", board=board, verbosity=verbosity)
         self.game.initialize_game("Player1", "Player2")
         self.G = self.game.board.graph
+        self.compiled = self.game.board.compiled
 
-        # Get edge IDs and create a mapping
-        self.edge_ids = [data['id'] for _, _, data in self.G.edges(data=True)]
+        # Actions are edge indices of the compiled graph. Keep a mapping to the GrappleMap edge IDs
+        self.edge_ids = self.compiled.edge_ids.tolist()
         self.id_to_index = {id: index for index, id in enumerate(self.edge_ids)}
         self.index_to_id = {index: id for index, id in enumerate(self.edge_ids)}
-        self.edge_id_to_nodes = {data['id']: (start, end) for start, end, data in self.G.edges(data=True)}
+        self.edge_id_to_nodes = {self.edge_ids[index]: self.compiled.edge_endpoints(index)
+                                 for index in range(self.compiled.num_edges)}
 
         # get node IDs
-        self.num_nodes = max(self.G.nodes())
+        self.num_nodes = self.compiled.num_nodes
 
         # Define action space
         self.action_space = spaces.Discrete(len(self.edge_ids))
@@ -49,6 +62,10 @@ class BJJEnv(gym.Env):
             'on_bottom': spaces.Discrete(2),
             'turns_left': spaces.Box(low=0, high=self.game.max_turns, shape=(1,), dtype=int)
         })
+        self._encoder = None
+        if observation != 'dict':
+            self._encoder = ObservationEncoder(observation, self.num_nodes, self.game.max_turns)
+            self.observation_space = self._encoder.space
 
     def _get_state(self):
         # Return the full state (not directly used by the agent)
@@ -61,10 +78,13 @@ class BJJEnv(gym.Env):
             "turn_num": self.game.turn_count,
         }
 
-    def _get_obs(self) -> Dict[str, Any]:
+    def _get_obs(self) -> Union[Dict[str, Any], np.ndarray]:
         current_player = self.game.current_player
         other_player = self.game.choose_other_player(current_player)
 
+        if self._encoder is not None:
+            return self._encoder.encode(self.game.game_state.current_node, current_player.points - other_player.points,
+                                        current_player.is_top, self.game.max_turns - self.game.turn_count)
         return {
             'current_position': self.game.game_state.current_node,
             'point_difference': current_player.points - other_player.points,
@@ -76,69 +96,56 @@ class BJJEnv(gym.Env):
 
     def _get_action_mask(self) -> np.ndarray:
         """
-        Creates action mask for the current player based on the legal moves available to them
+        Returns the action mask for the current player based on the legal moves available to them
 
         Returns:
-        np.ndarray: A boolean array of shape (n,) where n is the total number of moves in the game (~700).
+        np.ndarray: A read-only boolean array of shape (n,) where n is the total number of moves in the game (~700).
                     Each element is either 0 (False) or 1 (True), where:
                     - 1 (True) indicates a legal move
                     - 0 (False) indicates an illegal move
+                    The array is a row of the graph's precomputed mask table, so it is not copied for every step
         """
-        possible_moves = self.game.game_state.get_possible_moves(
-            self.game.current_player.is_top,
-            self.game.current_player.is_bottom
-        )
-        mask = np.zeros(len(self.edge_ids), dtype=bool)  # mask is length of all possible actions in the entire game
-        for move in possible_moves:
-            #sets only the legal moves to 1
-            edge_id = move[1]['id']
-            mask[self.id_to_index[edge_id]] = 1
-        return mask
+        state = self.game.game_state.current_node * 2 + self.game.current_player.is_top
+        return self.compiled.legal_moves.masks[state]
     def reset(self, seed=None, **kwargs) -> Tuple[Dict[str, Any], Dict[str, Any]]:
 
         super().reset(seed=seed)  # Reset the RNG if a seed is provided
 
-        # Fully reset the game
-        self.game = Game("BJJ Match")  # Create a new game instance
-        self.game.board = Board(self.G)  # Reset the board with the graph
-        self.game.game_state = GameState(self.game.board)  # Reset the game state
-        self.game.turn_count = 0
-
-        # Reinitialize the game
-        self.game.initialize_game("Player1", "Player2")
+        # Start a new match in the same game: the board and players are kept, and only the match state is reset
+        self.game.reset()
 
         return self._get_obs(), {"action_mask": self._get_action_mask()}
 
     def step(self, action: int) -> Tuple[Dict[str, Any], float, bool, bool, Dict[str, Any]]:
-        edge_id = self.index_to_id[action]
-        if edge_id >= len(self.edge_ids):
+        if not 0 <= action < len(self.edge_ids):
             # Invalid action, end turn without making a move
             self.game.switch_players()
             return self._get_obs(), -1, False, False, {}
-        (start, end) = self.edge_id_to_nodes[edge_id]
-        move = (start, self.game.board.get_edge_data(start, end))
-        game_over = self.game.play_turn(move)
+        game_over = self.game.play_turn(int(action))
 
         if game_over:
             self.game.check_for_points_win()
 
         obs = self._get_obs()
-        reward = self._calculate_reward(obs)
+        reward = self._calculate_reward()
         done = game_over or self.game.turn_count >= self.game.max_turns or self.game.winner is not None
 
         self.game.turn_count += 1
         return obs, reward, done, False, {"action_mask": self._get_action_mask()}
 
 
-    def _calculate_reward(self, obs) -> float:
+    def _calculate_reward(self) -> float:
+        # from the game rather than the observation, which can be in any of the observation modes
+        current_player = self.game.current_player
+        other_player = self.game.choose_other_player(current_player)
         reward = 0
         if self.game.winner == self.game.current_player:
             reward += 300
         elif self.game.winner == self.game.current_player:
             reward -= 300
 
-        reward += 1*obs['point_difference']
-        reward += + 0.5*obs['on_top']
+        reward += 1*(current_player.points - other_player.points)
+        reward += + 0.5*bool_to_int(current_player.is_top)
         return reward
     def render(self, mode='human'):
         print(
@@ -156,7 +163,8 @@ def state_to_index(state=None, position=None, is_top=None) -> int:
         position (int, optional): current node
         is_top (int, optional): relative top/bottom position of current player
 
-    Identifies unique index value for Q-table that encodes absolute position of current player and top/bottom position
+    Identifies unique index value for Q-table that encodes absolute position of current player and top/bottom position,
+    like the 'node_role' encoder of state_encoding, whose other encoders also encode the score and turns left
     Optional parameter lets you explicitly pass in an observation to identify the index, but will return the
     current state's observation by default
     """
@@ -190,22 +198,43 @@ def get_masked_q_values(q_values: np.ndarray, action_mask: np.ndarray) -> np.nda
     """
     assert q_values.shape == action_mask.shape, \
         'Q-values and action masks lengths need to have the same shape for accurate element-wise operations'
-    return q_values - (np.inf * (1 - action_mask))
-def q_learning(env: BJJEnv, num_episodes, learning_rate=0.1, discount_factor=0.95, epsilon=0.5):
-    """
-    initializes Q-table to have dimensions of num_states x num_actions, where each unique
-    combination of current node and relative position constitutes a unique state (e.g. node 237
-    and current player on top vs node 237 and current player on bottom)
+    # np.where rather than q - inf*(1-mask): inf*0 is nan, which used to hide the Q-values of every legal move
+    return np.where(action_mask, q_values, -np.inf)
+
+
+def q_update(q_table: np.ndarray, state_index: int, action: int, reward: float, next_state_index: int,
+             next_action_mask: np.ndarray, learning_rate: float, discount_factor: float):
+    """Q-learning update of q_table[state_index, action], using the masked Q-values of the next state"""
+    next_masked_q_values = get_masked_q_values(q_table[next_state_index], next_action_mask)
+    best_next_action = np.argmax(next_masked_q_values)
 
-    Note that this is a significantly lower dimensional state space that the observed BJJEnv one, and doesn't encode
-    information that could potentially change how the agent acts, such as how many turns are left or the point
-    difference between players.
+    td_target = reward + discount_factor * q_table[next_state_index][best_next_action]
+    td_error = td_target - q_table[state_index][action]
+    q_table[state_index][action] += learning_rate * td_error
+
+
+def q_learning(env: BJJEnv, num_episodes, learning_rate=0.1, discount_factor=0.95, epsilon=0.5,
+               encoder: Union[str, StateEncoder] = 'node_role', dtype=None, sparse: Optional[bool] = None):
+    """
+    Trains a Q-table with one row per state of `encoder`, a state_encoding.StateEncoder or the name of a registered
+    one. The default 'node_role' encoding gives each unique combination of current node and relative position a
+    row (e.g. node 237 and current player on top vs node 237 and current player on bottom). Note that this is a
+    significantly lower dimensional state space that the observed BJJEnv one: 'node_role_score', 'node_role_turns'
+    and 'hashed_cross' also encode the point difference and/or how many turns are left.
+
+    dtype and sparse are passed on to state_encoding.make_q_table. dtype=None keeps the float64 tables of the original
+    q_learning for 'node_role', and gives the other encodings Q_DTYPE tables, which take half the memory. sparse=None
+    stores the table as a SparseQTable only when a dense one would be too large for the encoding, so 'node_role' tables
+    stay dense
     """
 
     # Initialize Q-table
-    num_states = env.num_nodes * 2   # positions * (top/bottom)
+    if isinstance(encoder, str):
+        encoder = make_encoder(encoder, env.num_nodes, env.game.max_turns)
+    if dtype is None:
+        dtype = np.float64 if encoder.name == 'node_role' else Q_DTYPE
     num_actions = env.action_space.n
-    q_table = np.zeros((num_states, num_actions))
+    q_table = make_q_table(encoder.num_states, num_actions, dtype=dtype, sparse=sparse)
 
     for episode in tqdm(range(num_episodes)):
         state_obs, info = env.reset()
@@ -216,26 +245,19 @@ def q_learning(env: BJJEnv, num_episodes, learning_rate=0.1, discount_factor=0.9
                 print('no valid moves available. Ending episode')
                 break
 
-            state_index = state_to_index(state_obs)
+            state_index = encoder.encode_observation(state_obs)
 
             if np.random.random() < epsilon:
                 # exploratory move. Action space masked so that randomly chosen move is not invalid
                 action = np.random.choice(np.where(info['action_mask'])[0])
             else:
                 # sets all invalid moves to Q-value of -np.inf to avoid them being selected
-                masked_q_values = get_masked_q_values(q_table[state_index,:], info['action_mask'])
+                masked_q_values = get_masked_q_values(q_table[state_index], info['action_mask'])
                 action = np.argmax(masked_q_values)
 
             next_state_obs, reward, done, _, info = env.step(action)
-            next_state_index = state_to_index(next_state_obs)
-
-            # Q-learning update using the masked Q-values for the next state
-            next_masked_q_values = get_masked_q_values(q_table[next_state_index], info['action_mask'])
-            best_next_action = np.argmax(next_masked_q_values)
-
-            td_target = reward + discount_factor * q_table[next_state_index][best_next_action]
-            td_error = td_target - q_table[state_index][action]
-            q_table[state_index][action] += learning_rate * td_error
+            q_update(q_table, state_index, action, reward, encoder.encode_observation(next_state_obs),
+                     info['action_mask'], learning_rate, discount_factor)
 
             state_obs = next_state_obs
 
@@ -277,18 +299,13 @@ class QLearningAgent:
             state_index = state_to_index(state_obs)
             return self.q_table[state_index, action]
 
-    def choose_action(self, state: int, possible_moves: List[Tuple[int, Dict]]) -> Tuple[int, Dict]:
+    def choose_action(self, state: int, possible_moves: List[int]) -> int:
         # Explore
         if np.random.rand() <= self.exploration_rate:
             return random.choice(possible_moves)
 
-        # Exploit
-        move_indices = []
-        for move in possible_moves:
-            move_index = self.env.id_to_index[move[1]['id']]
-            move_indices.append(move_index)
-
-        q_values = [self.get_q_value(move) for move in move_indices]
+        # Exploit: possible moves are already edge indices, i.e. actions
+        q_values = [self.get_q_value(move) for move in possible_moves]
         max_q = max(q_values)
 
         best_moves = [move for move, q in zip(possible_moves, q_values) if q == max_q] #to break any potential ties
@@ -296,10 +313,10 @@ class QLearningAgent:
         return random.choice(best_moves)
 
     def update(self, state: int, action: int, reward: float, next_state: int,
-               next_possible_moves: List[Tuple[int, Dict]]):
+               next_possible_moves: List[int]):
         current_q = self.get_q_value(action)
         if next_possible_moves:
-            max_next_q = max(self.get_q_value(next_state, move[0]) for move in next_possible_moves)
+            max_next_q = max(self.get_q_value(next_state, move) for move in next_possible_moves)
         else:
             max_next_q = 0
 
@@ -309,21 +326,25 @@ class QLearningAgent:
         self.exploration_rate = max(self.exploration_min, self.exploration_rate * self.exploration_decay)
 
 
-# Example usage
-env = BJJEnv()
-q_table = q_learning(env, num_episodes=100)
+if __name__ == "__main__":
+    from Graph.graph_cache import format_load_report, get_load_report
+
+    # Example usage
+    env = BJJEnv()
+    print(format_load_report(get_load_report()))
+    q_table = q_learning(env, num_episodes=100)
 
-# Test the learned policy
-state, info = env.reset()
-done = False
-total_reward = 0
+    # Test the learned policy
+    state, info = env.reset()
+    done = False
+    total_reward = 0
 
-while not done:
-    state_index = state_to_index(state)
-    masked_q_values = get_masked_q_values(q_table[state_index], info['action_mask'])
-    action = np.argmax(masked_q_values)
-    state, reward, done, _, info = env.step(action)
-    total_reward += reward
+    while not done:
+        state_index = state_to_index(state)
+        masked_q_values = get_masked_q_values(q_table[state_index], info['action_mask'])
+        action = np.argmax(masked_q_values)
+        state, reward, done, _, info = env.step(action)
+        total_reward += reward
 
 
-print(f"Total reward: {total_reward}")
\ No newline at end of file
+    print(f"Total reward: {total_reward}")
\ No newline at end of file
@@ -0,0 +1,231 @@
+import argparse
+import functools
+import json
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# histogram buckets are powers of two of nanoseconds: bucket b counts durations in [2^(b-1), 2^b) ns
+NUM_BUCKETS = 64
+
+
+def default_phases() -> Dict[str, Tuple[Any, str]]:
+    """the hot paths timed by default, as phase name -> (class or module, attribute)"""
+    import gym_env
+    from game_log import GameLog
+    from gym_env import BJJEnv
+    from play_game import Game, GameState, Player
+    return {
+        'Game.play_turn': (Game, 'play_turn'),
+        'GameState.get_possible_moves': (GameState, 'get_possible_moves'),
+        'GameState._calculate_points': (GameState, '_calculate_points'),
+        'Player.choose_move': (Player, 'choose_move'),
+        'GameLog.emit': (GameLog, 'emit'),
+        'BJJEnv.step': (BJJEnv, 'step'),
+        'BJJEnv.reset': (BJJEnv, 'reset'),
+        'q_update': (gym_env, 'q_update'),
+    }
+
+
+class PhaseStats:
+    """call count, total, extremes and log2 histogram of the durations of one phase, in nanoseconds"""
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.min: Optional[int] = None
+        self.max = 0
+        self.histogram = [0] * NUM_BUCKETS
+
+    def add(self, duration: int):
+        self.count += 1
+        self.total += duration
+        self.histogram[min(duration.bit_length(), NUM_BUCKETS - 1)] += 1
+        if self.min is None or duration < self.min:
+            self.min = duration
+        if duration > self.max:
+            self.max = duration
+
+    def quantile(self, q: float) -> int:
+        """upper bound in nanoseconds of the histogram bucket holding the q-quantile"""
+        rank = q * self.count
+        seen = 0
+        for bucket, count in enumerate(self.histogram):
+            seen += count
+            if count and seen >= rank:
+                return 1 << bucket
+        return 0
+
+    def to_json(self) -> Dict[str, Any]:
+        return {'count': self.count, 'total_seconds': self.total / 1e9,
+                'mean_ns': self.total / self.count if self.count else 0, 'min_ns': self.min or 0,
+                'max_ns': self.max, 'p50_ns': self.quantile(0.5), 'p90_ns': self.quantile(0.9),
+                'p99_ns': self.quantile(0.99),
+                'histogram': {str(1 << bucket): count for bucket, count in enumerate(self.histogram) if count}}
+
+
+class Instrumentation:
+    """
+    Opt-in timers for the hot paths of the game engine, gym env and Q-learning.
+
+    Installing it replaces each phase's method (or module function) with a wrapper that times every call into a
+    PhaseStats, and uninstalling puts the originals back, so a run that is not instrumented executes exactly the
+    same code as before and pays nothing. Phase times are inclusive: Game.play_turn includes the move generation,
+    point calculation and choose_move calls it makes. Calls from several threads, like those of Simulation.run_games,
+    are all timed, though a concurrent update can occasionally be lost. Use it as a context manager:
+
+        with Instrumentation() as timings:
+            q_learning(env, 1000)
+        print(timings.format_report())
+        timings.save_json('timings.json')
+    """
+    def __init__(self, phases: Optional[Dict[str, Tuple[Any, str]]] = None):
+        self.phases = phases
+        self.stats: Dict[str, PhaseStats] = {}
+        self._originals: List[Tuple[Any, str, Any]] = []
+
+    @property
+    def installed(self) -> bool:
+        return bool(self._originals)
+
+    def timed(self, name: str, function: Callable) -> Callable:
+        """function, with the duration of every call added to the stats of phase name"""
+        stats = self.stats.setdefault(name, PhaseStats())
+        clock = time.perf_counter_ns
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                stats.add(clock() - start)
+        return wrapper
+
+    def install(self):
+        if self.installed:
+            raise RuntimeError('instrumentation is already installed')
+        phases = self.phases if self.phases is not None else default_phases()
+        for name, (owner, attribute) in phases.items():
+            # None for methods inherited from a base class, which are then deleted again rather than copied over
+            self._originals.append((owner, attribute, vars(owner).get(attribute)))
+            setattr(owner, attribute, self.timed(name, getattr(owner, attribute)))
+
+    def uninstall(self):
+        # in reverse, so that phases wrapping the same attribute twice get their first original back
+        for owner, attribute, original in reversed(self._originals):
+            if original is None:
+                delattr(owner, attribute)
+            else:
+                setattr(owner, attribute, original)
+        self._originals = []
+
+    def __enter__(self) -> 'Instrumentation':
+        self.install()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.uninstall()
+
+    def reset(self):
+        for stats in self.stats.values():
+            stats.__init__()
+
+    def report(self) -> Dict[str, Dict[str, Any]]:
+        return {name: stats.to_json() for name, stats in self.stats.items()}
+
+    def save_json(self, path: str):
+        with open(path, 'w') as file:
+            json.dump(self.report(), file, indent=2)
+
+    def format_report(self) -> str:
+        lines = [f"{'phase':<32}{'calls':>10}{'total s':>10}{'mean us':>10}{'p50 us':>10}{'p99 us':>10}"]
+        for name, stats in sorted(self.stats.items(), key=lambda item: -item[1].total):
+            if stats.count:
+                lines.append(f"{name:<32}{stats.count:>10}{stats.total / 1e9:>10.3f}"
+                             f"{stats.total / stats.count / 1e3:>10.2f}{stats.quantile(0.5) / 1e3:>10.2f}"
+                             f"{stats.quantile(0.99) / 1e3:>10.2f}")
+        return '\n'.join(lines)
+
+
+class SamplingProfiler:
+    """
+    Samples the call stacks of every thread, or only of thread_id, every `interval` seconds from a background
+    thread, and writes the samples as folded stacks ("outer;inner;leaf count" lines), the input
+    of flamegraph.pl, speedscope and inferno. Sampling only reads the stack, so the profiled code runs unmodified:
+
+        with SamplingProfiler() as profiler:
+            q_learning(env, 1000)
+        profiler.save_folded('q_learning.folded')
+    """
+    def __init__(self, interval: float = 0.001, thread_id: Optional[int] = None):
+        self.interval = interval
+        self.thread_id = thread_id
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _sample(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or (self.thread_id is not None and thread_id != self.thread_id):
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self.samples[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample, name='SamplingProfiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self) -> 'SamplingProfiler':
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def folded(self) -> str:
+        return ''.join(f'{stack} {count}\n' for stack, count in sorted(self.samples.items()))
+
+    def save_folded(self, path: str):
+        with open(path, 'w') as file:
+            file.write(self.folded())
+
+
+if __name__ == "__main__":
+    from Graph.graph_cache import format_load_report, get_load_report
+    from play_game import Simulation
+
+    parser = argparse.ArgumentParser(description='Time the phases of a simulation of random games')
+    parser.add_argument('--games', type=int, default=1000)
+    parser.add_argument('--json', help='write the phase timings to this file')
+    parser.add_argument('--folded', help='write a sampling profile of the run to this file, for flamegraph.pl')
+    args = parser.parse_args()
+
+    simulation = Simulation(args.games)
+    print(format_load_report(get_load_report()))
+    profiler = SamplingProfiler()
+    with Instrumentation() as timings:
+        if args.folded:
+            profiler.start()
+        simulation.initialize_games()
+        simulation.run_games()
+        profiler.stop()
+    print(timings.format_report())
+    if args.json:
+        timings.save_json(args.json)
+    if args.folded:
+        profiler.save_folded(args.folded)
@@ -0,0 +1,274 @@
+import math
+import random
+import numpy as np
+from array import array
+from typing import List, Optional, Sequence, Tuple
+from Graph.compiled_graph import WINNER_TOP
+from Graph.retrograde import RetrogradeTable, UNKNOWN, FORCED_WIN
+from play_game import Board, Game
+from batch_game import BatchGame, PLAYER1, PLAYER2, WINNING_POSITION
+
+
+def search_state(game: Game) -> Tuple[int, bool, int, int]:
+    """the (node, mover on top, point difference, turns left) of the player to move in a scalar game"""
+    player = game.current_player
+    other = game.choose_other_player(player)
+    # Game.play_game counts the turn being played in turn_count
+    turns_left = game.max_turns - game.turn_count + 1
+    return game.game_state.current_node, player.is_top, player.points - other.points, turns_left
+
+
+def rollout_values(rollouts: BatchGame, leaves: Sequence[Tuple], rollout_depth: Optional[int] = None,
+                   retrograde: Optional[RetrogradeTable] = None) -> np.ndarray:
+    """
+    plays random games on `rollouts` from every (node, top, diff, turns_left, sign) leaf at once and returns their
+    values for the root player. rollouts needs at least one game per leaf. With a retrograde table, games are decided
+    as soon as they reach a state with a forced result that fits in the turns left
+    """
+    if not leaves:
+        return np.zeros(0)
+    nodes, tops, diffs, turns_left, signs = (np.array(column) for column in zip(*leaves))
+    if rollout_depth is not None:
+        turns_left = np.minimum(turns_left, rollout_depth)
+    # the player to move at the leaf is player 1
+    rollouts.max_turns = int(turns_left.max())
+    rollouts.done[:] = True
+    rollouts.reset(nodes=nodes, player1_top=tops, first_mover=np.full(len(leaves), PLAYER1),
+                   games=np.arange(len(leaves)), scores=np.stack([np.maximum(diffs, 0), np.maximum(-diffs, 0)], 1),
+                   turns=rollouts.max_turns - turns_left)
+    while True:
+        if retrograde is not None:
+            states = rollouts.states
+            forced = ~rollouts.done & (retrograde.outcome[states] != UNKNOWN) & \
+                (retrograde.plies[states] <= rollouts.max_turns - rollouts.turn)
+            if forced.any():
+                movers = rollouts.mover[forced]
+                mover_wins = retrograde.outcome[states[forced]] == FORCED_WIN
+                rollouts._finish(rollouts.games[forced], np.where(mover_wins, movers, 1 - movers), WINNING_POSITION)
+        if rollouts.done.all():
+            break
+        rollouts.step(rollouts.sample_random_moves())
+    winners = rollouts.winner[:len(leaves)]
+    return ((winners == PLAYER1).astype(float) - (winners == PLAYER2)) * signs
+
+
+class MCTSAgent:
+    """
+    Monte Carlo Tree Search over the compiled graph, used as a Player's agent.
+
+    Search states are (graph node, mover on top, signed score difference bucket, turns left), always seen from the player to
+    move, so the same statistics serve both players. They are kept in a transposition table: a dict from a packed
+    state key to a tree node, and typed arrays of per-node visit counts and per-(node, legal move) visit counts and
+    total values. Move orders that reach the same state share statistics, and the table is kept between turns and
+    games, so each search reuses the tree of the previous ones. It is cleared once it holds more than max_states
+    states.
+
+    Each move runs `simulations` simulations. They are selected with UCB1 in batches of rollout_batch, using a
+    virtual loss so the leaves of a batch differ, and the leaves are evaluated together by random rollouts on a
+    BatchGame. Rollouts are cut off after rollout_depth turns, and decided on points, if it is set. Values are +1 for
+    a win, -1 for a loss and 0 for a tie.
+
+    Given a retrograde table (Graph.retrograde), states with a forced result that fits in the turns left are treated
+    as decided, both in the tree and in rollouts
+    """
+    strategy = 'mcts'
+
+    def __init__(self, board: Board, simulations: int = 256, rollout_batch: int = 32, exploration: float = 1.4,
+                 score_bucket: int = 2, max_score_bucket: int = 8, rollout_depth: Optional[int] = None,
+                 max_states: int = 1_000_000, seed: Optional[int] = None,
+                 retrograde: Optional[RetrogradeTable] = None):
+        compiled = board.compiled
+        self.compiled = compiled
+        self.simulations = simulations
+        self.rollout_batch = rollout_batch
+        self.exploration = exploration
+        self.score_bucket = score_bucket
+        self.max_score_bucket = max_score_bucket
+        self.rollout_depth = rollout_depth
+        self.max_states = max_states
+        self.retrograde = retrograde
+        self.rng = random.Random(seed)
+        self.rollouts = BatchGame(rollout_batch, graph=compiled, seed=self.rng.getrandbits(64))
+
+        # the search loop runs in Python, where lists are much faster to index than arrays
+        legal_moves = compiled.legal_moves
+        self._num_states = legal_moves.num_states
+        self._legal_offsets = legal_moves.offsets.tolist()
+        self._legal_counts = legal_moves.counts.tolist()
+        self._legal_edges = legal_moves.edges.tolist()
+        self._targets = compiled.targets.tolist()
+        self._points = compiled.points.tolist()
+        self._tap = compiled.tap.tolist()
+        self._swaps = compiled.swaps.tolist()
+        self._winner = compiled.winner.tolist()
+        self._out_degree = np.diff(compiled.offsets).tolist()
+        self._forced = None
+        if retrograde is not None:
+            self._forced = (retrograde.outcome.tolist(), retrograde.plies.tolist())
+        self.clear()
+
+    def clear(self):
+        """empties the transposition table"""
+        self.keys = {}
+        self.visits = array('i')
+        self.first_edge = array('q')
+        self.edge_visits = array('i')
+        self.edge_values = array('f')
+
+    @property
+    def num_states(self) -> int:
+        return len(self.visits)
+
+    def state_key(self, node: int, top: bool, diff: int, turns_left: int) -> int:
+        # a tie, a lead and a deficit never share a bucket: leads of 1..score_bucket points are bucket 1, and so on
+        bucket = min(-(-abs(diff) // self.score_bucket), self.max_score_bucket)
+        if diff < 0:
+            bucket = -bucket
+        num_buckets = 2 * self.max_score_bucket + 1
+        return ((turns_left * num_buckets + bucket + self.max_score_bucket) * self._num_states) + node * 2 + top
+
+    def _expand(self, key: int, state: int) -> int:
+        tree_node = len(self.visits)
+        self.keys[key] = tree_node
+        self.visits.append(0)
+        self.first_edge.append(len(self.edge_visits))
+        count = self._legal_counts[state]
+        self.edge_visits.extend([0] * count)
+        self.edge_values.extend([0.0] * count)
+        return tree_node
+
+    def choose_move(self, game: Game, possible_moves: Sequence[int]) -> int:
+        move = self.search(*search_state(game))
+        assert move in possible_moves
+        return move
+
+    def search(self, node: int, top: bool, diff: int, turns_left: int) -> int:
+        """
+        runs the simulations for the player to move from node, with a point difference of diff, and returns the edge
+        index of the most visited move
+        """
+        if self.num_states > self.max_states:
+            self.clear()
+        if self.retrograde is not None:
+            forced_move = self.retrograde.forced_move(node, top, turns_left)
+            if forced_move is not None:
+                # nothing to search for
+                return forced_move
+        key = self.state_key(node, top, diff, turns_left)
+        if key not in self.keys:
+            # expanded up front, so that every simulation starts with one of the root's moves
+            self._expand(key, node * 2 + top)
+        for start in range(0, self.simulations, self.rollout_batch):
+            self._simulate_batch(node, top, diff, turns_left, min(self.rollout_batch, self.simulations - start))
+        return self._best_move(node, top, diff, turns_left)
+
+    def root_visits(self, node: int, top: bool, diff: int, turns_left: int) -> List[int]:
+        """visit counts of the legal moves of a searched state, in legal-move order"""
+        tree_node = self.keys.get(self.state_key(node, top, diff, turns_left))
+        if tree_node is None:
+            # states with a forced result aren't searched
+            return [0] * self._legal_counts[node * 2 + top]
+        first = self.first_edge[tree_node]
+        return self.edge_visits[first:first + self._legal_counts[node * 2 + top]].tolist()
+
+    def _best_move(self, node: int, top: bool, diff: int, turns_left: int) -> int:
+        counts = self.root_visits(node, top, diff, turns_left)
+        return self._legal_edges[self._legal_offsets[node * 2 + top] + counts.index(max(counts))]
+
+    def _simulate_batch(self, node: int, top: bool, diff: int, turns_left: int, count: int):
+        paths, values, leaves = [], [], []
+        for _ in range(count):
+            path, leaf, value = self._select(node, top, diff, turns_left)
+            # virtual loss: count the simulation as a loss until its result is known
+            for tree_node, stat, _ in path:
+                self.visits[tree_node] += 1
+                self.edge_visits[stat] += 1
+                self.edge_values[stat] -= 1
+            paths.append(path)
+            values.append(value)
+            if leaf is not None:
+                leaves.append((len(values) - 1, leaf))
+
+        for (index, _), value in zip(leaves, self._rollout([leaf for _, leaf in leaves])):
+            values[index] = value
+        for path, value in zip(paths, values):
+            for _, stat, sign in path:
+                self.edge_values[stat] += 1 + value * sign
+
+    def _select(self, node: int, top: bool, diff: int, turns_left: int) -> Tuple[List, Optional[Tuple], float]:
+        """
+        walks down the tree from the root state and returns the path of (tree node, edge stat, sign) steps, where
+        sign is 1 for the root player's moves and -1 for the opponent's. The walk ends either at a finished game,
+        with its value for the root player, or at a leaf to roll out from, as (node, top, diff, turns_left, sign)
+        """
+        path = []
+        sign = 1
+        while True:
+            if turns_left <= 0:
+                # decided on points, diff being that of the player to move
+                return path, None, sign * ((diff > 0) - (diff < 0))
+            state = node * 2 + top
+            if self._forced is not None and self._forced[0][state] != UNKNOWN and \
+                    self._forced[1][state] <= turns_left:
+                return path, None, sign * self._forced[0][state]
+            count = self._legal_counts[state]
+            if count == 0:
+                if self._out_degree[node] == 0:
+                    # the game restarts from a random position, which the rollout draws
+                    return path, (node, top, diff, turns_left, sign), 0.0
+                # the player passes
+                top, diff, turns_left, sign = not top, -diff, turns_left - 1, -sign
+                continue
+            key = self.state_key(node, top, diff, turns_left)
+            tree_node = self.keys.get(key)
+            if tree_node is None:
+                self._expand(key, state)
+                return path, (node, top, diff, turns_left, sign), 0.0
+
+            slot = self._ucb_slot(tree_node, count)
+            path.append((tree_node, self.first_edge[tree_node] + slot, sign))
+            edge = self._legal_edges[self._legal_offsets[state] + slot]
+            target = self._targets[edge]
+            diff += self._points[edge]
+            if self._tap[edge]:
+                return path, None, -sign
+            if self._winner[target]:
+                return path, None, sign if (self._winner[target] == WINNER_TOP) == top else -sign
+            # positions are swapped, then the other player moves
+            node, top, diff, turns_left, sign = target, top == self._swaps[edge], -diff, turns_left - 1, -sign
+
+    def _ucb_slot(self, tree_node: int, count: int) -> int:
+        first = self.first_edge[tree_node]
+        edge_visits, edge_values = self.edge_visits, self.edge_values
+        log_visits = math.log(max(self.visits[tree_node], 1))
+        best_slot, best_score = 0, -math.inf
+        # unvisited moves come first, in random order
+        offset = self.rng.randrange(count)
+        for index in range(count):
+            slot = (offset + index) % count
+            visits = edge_visits[first + slot]
+            if visits == 0:
+                return slot
+            score = edge_values[first + slot] / visits + self.exploration * math.sqrt(log_visits / visits)
+            if score > best_score:
+                best_slot, best_score = slot, score
+        return best_slot
+
+    def _rollout(self, leaves: List[Tuple]) -> List[float]:
+        """plays random games from every leaf at once and returns their values for the root player"""
+        return rollout_values(self.rollouts, leaves, self.rollout_depth, self.retrograde)
+
+
+if __name__ == "__main__":
+    # MCTS against a random player
+    from Graph.graph_cache import format_load_report, get_compiled_graph, get_load_report
+    board = Board(get_compiled_graph())
+    print(format_load_report(get_load_report()))
+    agent = MCTSAgent(board, simulations=128, seed=0)
+    results = {'MCTS': 0, 'Random': 0, 'Tie': 0}
+    for i in range(100):
+        game = Game(f'Game_{i}', board=board)
+        game.initialize_game('MCTS', 'Random', player1_agent=agent)
+        game.play_game()
+        results[game.winner.name if game.winner else 'Tie'] += 1
+    print(results, f'{agent.num_states} states in the transposition table')
@@ -0,0 +1,110 @@
+import numpy as np
+from gymnasium import spaces
+from typing import Any, Dict, Optional, Union
+
+# observation modes of BJJEnv and BJJVectorEnv: 'dict' is the original dict of scalars (or of arrays, for the vector
+# env), the others are vectors written into a preallocated buffer
+OBSERVATION_MODES = ('dict', 'flat', 'one_hot')
+# entries of the 'flat' vector. 'one_hot' replaces current_position with num_nodes one-hot entries
+FLAT_FIELDS = ('current_position', 'point_difference', 'on_top', 'on_bottom', 'turns_left')
+FLAT_DTYPE = np.int64
+ONE_HOT_DTYPE = np.float32
+
+ArrayLike = Union[int, np.ndarray]
+
+
+class ObservationEncoder:
+    """
+    Writes the observations of one env, or of num_envs envs stacked in rows, into a single preallocated array.
+
+    'flat' observations are int64 vectors of FLAT_FIELDS. The position stays a node index, ready for an embedding
+    lookup, and every other field is exact. 'one_hot' observations are float32 vectors of the one-hot position
+    followed by the other four fields, for networks that take the position directly. Only the entries of the
+    previous and new positions are rewritten, so encoding a one-hot observation does not cost O(num_nodes).
+
+    encode returns the buffer itself, which the next call overwrites: learners read it without a copy, and must copy
+    observations they keep
+    """
+    def __init__(self, mode: str, num_nodes: int, max_turns: int, num_envs: Optional[int] = None):
+        if mode not in OBSERVATION_MODES or mode == 'dict':
+            raise ValueError(f"ObservationEncoder encodes the 'flat' and 'one_hot' modes, not {mode!r}")
+        self.mode = mode
+        self.num_nodes = num_nodes
+        # index of the first field after the position
+        self.tail = 1 if mode == 'flat' else num_nodes
+        size = self.tail + len(FLAT_FIELDS) - 1
+        dtype = FLAT_DTYPE if mode == 'flat' else ONE_HOT_DTYPE
+
+        bound = np.iinfo(FLAT_DTYPE).max if mode == 'flat' else np.inf
+        low = np.zeros(size, dtype=dtype)
+        high = np.ones(size, dtype=dtype)
+        low[self.tail], high[self.tail] = -bound, bound
+        high[self.tail + 3] = max_turns
+        if mode == 'flat':
+            high[0] = num_nodes - 1
+        self.single_space = spaces.Box(low=low, high=high, dtype=dtype)
+        if num_envs is None:
+            self.space = self.single_space
+            self.buffer = np.zeros(size, dtype=dtype)
+        else:
+            self.space = spaces.Box(low=np.tile(low, (num_envs, 1)), high=np.tile(high, (num_envs, 1)), dtype=dtype)
+            self.buffer = np.zeros((num_envs, size), dtype=dtype)
+        # the buffer as rows, and the positions set to 1 in them
+        self._rows = self.buffer.reshape(-1, size)
+        self._row_index = np.arange(len(self._rows))
+        self._hot = np.zeros(len(self._rows), dtype=np.intp)
+
+    def encode(self, position: ArrayLike, point_difference: ArrayLike, on_top: ArrayLike,
+               turns_left: ArrayLike) -> np.ndarray:
+        """the buffer, holding the observations of the given states: scalars for one env, (num_envs,) arrays for many"""
+        if self.buffer.ndim == 1:
+            return self._encode_one(position, point_difference, on_top, turns_left)
+        rows, tail = self._rows, self.tail
+        if self.mode == 'flat':
+            rows[:, 0] = position
+        else:
+            rows[self._row_index, self._hot] = 0
+            self._hot[:] = position
+            rows[self._row_index, self._hot] = 1
+        rows[:, tail] = point_difference
+        rows[:, tail + 1] = on_top
+        rows[:, tail + 2] = 1 - np.asarray(on_top, dtype=np.int64)
+        rows[:, tail + 3] = turns_left
+        return self.buffer
+
+    def _encode_one(self, position: int, point_difference: int, on_top: bool, turns_left: int) -> np.ndarray:
+        # one slice assignment from a list, much cheaper than the column assignments of encode for a single row
+        buffer = self.buffer
+        if self.mode == 'flat':
+            buffer[:] = [position, point_difference, on_top, not on_top, turns_left]
+        else:
+            buffer[self._hot[0]] = 0
+            buffer[position] = 1
+            self._hot[0] = position
+            buffer[self.tail:] = [point_difference, on_top, not on_top, turns_left]
+        return buffer
+
+    def decode(self, observation: np.ndarray) -> Dict[str, np.ndarray]:
+        """the fields of encoded observations, as the dict of (arrays of) values the 'dict' mode would give"""
+        return _decode(np.asarray(observation), self.tail, self.mode == 'one_hot')
+
+
+def _decode(observation: np.ndarray, tail: int, one_hot: bool) -> Dict[str, np.ndarray]:
+    position = observation[..., :tail].argmax(axis=-1) if one_hot else observation[..., 0]
+    fields = [position] + [observation[..., tail + offset] for offset in range(len(FLAT_FIELDS) - 1)]
+    return {name: value.astype(np.int64) for name, value in zip(FLAT_FIELDS, fields)}
+
+
+def observation_fields(observation: Union[Dict[str, Any], np.ndarray], num_nodes: int) -> Dict[str, Any]:
+    """
+    The FLAT_FIELDS of an observation in any mode, of one env or stacked from many: dicts are returned as they are,
+    and vectors are told apart by their length, len(FLAT_FIELDS) for 'flat' and num_nodes + 4 for 'one_hot'
+    """
+    if isinstance(observation, dict):
+        return observation
+    observation = np.asarray(observation)
+    one_hot = observation.shape[-1] != len(FLAT_FIELDS)
+    if one_hot and observation.shape[-1] != num_nodes + len(FLAT_FIELDS) - 1:
+        raise ValueError(f"observations of length {observation.shape[-1]} are neither 'flat' nor 'one_hot' ones "
+                         f"for a graph of {num_nodes} nodes")
+    return _decode(observation, num_nodes if one_hot else 1, one_hot)
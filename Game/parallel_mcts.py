@@ -0,0 +1,186 @@
+import multiprocessing
+import time
+import numpy as np
+from typing import Dict, List, Optional, Sequence, Tuple
+from Graph.graph_cache import format_load_report, get_compiled_graph, get_load_report
+from Graph.retrograde import RetrogradeTable
+from Graph.shared_graph import SharedGraph, SharedGraphHandle, attach_compiled_graph
+from play_game import Board, Game
+from batch_game import BatchGame
+from mcts import MCTSAgent, rollout_values, search_state
+
+# per-process state of rollout pool workers, set up once by _init_rollout_worker
+_worker = {}
+
+
+def _init_rollout_worker(handle: SharedGraphHandle, batch_size: int, rollout_depth: Optional[int],
+                         retrograde: Optional[RetrogradeTable] = None):
+    graph, shm = attach_compiled_graph(handle)
+    _worker.update(shm=shm, rollouts=BatchGame(batch_size, graph=graph), rollout_depth=rollout_depth,
+                   retrograde=retrograde)
+
+
+def _rollout_chunk(task) -> np.ndarray:
+    leaves, seed = task
+    rollouts = _worker['rollouts']
+    # every chunk brings its own seed, so values don't depend on which worker plays it
+    rollouts.rng = np.random.default_rng(seed)
+    return rollout_values(rollouts, leaves, _worker['rollout_depth'], _worker['retrograde'])
+
+
+def _tree_worker(connection, handle: SharedGraphHandle, agent_kwargs: Dict, seed: int):
+    """runs one independent search tree, answering search requests with the root's visit counts until sent None"""
+    graph, shm = attach_compiled_graph(handle)
+    agent = MCTSAgent(Board(graph), seed=seed, **agent_kwargs)
+    while True:
+        request = connection.recv()
+        if request is None:
+            break
+        agent.search(*request)
+        connection.send(agent.root_visits(*request))
+    connection.close()
+    del agent, graph
+    shm.close()
+
+
+class LeafParallelMCTSAgent(MCTSAgent):
+    """
+    MCTSAgent whose rollouts are played on a process pool attached to the compiled board in shared memory. Every
+    batch of rollout_batch leaves, selected with a virtual loss like in MCTSAgent, is split into one chunk per worker.
+    The tree itself stays in this process.
+
+    The pool is started with the agent; close() (or leaving the context manager) stops it and releases the shared
+    board
+    """
+    def __init__(self, board: Board, num_workers: Optional[int] = None, rollout_batch: Optional[int] = None,
+                 **kwargs):
+        self.num_workers = num_workers or multiprocessing.cpu_count()
+        # enough leaves per batch to keep every worker busy
+        rollout_batch = rollout_batch or 32 * self.num_workers
+        super().__init__(board, rollout_batch=rollout_batch, **kwargs)
+        self._chunk_size = -(-rollout_batch // self.num_workers)
+        self._shared = SharedGraph(board.compiled)
+        self._pool = multiprocessing.Pool(self.num_workers, initializer=_init_rollout_worker,
+                                          initargs=(self._shared.handle, self._chunk_size, self.rollout_depth,
+                                                    self.retrograde))
+
+    def _rollout(self, leaves: List[Tuple]) -> List[float]:
+        chunks = [(leaves[start:start + self._chunk_size], self.rng.getrandbits(64))
+                  for start in range(0, len(leaves), self._chunk_size)]
+        return np.concatenate([np.zeros(0)] + self._pool.map(_rollout_chunk, chunks))
+
+    def close(self):
+        self._pool.close()
+        self._pool.join()
+        self._shared.close()
+
+    def __enter__(self) -> 'LeafParallelMCTSAgent':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class RootParallelMCTSAgent:
+    """
+    Root-parallel MCTS: num_workers processes each grow an independent MCTSAgent tree, seeded differently, on the
+    compiled board in shared memory. Every move, each tree runs simulations // num_workers simulations (with its own
+    virtual loss) from the current state, and the move with the most visits summed over all trees is played. Trees
+    are kept between moves and games, like MCTSAgent's.
+
+    Can be used as a Player's agent. close() (or leaving the context manager) stops the workers and releases the
+    shared board
+    """
+    strategy = 'mcts'
+
+    def __init__(self, board: Board, num_workers: Optional[int] = None, simulations: int = 256,
+                 seed: Optional[int] = None, **kwargs):
+        self.num_workers = num_workers or multiprocessing.cpu_count()
+        self.legal_moves = board.compiled.legal_moves
+        self.retrograde = kwargs.get('retrograde')
+        self._shared = SharedGraph(board.compiled)
+        agent_kwargs = dict(kwargs, simulations=max(simulations // self.num_workers, 1))
+        seeds = [int(tree_seed.generate_state(1)[0]) for tree_seed in np.random.SeedSequence(seed).spawn(
+            self.num_workers)]
+        self._connections = []
+        self._processes = []
+        for tree_seed in seeds:
+            connection, child_connection = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_tree_worker, daemon=True,
+                                              args=(child_connection, self._shared.handle, agent_kwargs, tree_seed))
+            process.start()
+            child_connection.close()
+            self._connections.append(connection)
+            self._processes.append(process)
+
+    def root_visits(self, node: int, top: bool, diff: int, turns_left: int) -> np.ndarray:
+        """runs the searches of every tree and returns their summed visit counts, in legal-move order"""
+        request = (node, top, diff, turns_left)
+        for connection in self._connections:
+            connection.send(request)
+        return np.sum([connection.recv() for connection in self._connections], axis=0)
+
+    def search(self, node: int, top: bool, diff: int, turns_left: int) -> int:
+        if self.retrograde is not None:
+            forced_move = self.retrograde.forced_move(node, top, turns_left)
+            if forced_move is not None:
+                return forced_move
+        state = node * 2 + top
+        visits = self.root_visits(node, top, diff, turns_left)
+        return int(self.legal_moves.edges[self.legal_moves.offsets[state] + int(np.argmax(visits))])
+
+    def choose_move(self, game: Game, possible_moves: Sequence[int]) -> int:
+        move = self.search(*search_state(game))
+        assert move in possible_moves
+        return move
+
+    def close(self):
+        for connection, process in zip(self._connections, self._processes):
+            connection.send(None)
+            connection.close()
+            process.join()
+        self._shared.close()
+
+    def __enter__(self) -> 'RootParallelMCTSAgent':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def measure_speedup(board: Board, worker_counts: Sequence[int] = (1, 2, 4), simulations: int = 1024,
+                    num_positions: int = 20, seed: int = 0) -> Dict[str, Dict[int, float]]:
+    """
+    Times searches of `simulations` simulations from num_positions random positions with a single-process MCTSAgent
+    and with both parallel agents at every worker count, and returns each agent's speedup over the single-process
+    search by number of workers. Speedups are bounded by the number of cores
+    """
+    rng = np.random.default_rng(seed)
+    legal_counts = board.compiled.legal_moves.counts
+    states = rng.choice(np.flatnonzero(legal_counts > 0), size=num_positions)
+    positions = [(int(state) // 2, bool(state % 2), 0, 50) for state in states]
+
+    def seconds_per_search(agent) -> float:
+        start = time.perf_counter()
+        for position in positions:
+            agent.search(*position)
+        return (time.perf_counter() - start) / len(positions)
+
+    baseline = seconds_per_search(MCTSAgent(board, simulations=simulations, seed=seed))
+    speedups = {'root': {}, 'leaf': {}}
+    for num_workers in worker_counts:
+        with RootParallelMCTSAgent(board, num_workers=num_workers, simulations=simulations, seed=seed) as agent:
+            speedups['root'][num_workers] = baseline / seconds_per_search(agent)
+        with LeafParallelMCTSAgent(board, num_workers=num_workers, simulations=simulations, seed=seed) as agent:
+            speedups['leaf'][num_workers] = baseline / seconds_per_search(agent)
+    return speedups
+
+
+if __name__ == "__main__":
+    # speedup of both kinds of parallel search over a single process
+    board = Board(get_compiled_graph())
+    print(format_load_report(get_load_report()))
+    worker_counts = sorted({1, 2, 4, multiprocessing.cpu_count()})
+    for kind, speedups in measure_speedup(board, worker_counts).items():
+        print(f'{kind}-parallel: ' + ', '.join(f'{workers} workers {speedup:.2f}x'
+                                               for workers, speedup in speedups.items()))
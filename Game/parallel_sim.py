@@ -0,0 +1,247 @@
+import functools
+import multiprocessing
+import os
+import random
+import time
+import numpy as np
+from tqdm import tqdm
+from typing import Callable, Dict, Iterator, Optional, Sequence
+from Graph.compiled_graph import CompiledGraph
+from Graph.graph_cache import format_load_report, get_compiled_graph, get_load_report
+from Graph.shared_graph import SharedGraph, SharedGraphHandle, attach_compiled_graph
+from batch_game import BatchGame, NO_WINNER, PLAYER1, PLAYER2
+from mcts import MCTSAgent
+from play_game import Board, Game
+from recorder import TrajectoryRecorder, FORMATS
+
+# builds a player's agent in a worker from the board and a seed, e.g. functools.partial(MCTSAgent, simulations=64)
+AgentFactory = Callable[..., object]
+
+# per-process state of pool workers, set up once by _init_worker
+_worker = {}
+
+
+def _init_worker(handle: SharedGraphHandle, max_turns: int, record_dir: Optional[str] = None,
+                 record_format: str = 'parquet', agents: Sequence[Optional[AgentFactory]] = (None, None)):
+    graph, shm = attach_compiled_graph(handle)
+    _worker.update(graph=graph, shm=shm, max_turns=max_turns, engines={}, record_dir=record_dir,
+                   record_format=record_format, agents=agents)
+
+
+def _record_path(batch_id: int) -> str:
+    # each batch records its turns to a file of its own
+    return os.path.join(_worker['record_dir'], f'batch_{batch_id:06d}{FORMATS[_worker["record_format"]]}')
+
+
+def _play_batch(task) -> Dict[str, np.ndarray]:
+    """plays one batch of random games and returns its results as columns"""
+    if any(_worker['agents']):
+        return _play_agent_batch(task)
+    batch_id, first_game, num_games, seed = task
+    engines = _worker['engines']
+    if num_games not in engines:
+        # workers reuse one engine per batch size instead of reallocating its state arrays
+        engines[num_games] = BatchGame(num_games, max_turns=_worker['max_turns'], graph=_worker['graph'])
+    engine = engines[num_games]
+    engine.rng = np.random.default_rng(seed)
+    engine.next_game_id = first_game
+    if _worker['record_dir'] is None:
+        engine.play_random()
+    else:
+        with TrajectoryRecorder(_record_path(batch_id), format=_worker['record_format'],
+                                edge_ids=_worker['graph'].edge_ids) as recorder:
+            engine.recorder = recorder
+            engine.play_random()
+        engine.recorder = None
+    return {'batch_id': batch_id,
+            'winner': engine.winner.copy(),
+            'scores': engine.scores.copy(),
+            'num_turns': engine.turn.copy(),
+            'end_reason': engine.end_reason.copy()}
+
+
+def _play_agent_batch(task) -> Dict[str, np.ndarray]:
+    """
+    plays one batch of games with play_game.Game, whose players' moves are chosen by the worker's agents (random
+    where there is none), and returns its results in the same columns as _play_batch
+    """
+    batch_id, first_game, num_games, seed = task
+    if 'board' not in _worker:
+        _worker['board'] = Board(_worker['graph'])
+    board = _worker['board']
+    # the game draws positions and random moves from the random module, and each agent gets a seed of its own
+    game_seed, *agent_seeds = seed.generate_state(3, dtype=np.uint64).tolist()
+    random.seed(game_seed)
+    agents = [make_agent(board, seed=agent_seed) if make_agent is not None else None
+              for make_agent, agent_seed in zip(_worker['agents'], agent_seeds)]
+    winner = np.full(num_games, NO_WINNER, dtype=np.int8)
+    scores = np.zeros((num_games, 2), dtype=np.int32)
+    num_turns = np.zeros(num_games, dtype=np.int32)
+    end_reason = np.zeros(num_games, dtype=np.int8)
+    recorder = None
+    if _worker['record_dir'] is not None:
+        recorder = TrajectoryRecorder(_record_path(batch_id), format=_worker['record_format'],
+                                      edge_ids=_worker['graph'].edge_ids)
+    try:
+        game = Game(f'batch_{batch_id}', max_turns=_worker['max_turns'], board=board, recorder=recorder)
+        game.initialize_game('Player 1', 'Player 2', *agents)
+        for index in range(num_games):
+            if index:
+                game.reset()
+            game.game_id = first_game + index
+            game.play_game()
+            if game.winner is not None:
+                winner[index] = PLAYER1 if game.winner is game.player1 else PLAYER2
+            scores[index] = game.player1.points, game.player2.points
+            num_turns[index] = game.turn_count
+            end_reason[index] = game.end_reason
+    finally:
+        if recorder is not None:
+            recorder.close()
+    return {'batch_id': batch_id, 'winner': winner, 'scores': scores, 'num_turns': num_turns,
+            'end_reason': end_reason}
+
+
+class TournamentResults:
+    """
+    Aggregates batch results as they stream in. Only running totals are kept, so memory stays constant no matter how
+    many games are played
+    """
+    def __init__(self):
+        self.num_games = 0
+        self.player1_wins = 0
+        self.player2_wins = 0
+        self.num_ties = 0
+        self.total_turns = 0
+        self.min_turns = None
+        self.max_turns = None
+        self.end_reasons = np.zeros(8, dtype=np.int64)
+        self.elapsed = 0.0
+
+    def update(self, record: Dict[str, np.ndarray]):
+        winner, num_turns = record['winner'], record['num_turns']
+        self.num_games += len(winner)
+        self.player1_wins += int(np.count_nonzero(winner == PLAYER1))
+        self.player2_wins += int(np.count_nonzero(winner == PLAYER2))
+        self.num_ties += int(np.count_nonzero(winner == NO_WINNER))
+        self.total_turns += int(num_turns.sum())
+        self.min_turns = int(num_turns.min()) if self.min_turns is None else min(self.min_turns, int(num_turns.min()))
+        self.max_turns = int(num_turns.max()) if self.max_turns is None else max(self.max_turns, int(num_turns.max()))
+        self.end_reasons += np.bincount(record['end_reason'], minlength=len(self.end_reasons))
+
+    def agg_results(self) -> Dict:
+        """prints the same summary as Simulation.agg_results and returns the totals"""
+        print("SIMULATION RESULTS:")
+        print(f'Player 1 won {self.player1_wins} games out of {self.num_games} '
+              f'({round(self.player1_wins / self.num_games, 2)})')
+        print(f'Player 2 won {self.player2_wins} games out of {self.num_games} '
+              f'({round(self.player2_wins / self.num_games, 2)})')
+        if self.num_ties > 0:
+            print(f'there were {self.num_ties} ties')
+        print(f'On average, games lasted {self.total_turns / self.num_games} with a min of {self.min_turns} and a max '
+              f'of {self.max_turns}')
+        print(f'{self.num_games} games in {self.elapsed:.2f}s ({self.num_games / self.elapsed:.0f} games/s)')
+        return {'num_games': self.num_games, 'player1_wins': self.player1_wins, 'player2_wins': self.player2_wins,
+                'num_ties': self.num_ties, 'mean_turns': self.total_turns / self.num_games,
+                'elapsed': self.elapsed}
+
+
+class ParallelSimulation:
+    """
+    Runs tournaments on a process pool.
+
+    The compiled graph is placed in shared memory once and every worker attaches to it. Games are split into batches
+    of batch_size that workers play with a BatchGame. Each batch gets its own seed spawned from `seed`, so results
+    don't depend on the number of workers or on which worker plays which batch. Batch results stream back to the
+    aggregator as they finish.
+
+    Games are random-vs-random unless player1_agent or player2_agent is given. These are picklable factories called
+    as factory(board, seed=...) in the workers, such as functools.partial(MCTSAgent, simulations=64), and the batches
+    are then played one game at a time with play_game.Game, the player without a factory moving at random. Each batch
+    builds its agents afresh from its own seed, so their search trees aren't shared between batches.
+
+    If record_dir is given, the turns of every game are recorded there with a TrajectoryRecorder, one file per batch,
+    with game ids numbering the games of the whole tournament
+    """
+    def __init__(self, num_games: int, max_turns: int = 100, num_workers: Optional[int] = None,
+                 batch_size: int = 10_000, seed: Optional[int] = None, graph: Optional[CompiledGraph] = None,
+                 record_dir: Optional[str] = None, record_format: str = 'parquet',
+                 player1_agent: Optional[AgentFactory] = None, player2_agent: Optional[AgentFactory] = None):
+        self.num_games = num_games
+        self.max_turns = max_turns
+        self.num_workers = num_workers or multiprocessing.cpu_count()
+        self.batch_size = batch_size
+        self.seed = seed
+        self.graph = graph if graph is not None else get_compiled_graph()
+        self.record_dir = record_dir
+        self.record_format = record_format
+        self.agents = (player1_agent, player2_agent)
+        if record_dir is not None:
+            os.makedirs(record_dir, exist_ok=True)
+
+    def _tasks(self):
+        num_batches = -(-self.num_games // self.batch_size)
+        seeds = np.random.SeedSequence(self.seed).spawn(num_batches)
+        for batch_id, batch_seed in enumerate(seeds):
+            num_games = min(self.batch_size, self.num_games - batch_id * self.batch_size)
+            yield batch_id, batch_id * self.batch_size, num_games, batch_seed
+
+    def iter_batches(self) -> Iterator[Dict[str, np.ndarray]]:
+        """yields the result columns of every batch, in completion order"""
+        with SharedGraph(self.graph) as shared:
+            if self.num_workers == 1:
+                _init_worker(shared.handle, self.max_turns, self.record_dir, self.record_format, self.agents)
+                try:
+                    yield from map(_play_batch, self._tasks())
+                finally:
+                    shm = _worker.pop('shm')
+                    _worker.clear()
+                    shm.close()
+                return
+            with multiprocessing.Pool(self.num_workers, initializer=_init_worker,
+                                      initargs=(shared.handle, self.max_turns, self.record_dir,
+                                                self.record_format, self.agents)) as pool:
+                yield from pool.imap_unordered(_play_batch, self._tasks())
+
+    def run(self, progress: bool = True) -> TournamentResults:
+        results = TournamentResults()
+        start = time.perf_counter()
+        num_batches = -(-self.num_games // self.batch_size)
+        for record in tqdm(self.iter_batches(), total=num_batches, disable=not progress):
+            results.update(record)
+        results.elapsed = time.perf_counter() - start
+        return results
+
+
+def measure_speedup(graph: CompiledGraph, player1_agent: Optional[AgentFactory] = None,
+                    player2_agent: Optional[AgentFactory] = None, worker_counts: Sequence[int] = (1, 2, 4),
+                    num_games: int = 200, batch_size: int = 10, max_turns: int = 100,
+                    seed: int = 0) -> Dict[int, float]:
+    """
+    Plays the same tournament in one process and on every number of workers, and returns the speedup over the single
+    process by number of workers. Speedups are bounded by the number of cores
+    """
+    def seconds(num_workers: int) -> float:
+        simulation = ParallelSimulation(num_games, max_turns=max_turns, num_workers=num_workers, batch_size=batch_size,
+                                        seed=seed, graph=graph, player1_agent=player1_agent,
+                                        player2_agent=player2_agent)
+        start = time.perf_counter()
+        for _ in simulation.iter_batches():
+            pass
+        return time.perf_counter() - start
+
+    baseline = seconds(1)
+    return {num_workers: baseline / seconds(num_workers) for num_workers in worker_counts}
+
+
+if __name__ == "__main__":
+    # 1M-game random tournament on every core
+    simulation = ParallelSimulation(num_games=1_000_000, seed=0)
+    print(format_load_report(get_load_report()))
+    simulation.run().agg_results()
+
+    # speedup of MCTS-vs-random games, which run one at a time in Python, with more workers
+    worker_counts = sorted({1, 2, 4, multiprocessing.cpu_count()})
+    speedups = measure_speedup(simulation.graph, functools.partial(MCTSAgent, simulations=64),
+                               worker_counts=worker_counts)
+    print('MCTS vs random: ' + ', '.join(f'{workers} workers {speedup:.2f}x' for workers, speedup in speedups.items()))
@@ -2,17 +2,29 @@ import random
 import networkx as nx
 from tqdm import tqdm
 import numpy as np
-from typing import List, Tuple, Dict, Optional
-from Graph.graph_constructor import construct_graph
+from typing import List, Tuple, Dict, Optional, Sequence, Union
+from Graph.compiled_graph import CompiledGraph, compile_graph
+from Graph.graph_cache import format_load_report, get_compiled_graph, get_load_report
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from game_log import GameLog, QUIET, VERBOSE, as_log
+from recorder import TrajectoryRecorder
+from batch_game import NOT_OVER, TAPPED, WINNING_POSITION, POINTS, TIE, PASS
 
 
 class Board:
-    def __init__(self, graph: nx.Graph):
-        self.graph = graph
-        self.rewards = {
-            'sweep': 2, 'mount': 4, 'back': 4,
-            'throw': 2, 'takedown': 2, 'pass': 3}
+    def __init__(self, graph: Union[CompiledGraph, nx.Graph]):
+        """
+        Wraps the compiled graph snapshot that the game engine runs off. Passing a networkx graph compiles it first;
+        `graph` is the networkx view of the snapshot, kept for debugging and visualisation
+        """
+        self.compiled = graph if isinstance(graph, CompiledGraph) else compile_graph(graph)
+        self.graph = self.compiled.graph
+        self.rewards = self.compiled.rewards
+        self.legal_moves = self.compiled.legal_moves
+
+    @property
+    def num_nodes(self) -> int:
+        return self.compiled.num_nodes
 
     def get_node_data(self, node: int) -> Dict:
         return self.graph.nodes[node]
@@ -20,93 +32,106 @@ class Board:
     def get_edge_data(self, from_node: int, to_node: int) -> Dict:
         return self.graph.edges[from_node, to_node]
 
-    def get_outgoing_edges(self, node: int) -> List[Dict]:
-        return self.graph.nodes[node]['outgoing']
+    def get_outgoing_edges(self, node: int) -> range:
+        return self.compiled.out_edges(node)
 
 class GameState:
-    def __init__(self, board: Board):
+    def __init__(self, board: Board, log: Optional[GameLog] = None):
         self.board = board
+        self.log = log if log is not None else GameLog()
         self.current_node = None
 
     def initialize(self):
         # position 94 is 'symmetric staggered standing'. A central node with many possible outgoing edges
-        self.current_node = random.choice([94, random.choice(list(self.board.graph.nodes()))])
+        self.current_node = random.choice([94, random.randrange(self.board.num_nodes)])
 
     def update(self, new_node: int):
-        print(f'moving to position {self.board.get_node_data(new_node)['description']}')
+        if self.log.verbose:
+            self.log.emit('moved_to', node=new_node, description=self.board.compiled.node_descriptions[new_node])
         self.current_node = new_node
 
-    def get_possible_moves(self, is_top: bool, is_bottom: bool) -> List[Tuple[int, Dict]]:
-        #note: May not need to pass in both top and bottom position? need to explicitly test that they are always opposites
-        #before any third state ([True,True] or [False,False]) will create issues if both attributes aren't passed in
+    def get_possible_moves(self, is_top: bool, is_bottom: bool) -> Tuple[int, ...]:
         """
-        Passes in Player's top/bottom position and calculates which moves are valid for the relative position of the player
+        Passes in Player's top/bottom position and returns the moves that are valid for the relative position of the
+        player, as edge indices into the board's compiled graph. Players are always either on top or on bottom, so
+        is_bottom is accepted for symmetry but only is_top selects the moves
 
         Note that this logic assumes the player can perform all moves, then filters out ones that are not possible in
         that position (i.e. top moves from bottom position and vice versa). This is an important distinction because it means
         that any player can perform a move that doesn't have a top or bottom tag on it regardless of their position
-        """
-        possible_moves = []
-        for outgoing_edge in self.board.get_node_data(self.current_node)['outgoing']:
-            # player is on top position but the move is for bottom position
-            if is_top and outgoing_edge['bottom']:
-                pass
-            # player is on bottom position but the move is for top position
-            elif is_bottom and outgoing_edge['top']:
-                pass
-            # no conflicts found, the move is valid
-            else:
-                move = (outgoing_edge['to'], self.board.get_edge_data(outgoing_edge['from'], outgoing_edge['to']))
-                possible_moves.append(move)
-
-        return possible_moves
 
-    def process_move(self, move: Tuple[int, Dict]) -> tuple[int, bool, bool]:
-        new_node, edge_data = move
-        points = self._calculate_points(edge_data)
-        player_tapped = edge_data.get('tap', False)
-        swap_players = edge_data.get('swaps_players', False)
-        self.update(new_node)
+        The moves come from the graph's precomputed legal-move index, so the returned tuple is shared and must not be
+        modified
+        """
+        return self.board.legal_moves.moves[self.current_node * 2 + is_top]
+
+    def process_move(self, move: int) -> tuple[int, bool, bool]:
+        compiled = self.board.compiled
+        points = self._calculate_points(move)
+        player_tapped = bool(compiled.tap[move])
+        swap_players = bool(compiled.swaps[move])
+        self.update(int(compiled.targets[move]))
         return points, player_tapped, swap_players
 
-    def _calculate_points(self, edge_data: Dict) -> int:
-        earned_points = 0  # iteratively add to this because a player may execute multiple maneuvers in the same move
-        for maneuver, points in self.board.rewards.items():
-            if edge_data.get(maneuver, False):
-                print(f'{maneuver} executed, player wins {points} points')
-                earned_points += points
-        return earned_points
+    def _calculate_points(self, move: int) -> int:
+        # a player may execute multiple maneuvers in the same move, so the compiled points are already summed
+        if self.log.verbose:
+            for maneuver in self.board.compiled.edge_maneuvers(move):
+                self.log.emit('maneuver', maneuver=maneuver, points=self.board.rewards[maneuver])
+        return int(self.board.compiled.points[move])
     def check_winner(self) -> Optional[str]:
-        node_data = self.board.get_node_data(self.current_node)
-        return node_data.get('winner')
+        return self.board.compiled.winner_name(self.current_node)
 
 class Player:
     # do I need the strategy property? revisit this
-    def __init__(self, name: str, strategy: str = 'random'):
+    def __init__(self, name: str, strategy: str = 'random', agent=None):
+        """
+        agent is an optional search agent, such as mcts.MCTSAgent, that chooses the player's moves with
+        agent.choose_move(game, possible_moves). The player's strategy is then the agent's
+        """
         self.name = name
         self.is_top = False
         self.is_bottom = False
         self.points = 0
-        self.strategy = strategy
+        self.agent = agent
+        self.strategy = strategy if agent is None else agent.strategy
 
-    def choose_move(self, possible_moves: List[Tuple[int, Dict]]) -> Tuple[int, Dict]:
+    def choose_move(self, possible_moves: Sequence[int], game: Optional['Game'] = None) -> int:
         assert possible_moves, "empty list of possible_moves passed to choose_move"
+        if self.agent is not None:
+            return self.agent.choose_move(game, possible_moves)
         if self.strategy == 'random':
             return random.choice(possible_moves)
         # Implement other strategies here
         return random.choice(possible_moves)
 
 class Game:
-    def __init__(self, name: str, max_turns=100):
+    def __init__(self, name: str, max_turns=100, board: Optional[Board] = None,
+                 verbosity: Union[int, GameLog] = QUIET, recorder: Optional[TrajectoryRecorder] = None,
+                 game_id: int = 0):
+        """
+        verbosity is a game_log level (QUIET, RESULTS or VERBOSE) or a GameLog to send the game's events to. The
+        default QUIET mode skips all narration, so bulk simulations do no string formatting or I/O per turn.
+        If a recorder is given, every turn is recorded to it under game_id. Each turn's TURN_FIELDS are appended to
+        `trajectory` as a tuple, and the turns go to the recorder in one go when the game ends, so the recording only
+        holds finished games
+        """
         self.name = name
-        self.board = Board(construct_graph())
-        self.game_state = GameState(self.board)
+        self.game_id = game_id
+        self.recorder = recorder
+        self.trajectory: List[Tuple[int, ...]] = []
+        # games share the process-wide compiled graph instead of constructing their own
+        self.board = board if board is not None else Board(get_compiled_graph())
+        self.log = as_log(verbosity)
+        self.game_state = GameState(self.board, self.log)
         self.max_turns = max_turns
         self.turn_count = 0
         self.player1: Optional[Player] = None
         self.player2: Optional[Player] = None
         self.current_player: Optional[Player] = None
         self.winner = None
+        # how play_game ended the match, one of batch_game's end reasons
+        self.end_reason = NOT_OVER
 
     def choose_other_player(self, player: Player) -> Player:
         if player is self.player1:
@@ -114,13 +139,29 @@ class Game:
         elif player is self.player2:
             return self.player1
 
-    def initialize_game(self, p1_name: str, p2_name: str):
-        print(f'Initializing game: {self.name}')
+    def initialize_game(self, p1_name: str, p2_name: str, player1_agent=None, player2_agent=None):
+        self.player1 = Player(p1_name, agent=player1_agent)
+        self.player2 = Player(p2_name, agent=player2_agent)
+        self.reset()
+
+    def reset(self):
+        """
+        Starts a new match between the same players on the same board: only the position, roles, scores, turn counter
+        and winner are reinitialised, drawing the position, roles and first mover like initialize_game. No game
+        objects are created, so BJJEnv.reset is cheap
+        """
+        if self.log.verbose:
+            self.log.emit('game_start', game=self.name)
         self.game_state.initialize()
-        self.player1 = Player(p1_name)
-        self.player2 = Player(p2_name)
+        self.player1.points = self.player2.points = 0
         self._randomly_assign_positions()
-        self.current_player = random.choice([self.player1, self.player2])
+        self.current_player = random.choice((self.player1, self.player2))
+        self.turn_count = 0
+        self.winner = None
+        self.end_reason = NOT_OVER
+        if self.trajectory:
+            # the turns of an unfinished game aren't recorded
+            self.trajectory.clear()
 
     def _randomly_assign_positions(self):
         """
@@ -133,19 +174,20 @@ class Game:
         self.player2.is_top = not self.player1.is_top
         self.player2.is_bottom = not self.player1.is_bottom
 
-        print(f'{self.player1.name} is on {"top" if self.player1.is_top else "bottom"}')
-        print(f'{self.player2.name} is on {"top" if self.player2.is_top else "bottom"}')
+        if self.log.verbose:
+            for player in (self.player1, self.player2):
+                self.log.emit('position_assigned', player=player.name, role='top' if player.is_top else 'bottom')
 
     def _swap_players_positions(self):
         """
         gives each player the other players' top and bottom position attributes
         """
-        cache = (self.player1.is_top, self.player1.is_top)
-        self.player1.is_top, self.player1.is_top = self.player2.is_top, self.player2.is_top
-        self.player2.is_top, self.player2.is_top = cache
+        cache = (self.player1.is_top, self.player1.is_bottom)
+        self.player1.is_top, self.player1.is_bottom = self.player2.is_top, self.player2.is_bottom
+        self.player2.is_top, self.player2.is_bottom = cache
 
-    def play_turn(self, chosen_move: Tuple[int, Dict]=None) -> bool:
-        if chosen_move:
+    def play_turn(self, chosen_move: Optional[int] = None) -> bool:
+        if chosen_move is not None:
             move = chosen_move
         else:
             possible_moves = self.game_state.get_possible_moves(self.current_player.is_top, self.current_player.is_bottom)
@@ -153,25 +195,36 @@ class Game:
                 # if current state is a terminal node, but not associated with a win or loss
                 if not self.game_state.board.get_outgoing_edges(self.game_state.current_node):
                     # change to random node, then allow player to play their turn
-                    print('Terminal position encountered. switching to random position ')
+                    if self.log.verbose:
+                        self.log.emit('dead_end', node=self.game_state.current_node)
                     self.game_state.initialize()
                     return self.play_turn()
                 else:
-                    print(f"No moves available for {self.current_player.name}. Switching players.")
+                    if self.log.verbose:
+                        self.log.emit('no_moves', player=self.current_player.name)
+                    if self.recorder is not None:
+                        self._record_turn(self.game_state.current_node, PASS, 0, NOT_OVER)
                     # note: maybe this shouldn't conclude the turn, and instead should switch players then call play_turn again
                     return self.switch_players()
             else:
-                move = self.current_player.choose_move(possible_moves)
+                move = self.current_player.choose_move(possible_moves, self)
+        from_node = self.game_state.current_node
         points, player_tapped, swap_players_positions = self.game_state.process_move(move)
         self.current_player.points += points
-        print(f"{self.current_player.name} performed '{move[1]['description']}'")
-        if points>0:
-            print(f'Player earned {points} points for that move')
+        if self.log.verbose:
+            self.log.emit('move', player=self.current_player.name, move=move,
+                          description=self.board.compiled.edge_descriptions[move])
+            if points>0:
+                self.log.emit('points_earned', player=self.current_player.name, points=points)
 
         if player_tapped:
             winning_player = self.choose_other_player(self.current_player)
-            print(f"{self.current_player.name} tapped - {winning_player.name} has won! ")
+            if self.log.results:
+                self.log.emit('tapped', player=self.current_player.name, winner=winning_player.name)
             self.winner = winning_player
+            self.end_reason = TAPPED
+            if self.recorder is not None:
+                self._record_turn(from_node, move, points, TAPPED)
             return True
 
         winner = self.game_state.check_winner()
@@ -180,14 +233,36 @@ class Game:
             winning_player = self.player1 if ((self.player1.is_top and winner == 'top') or
                                               (self.player1.is_bottom and winner == 'bottom')) else self.player2
             self.winner = winning_player
-            print(f"{winning_player.name} won by reaching a winning position!")
+            self.end_reason = WINNING_POSITION
+            if self.log.results:
+                self.log.emit('winning_position', winner=winning_player.name, node=self.game_state.current_node)
+            if self.recorder is not None:
+                self._record_turn(from_node, move, points, WINNING_POSITION)
             return True
 
+        if self.recorder is not None:
+            self._record_turn(from_node, move, points, NOT_OVER)
+
         if swap_players_positions:
             self._swap_players_positions()
 
         return self.switch_players()
 
+    def _record_turn(self, node: int, move: int, points: int, end_reason: int):
+        """records the current player's turn, which is called before their position is swapped"""
+        player = self.current_player
+        self.trajectory.append((self.turn_count, node, move, player is self.player2, player.is_top, points))
+        if end_reason != NOT_OVER or self.turn_count >= self.max_turns:
+            self._end_trajectory(end_reason)
+
+    def _end_trajectory(self, end_reason: int):
+        """hands the turns of a finished game to the recorder in one go"""
+        if end_reason == NOT_OVER:
+            # the game is decided on points after its last turn
+            end_reason = POINTS if self.player1.points != self.player2.points else TIE
+        self.recorder.record_game(self.game_id, self.trajectory, end_reason)
+        self.trajectory.clear()
+
     def switch_players(self) -> bool:
         self.current_player = self.player2 if self.current_player is self.player1 else self.player1
         return False
@@ -195,46 +270,59 @@ class Game:
     def check_for_points_win(self):
         if self.player1.points > self.player2.points:
             self.winner = self.player1
-            print(f"{self.player1.name} wins!")
+            if self.log.results:
+                self.log.emit('points_win', winner=self.player1.name)
         elif self.player2.points > self.player1.points:
             self.winner = self.player2
-            print(f"{self.player2.name} wins!")
-        else:
-            print("It's a tie!")
+            if self.log.results:
+                self.log.emit('points_win', winner=self.player2.name)
+        elif self.log.results:
+            self.log.emit('tie')
 
     def play_game(self):
         max_turns = self.max_turns
         for turn in range(1, max_turns + 1):
             self.turn_count += 1
-            print(f"\nTurn {turn}:")
+            if self.log.verbose:
+                self.log.emit('turn_start', turn=turn)
             if self.play_turn():
                 break
         if not self.winner:
             self.check_for_points_win()
+            self.end_reason = POINTS if self.winner else TIE
         self._print_game_result()
 
     def _print_game_result(self):
-        print("\nGame over! Final scores:")
-        print(f"{self.player1.name}: {self.player1.points}")
-        print(f"{self.player2.name}: {self.player2.points}")
+        if self.log.results:
+            self.log.emit('game_over', player1=self.player1.name, player1_points=self.player1.points,
+                          player2=self.player2.name, player2_points=self.player2.points)
 
 class Simulation:
-    def __init__(self, num_games: int):
+    def __init__(self, num_games: int, verbosity: Union[int, GameLog] = QUIET,
+                 recorder: Optional[TrajectoryRecorder] = None):
         self.num_games = num_games
+        # every game of the simulation reports to the same log, and to the same recorder with its index as game id
+        self.log = as_log(verbosity)
+        self.recorder = recorder
         self.games = []
         self.results = []
 
     def initialize_games(self, num_turns: int = 100):
-        print('Initializing games')
-        self.games = [Game(f"Game_{i}", max_turns= num_turns) for i in range(self.num_games)]
-        for game in tqdm(self.games):
+        if self.log.verbose:
+            self.log.emit('simulation_stage', stage='Initializing games')
+        board = Board(get_compiled_graph())
+        self.games = [Game(f"Game_{i}", max_turns= num_turns, board=board, verbosity=self.log,
+                           recorder=self.recorder, game_id=i)
+                      for i in range(self.num_games)]
+        for game in tqdm(self.games, disable=not self.log.verbose):
             game.initialize_game(f"Player1_{game.name}", f"Player2_{game.name}")
 
     def run_games(self):
-        print('running games')
+        if self.log.verbose:
+            self.log.emit('simulation_stage', stage='running games')
         with ThreadPoolExecutor() as executor:
             futures = [executor.submit(self.play_single_game, game) for game in self.games]
-            for future in tqdm(as_completed(futures)):
+            for future in tqdm(as_completed(futures), disable=not self.log.verbose):
                 self.results.append(future.result())
 
     def play_single_game(self, game: Game) -> Dict:
@@ -275,13 +363,15 @@ class Simulation:
         self.games = []
         self.results = []
 
-# Single game example
-game = Game("BJJ Simulation")
-game.initialize_game("Player 1", "Player 2")
-game.play_game()
-
-# Parallel multi-threaded example
-# simulation = Simulation(num_games=100)
-# simulation.initialize_games()
-# simulation.run_games(max_turns=200)
-# simulation.agg_results()
+if __name__ == "__main__":
+    print(format_load_report(get_load_report()))
+    # Single game example
+    game = Game("BJJ Simulation", verbosity=VERBOSE)
+    game.initialize_game("Player 1", "Player 2")
+    game.play_game()
+
+    # Parallel multi-threaded example
+    # simulation = Simulation(num_games=100)
+    # simulation.initialize_games()
+    # simulation.run_games(max_turns=200)
+    # simulation.agg_results()
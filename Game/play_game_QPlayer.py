@@ -1,4 +1,5 @@
-from play_game import Board, GameState, construct_graph
+from play_game import Board, GameState
+from Graph.graph_constructor import construct_graph
 import random
 import copy
 import numpy as np
@@ -16,7 +17,7 @@ class Player:
         self.strategy = strategy
         self.agent = None  # Will be set to a QLearningAgent if strategy is 'q_learning'
 
-    def choose_move(self, possible_moves: List[Tuple[int, Dict]]) -> Tuple[int, Dict]:
+    def choose_move(self, possible_moves: List[int]) -> int:
         if self.strategy == 'random':
             return random.choice(possible_moves)
         elif self.strategy == 'q_learning':
@@ -58,20 +59,20 @@ class QLearningAgent:
     def get_q_value(self, state: int, action: int) -> float:
         return self.q_table.get((state, action), 0.0)
 
-    def choose_action(self, state: int, possible_moves: List[Tuple[int, Dict]]) -> Tuple[int, Dict]:
+    def choose_action(self, state: int, possible_moves: List[int]) -> int:
         if np.random.rand() <= self.exploration_rate:
             return random.choice(possible_moves)
 
-        q_values = [self.get_q_value(state, move[0]) for move in possible_moves]
+        q_values = [self.get_q_value(state, move) for move in possible_moves]
         max_q = max(q_values)
         best_moves = [move for move, q in zip(possible_moves, q_values) if q == max_q]
         return random.choice(best_moves)
 
     def update(self, state: int, action: int, reward: float, next_state: int,
-               next_possible_moves: List[Tuple[int, Dict]]):
+               next_possible_moves: List[int]):
         current_q = self.get_q_value(state, action)
         if next_possible_moves:
-            max_next_q = max(self.get_q_value(next_state, move[0]) for move in next_possible_moves)
+            max_next_q = max(self.get_q_value(next_state, move) for move in next_possible_moves)
         else:
             max_next_q = 0
 
@@ -212,7 +213,7 @@ class Game:
             action = current_player.choose_move(state, possible_moves)
             points, player_tapped, swap_players_positions = self.game_state.process_move(action)
             current_player.points += points
-            print(f"{current_player.name} performed '{action[1]['description']}'")
+            print(f"{current_player.name} performed '{self.board.compiled.edge_descriptions[action]}'")
             if points > 0:
                 print(f'Player earned {points} points for that move')
 
@@ -224,7 +225,7 @@ class Game:
                     not current_player.is_top if swap_players_positions else current_player.is_top,
                     not current_player.is_bottom if swap_players_positions else current_player.is_bottom
                 )
-                current_player.agent.update(state, action[0], reward, next_state, next_possible_moves)
+                current_player.agent.update(state, action, reward, next_state, next_possible_moves)
 
             if player_tapped:
                 winning_player = self.choose_other_player(self.current_player)
@@ -142,7 +142,7 @@ class Game:
             move = self.current_player.choose_move(possible_moves)
             points, player_tapped, swap_players_positions = self.game_state.process_move(move)
             self.current_player.points += points
-            print(f"{self.current_player.name} performed '{move[1]['description']}'")
+            print(f"{self.current_player.name} performed '{self.board.compiled.edge_descriptions[move]}'")
             if points>0:
                 print(f'Player earned {points} points for that move')
 
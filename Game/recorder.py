@@ -0,0 +1,197 @@
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is only needed to write Parquet or Arrow files
+    pa = pq = None
+
+# one row per turn: the game, the turn number, the node and position the acting player moved from, the edge index
+# they played (-1 for a pass), the points they earned and the reason the game ended on that turn (batch_game.NOT_OVER
+# if it didn't)
+TRAJECTORY_COLUMNS = (
+    ('game', np.int64),
+    ('turn', np.int32),
+    ('node', np.int32),
+    ('edge', np.int32),
+    ('player', np.int8),
+    ('on_top', np.bool_),
+    ('points', np.int16),
+    ('end_reason', np.int8),
+)
+# the columns that change from turn to turn within a game, in the order of the turns handed to record_game
+TURN_FIELDS = ('turn', 'node', 'edge', 'player', 'on_top', 'points')
+# finished scalar games are pooled until they hold this many turns, then converted to columns together
+GAME_BATCH_ROWS = 1 << 14
+FORMATS = {'parquet': '.parquet', 'arrow': '.arrow', 'npz': ''}
+
+
+class TrajectoryRecorder:
+    """
+    Records every turn of the games played by Game.play_turn or BatchGame.step into fixed-size columnar chunks.
+    Scalar games hand over their turns with record_game once they are over, batched games their rows with reserve or
+    record_batch.
+
+    Rows go into preallocated NumPy arrays of chunk_size rows, and a full chunk is flushed to disk as a Parquet row
+    group, an Arrow IPC record batch, or (format='npz', without pyarrow) a numbered .npz file in the directory `path`.
+    Chunks are written by a background thread while the game fills a second buffer, so at most two chunks are held in
+    memory however many games are recorded. Passing the compiled graph's edge_ids adds an edge_id column with the
+    GrappleMap id of each played edge.
+
+    close() (or leaving the context manager) flushes the last, partial chunk and closes the file
+    """
+    def __init__(self, path: str, format: str = 'parquet', chunk_size: int = 1 << 16,
+                 edge_ids: Optional[np.ndarray] = None):
+        if format not in FORMATS:
+            raise ValueError(f'unknown trajectory format {format!r}, expected one of {sorted(FORMATS)}')
+        if format != 'npz' and pa is None:
+            raise ImportError(f"writing {format} trajectories requires pyarrow; install it or use format='npz'")
+        self.path = path
+        self.format = format
+        self.chunk_size = chunk_size
+        self.edge_ids = None if edge_ids is None else np.asarray(edge_ids)
+        self.columns = {name: np.zeros(chunk_size, dtype=dtype) for name, dtype in TRAJECTORY_COLUMNS}
+        self._spare_columns = {name: np.zeros(chunk_size, dtype=dtype) for name, dtype in TRAJECTORY_COLUMNS}
+        self.size = 0
+        self.num_rows = 0
+        self.num_chunks = 0
+        self._writer = None
+        self._write_thread = ThreadPoolExecutor(max_workers=1)
+        self._pending: Optional[Future] = None
+        # Simulation plays games on a thread pool that shares one recorder
+        self._lock = threading.Lock()
+        # the turns of the finished scalar games not converted yet, and the game id, number of turns and end reason of
+        # each of those games
+        self._game_turns: List[Tuple[int, ...]] = []
+        self._games: List[Tuple[int, int, int]] = []
+        if format == 'npz':
+            os.makedirs(path, exist_ok=True)
+
+    def record_game(self, game: int, turns: List[Tuple[int, ...]], end_reason: int):
+        """
+        appends the rows of one finished game. turns holds a tuple of the TURN_FIELDS of every turn in order. Games are
+        pooled and converted to columns together, which is much cheaper than an array per game for short games
+        """
+        with self._lock:
+            self._game_turns += turns
+            self._games.append((game, len(turns), end_reason))
+            if len(self._game_turns) < GAME_BATCH_ROWS:
+                return
+        self._record_pooled_games()
+
+    def _record_pooled_games(self):
+        with self._lock:
+            if not self._games:
+                return
+            turns, games = self._game_turns, self._games
+            self._game_turns, self._games = [], []
+        table = np.array(turns, dtype=np.int64).reshape(-1, len(TURN_FIELDS))
+        game_ids, counts, end_reasons = np.array(games, dtype=np.int64).T
+        end_reason = np.zeros(len(table), dtype=np.int8)
+        end_reason[np.cumsum(counts) - 1] = end_reasons
+        self.record_batch(game=np.repeat(game_ids, counts), end_reason=end_reason,
+                          **{name: table[:, field] for field, name in enumerate(TURN_FIELDS)})
+
+    def record_batch(self, **columns: np.ndarray):
+        """appends one row per element of the given arrays, which are keyed like TRAJECTORY_COLUMNS"""
+        with self._lock:
+            total = len(columns['game'])
+            start = 0
+            while start < total:
+                count = min(self.chunk_size - self.size, total - start)
+                for name, values in columns.items():
+                    self.columns[name][self.size:self.size + count] = values[start:start + count]
+                self.size += count
+                start += count
+                if self.size == self.chunk_size:
+                    self._flush()
+
+    def reserve(self, count: int) -> Dict[str, np.ndarray]:
+        """
+        Appends count rows and returns writable views of them, one per column, so batched callers can gather values
+        straight into the chunk. The views must be filled before the next call to the recorder, which may flush them.
+        count can't be larger than chunk_size
+        """
+        with self._lock:
+            if self.size + count > self.chunk_size:
+                self._flush()
+            start = self.size
+            self.size += count
+            return {name: values[start:self.size] for name, values in self.columns.items()}
+
+    def flush(self):
+        self._record_pooled_games()
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if self.size == 0:
+            return
+        chunk = {name: values[:self.size] for name, values in self.columns.items()}
+        # the spare buffer is free again once the chunk before this one has been written
+        self._wait_for_write()
+        self._pending = self._write_thread.submit(self._write_chunk, chunk, self.num_chunks)
+        self.columns, self._spare_columns = self._spare_columns, self.columns
+        self.num_rows += self.size
+        self.num_chunks += 1
+        self.size = 0
+
+    def _wait_for_write(self):
+        if self._pending is not None:
+            self._pending.result()
+            self._pending = None
+
+    def _write_chunk(self, chunk: Dict[str, np.ndarray], index: int):
+        if self.edge_ids is not None:
+            edges = chunk['edge']
+            chunk['edge_id'] = np.where(edges >= 0, self.edge_ids[edges], -1)
+        if self.format == 'npz':
+            np.savez(os.path.join(self.path, f'chunk_{index:06d}.npz'), **chunk)
+        else:
+            batch = pa.RecordBatch.from_arrays([pa.array(values) for values in chunk.values()], names=list(chunk))
+            if self._writer is None:
+                if self.format == 'parquet':
+                    self._writer = pq.ParquetWriter(self.path, batch.schema)
+                else:
+                    self._writer = pa.ipc.new_file(self.path, batch.schema)
+            if self.format == 'parquet':
+                self._writer.write_table(pa.Table.from_batches([batch]))
+            else:
+                self._writer.write_batch(batch)
+
+    def close(self):
+        self._record_pooled_games()
+        with self._lock:
+            self._flush()
+            self._wait_for_write()
+            self._write_thread.shutdown()
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+    def __enter__(self) -> 'TrajectoryRecorder':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def read_trajectories(path: str, format: str = 'parquet') -> Dict[str, np.ndarray]:
+    """loads a file (or npz directory) written by TrajectoryRecorder into one array per column"""
+    if format == 'npz':
+        chunks = [np.load(os.path.join(path, name)) for name in sorted(os.listdir(path)) if name.endswith('.npz')]
+        if not chunks:
+            return {name: np.zeros(0, dtype=dtype) for name, dtype in TRAJECTORY_COLUMNS}
+        return {name: np.concatenate([chunk[name] for chunk in chunks]) for name in chunks[0].files}
+    if pa is None:
+        raise ImportError(f'reading {format} trajectories requires pyarrow')
+    if format == 'parquet':
+        table = pq.read_table(path)
+    else:
+        with pa.ipc.open_file(path) as reader:
+            table = reader.read_all()
+    return {name: table.column(name).to_numpy() for name in table.column_names}
@@ -0,0 +1,235 @@
+import time
+import numpy as np
+from typing import Dict, Optional, Sequence
+from Graph.compiled_graph import CompiledGraph, WINNER_TOP
+from Graph.graph_cache import format_load_report, get_compiled_graph, get_load_report
+from play_game import Board, Game
+from batch_game import START_NODE
+from mcts import search_state
+
+# policy entry of states without a move to choose: passes, dead ends and the end of the game
+NO_MOVE = -1
+
+
+class GameSolver:
+    """
+    Exact game values by backward induction over every (turns left, point difference, node, mover on top) state, for
+    games of up to max_turns turns.
+
+    Values are those of the player to move under perfect play by both players: +1 for a win, -1 for a loss and 0 for
+    a tie, with the rules of BatchGame. Nodes without outgoing edges restart the game from a random position, so
+    their values are expectations over GameState.initialize's restart distribution (expectimax), which makes them
+    fractional.
+
+    The values are memoized in a dense float32 table values[turns_left, diff + max_diff, node*2 + top], built one
+    turn at a time from the table of the turn before, along with the best move of every state as its slot in the
+    graph's legal-move order. Point differences are clamped to +-max_diff, which is exact as long as max_diff is
+    larger than the points that can still be scored (see `exact`). Dominated moves are pruned before solving: a move
+    that wins on the spot decides its state, moves that lose on the spot (taps, winning positions for the other
+    player) are only kept when there is nothing else, and of several moves to the same position only the one earning
+    the most points is kept.
+
+    The solved tables can be saved and loaded, and the solver plays perfectly as a Player's agent with O(1) lookups
+    """
+    strategy = 'solver'
+
+    def __init__(self, graph: Optional[CompiledGraph] = None, max_turns: int = 100, max_diff: int = 32):
+        self.graph = graph if graph is not None else get_compiled_graph()
+        self.max_turns = max_turns
+        self.max_diff = max_diff
+        legal_moves = self.graph.legal_moves
+        self.legal_offsets, self.legal_counts, self.legal_edges = legal_moves.offsets, legal_moves.counts, legal_moves.edges
+        self.values: Optional[np.ndarray] = None
+        self.policy: Optional[np.ndarray] = None
+        self.elapsed = 0.0
+
+    @property
+    def exact(self) -> bool:
+        """whether clamping the point difference can't change any value, as no player can score max_diff points"""
+        return self.max_diff > int(self.graph.points.max(initial=0)) * self.max_turns
+
+    def restart_distribution(self) -> np.ndarray:
+        """probability of every node being the restart position, drawn like GameState.initialize until it has moves"""
+        num_nodes = self.graph.num_nodes
+        weights = np.full(num_nodes, 0.5 / num_nodes)
+        weights[START_NODE] += 0.5
+        weights[np.diff(self.graph.offsets) == 0] = 0
+        return weights / weights.sum()
+
+    def _pruned_moves(self):
+        """
+        the legal moves left after pruning, as (state, slot, edge) arrays sorted by state, then the value of states
+        decided without looking ahead (+1 if a move wins on the spot, -1 if every move loses on the spot, nan if not)
+        and the slot of the move they play: the first winning move, or the first of the losing ones
+        """
+        graph = self.graph
+        num_states = len(self.legal_counts)
+        states = np.repeat(np.arange(num_states), self.legal_counts)
+        slots = np.arange(len(self.legal_edges)) - self.legal_offsets[states]
+        edges = self.legal_edges
+        tops = states % 2 == 1
+        node_winner = graph.winner[graph.targets[edges]]
+        wins = ~graph.tap[edges] & (node_winner != 0) & ((node_winner == WINNER_TOP) == tops)
+        losses = graph.tap[edges] | ((node_winner != 0) & ~wins)
+
+        decided = np.full(num_states, np.nan, dtype=np.float32)
+        decided[self.legal_counts > 0] = -1
+        decided[np.unique(states[~losses])] = np.nan
+        decided[states[wins]] = 1
+        decided_slots = np.full(num_states, NO_MOVE, dtype=np.int16)
+        decided_slots[decided == -1] = 0
+        won_states, first_wins = np.unique(states[wins], return_index=True)
+        decided_slots[won_states] = slots[wins][first_wins]
+        keep = ~losses & np.isnan(decided[states])
+        # of several moves from a state to the same position, only the one earning the most points matters, since
+        # values never decrease with the mover's points
+        next_states = graph.targets[edges] * 2 + (tops == graph.swaps[edges])
+        order = np.lexsort((-graph.points[edges], next_states, states))
+        order = order[keep[order]]
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = (states[order][1:] != states[order][:-1]) | (next_states[order][1:] != next_states[order][:-1])
+        order = np.sort(order[first])
+        return states[order], slots[order], edges[order], decided, decided_slots
+
+    def solve(self) -> np.ndarray:
+        """fills in the value and policy tables and returns the values"""
+        start = time.perf_counter()
+        graph = self.graph
+        num_states = len(self.legal_counts)
+        max_diff = self.max_diff
+        diffs = np.arange(-max_diff, max_diff + 1)
+        move_states, move_slots, move_edges, decided, decided_slots = self._pruned_moves()
+        move_points = graph.points[move_edges].astype(np.int64)
+        move_next = graph.targets[move_edges] * 2 + ((move_states % 2 == 1) == graph.swaps[move_edges])
+        # the next mover's point difference, as an index into the diff axis, for every (diff, move)
+        next_diffs = np.clip(-(diffs[:, None] + move_points), -max_diff, max_diff) + max_diff
+        group_starts = np.flatnonzero(np.r_[True, move_states[1:] != move_states[:-1]])
+        searched = move_states[group_starts]
+        stuck = np.flatnonzero(self.legal_counts == 0)
+        dead_ends = stuck[np.diff(graph.offsets)[stuck // 2] == 0]
+        passes = stuck[np.diff(graph.offsets)[stuck // 2] > 0]
+        restart = self.restart_distribution()
+        restart_nodes = np.flatnonzero(restart)
+        is_decided = ~np.isnan(decided)
+
+        values = np.empty((self.max_turns + 1, len(diffs), num_states), dtype=np.float32)
+        policy = np.full(values.shape, NO_MOVE, dtype=np.int16)
+        values[0] = np.sign(diffs)[:, None]
+        for turns_left in range(1, self.max_turns + 1):
+            previous, current = values[turns_left - 1], values[turns_left]
+            # the player to move gets the opposite of the next mover's value
+            move_values = -previous[next_diffs, move_next]
+            best = np.maximum.reduceat(move_values, group_starts, axis=1)
+            current[:, searched] = best
+            # the first move reaching the best value, like np.argmax
+            is_best = move_values == np.repeat(best, np.diff(np.r_[group_starts, len(move_states)]), axis=1)
+            first_best = np.minimum.reduceat(np.where(is_best, np.arange(len(move_states)), len(move_states)),
+                                             group_starts, axis=1)
+            policy[turns_left][:, searched] = move_slots[first_best]
+
+            current[:, is_decided] = decided[is_decided]
+            policy[turns_left][:, is_decided] = decided_slots[is_decided]
+            current[:, passes] = -previous[::-1][:, passes ^ 1]
+            # restarts keep the mover's position, difference and turns, on a random node with moves
+            for top in (0, 1):
+                restart_values = current[:, restart_nodes * 2 + top] @ restart[restart_nodes]
+                top_dead_ends = dead_ends[dead_ends % 2 == top]
+                current[:, top_dead_ends] = restart_values[:, None]
+
+        self.values, self.policy = values, policy
+        self.elapsed = time.perf_counter() - start
+        return values
+
+    def _index(self, node: int, top: bool, diff: int, turns_left: int):
+        if self.values is None:
+            raise RuntimeError('the solver has not been solved or loaded yet')
+        if not 0 <= turns_left <= self.max_turns:
+            raise ValueError(f'turns_left must be between 0 and {self.max_turns}, not {turns_left}')
+        return turns_left, min(max(diff, -self.max_diff), self.max_diff) + self.max_diff, node * 2 + top
+
+    def value(self, node: int, top: bool, diff: int, turns_left: int) -> float:
+        """value of the state for the player to move, who is diff points ahead"""
+        return float(self.values[self._index(node, top, diff, turns_left)])
+
+    def best_move(self, node: int, top: bool, diff: int, turns_left: int) -> int:
+        """edge index of a perfect move, or NO_MOVE if the player to move has no choice to make"""
+        index = self._index(node, top, diff, turns_left)
+        slot = int(self.policy[index])
+        return NO_MOVE if slot == NO_MOVE else int(self.legal_edges[self.legal_offsets[index[2]] + slot])
+
+    def move_values(self, node: int, top: bool, diff: int, turns_left: int) -> np.ndarray:
+        """values of every legal move for the player to move, in legal-move order"""
+        graph = self.graph
+        state = node * 2 + top
+        edges = self.legal_edges[self.legal_offsets[state]:self.legal_offsets[state] + self.legal_counts[state]]
+        values = np.empty(len(edges), dtype=np.float32)
+        for index, edge in enumerate(edges):
+            node_winner = graph.winner[graph.targets[edge]]
+            if graph.tap[edge]:
+                values[index] = -1
+            elif node_winner != 0:
+                values[index] = 1 if (node_winner == WINNER_TOP) == top else -1
+            else:
+                next_state = self._index(int(graph.targets[edge]), top == graph.swaps[edge],
+                                         -(diff + int(graph.points[edge])), turns_left - 1)
+                values[index] = -self.values[next_state]
+        return values
+
+    def choose_move(self, game: Game, possible_moves: Sequence[int]) -> int:
+        move = self.best_move(*search_state(game))
+        assert move in possible_moves
+        return move
+
+    def search(self, node: int, top: bool, diff: int, turns_left: int) -> int:
+        # the same interface as the search agents, so they can be compared with evaluate_agent
+        return self.best_move(node, top, diff, turns_left)
+
+    def evaluate_agent(self, agent, num_positions: int = 100, turns_left: int = 10, seed: int = 0) -> Dict[str, float]:
+        """
+        Compares the moves an agent with a search(node, top, diff, turns_left) method (such as mcts.MCTSAgent) picks
+        from random positions with a choice of moves against perfect play. Returns the share of positions where its
+        move is as good as the best one, and the mean value it gives away
+        """
+        rng = np.random.default_rng(seed)
+        states = np.flatnonzero(self.legal_counts > 1)
+        optimal, regret = 0, 0.0
+        for state in rng.choice(states, size=num_positions):
+            node, top = int(state) // 2, bool(state % 2)
+            diff = int(rng.integers(-self.max_diff // 4, self.max_diff // 4 + 1))
+            values = self.move_values(node, top, diff, turns_left)
+            edges = self.legal_edges[self.legal_offsets[state]:self.legal_offsets[state] + self.legal_counts[state]]
+            chosen = values[list(edges).index(agent.search(node, top, diff, turns_left))]
+            optimal += chosen >= values.max()
+            regret += values.max() - chosen
+        return {'optimal_moves': optimal / num_positions, 'mean_regret': regret / num_positions}
+
+    def save(self, path: str):
+        """writes the solved tables to an .npz file"""
+        np.savez(path, values=self.values, policy=self.policy, max_turns=self.max_turns, max_diff=self.max_diff)
+
+    @classmethod
+    def load(cls, path: str, graph: Optional[CompiledGraph] = None) -> 'GameSolver':
+        """a solver for graph (the cached GrappleMap graph by default) with the tables of an .npz file from save"""
+        with np.load(path) as tables:
+            solver = cls(graph, max_turns=int(tables['max_turns']), max_diff=int(tables['max_diff']))
+            solver.values, solver.policy = tables['values'], tables['policy']
+        if solver.values.shape[2] != len(solver.legal_counts):
+            raise ValueError(f'{path} was solved for a graph with {solver.values.shape[2]} states, not '
+                             f'{len(solver.legal_counts)}')
+        return solver
+
+
+if __name__ == "__main__":
+    # solve the GrappleMap graph, then let perfect play take on a random player
+    solver = GameSolver()
+    print(format_load_report(get_load_report()))
+    solver.solve()
+    print(f'solved {solver.values.size} states in {solver.elapsed:.2f}s (exact: {solver.exact})')
+    board = Board(solver.graph)
+    results = {'Solver': 0, 'Random': 0, 'Tie': 0}
+    for i in range(1000):
+        game = Game(f'Game_{i}', board=board)
+        game.initialize_game('Solver', 'Random', player1_agent=solver)
+        game.play_game()
+        results[game.winner.name if game.winner else 'Tie'] += 1
+    print(results)
@@ -0,0 +1,212 @@
+import numpy as np
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, Optional, Sequence, Type, Union
+from observation import observation_fields
+
+# point differences are bucketed by how many of these edges they reach: <= -7, -6..-4, -3..-1, 0, 1..3, 4..6, >= 7,
+# so buckets are about one sweep, pass or mount wide
+SCORE_EDGES = (-6, -3, 0, 1, 4, 7)
+TURN_BUCKETS = 4
+HASH_BUCKETS = 1 << 16
+# dense Q-tables larger than this go to SparseQTable when make_q_table picks the backend
+DENSE_LIMIT_BYTES = 256 << 20
+Q_DTYPE = np.float32
+
+StateIndex = Union[int, np.ndarray]
+STATE_ENCODERS: Dict[str, Type['StateEncoder']] = {}
+
+
+def register_encoder(name: str) -> Callable[[Type['StateEncoder']], Type['StateEncoder']]:
+    """registers a StateEncoder subclass under name, for make_encoder"""
+    def register(cls: Type['StateEncoder']) -> Type['StateEncoder']:
+        cls.name = name
+        STATE_ENCODERS[name] = cls
+        return cls
+    return register
+
+
+def make_encoder(name: str, num_nodes: int, max_turns: int = 100, **options) -> 'StateEncoder':
+    if name not in STATE_ENCODERS:
+        raise ValueError(f"unknown state encoder {name!r}, expected one of {list(STATE_ENCODERS)}")
+    return STATE_ENCODERS[name](num_nodes, max_turns, **options)
+
+
+class StateEncoder(ABC):
+    """
+    Maps observations to Q-table row indices in [0, num_states).
+
+    encode takes the fields of the observation as scalars, giving an int, or as arrays of the states of many envs,
+    giving an array of indices. encode_observation does the same for observations of BJJEnv or BJJVectorEnv in any of
+    their observation modes
+    """
+    name: Optional[str] = None
+
+    def __init__(self, num_nodes: int, max_turns: int = 100):
+        self.num_nodes = num_nodes
+        self.max_turns = max_turns
+
+    @property
+    @abstractmethod
+    def num_states(self) -> int:
+        ...
+
+    @abstractmethod
+    def encode(self, position: StateIndex, on_top: StateIndex, point_difference: StateIndex = 0,
+               turns_left: StateIndex = 0) -> StateIndex:
+        ...
+
+    def encode_observation(self, observation: Union[Dict[str, Any], np.ndarray]) -> StateIndex:
+        fields = observation_fields(observation, self.num_nodes)
+        return self.encode(fields['current_position'], fields['on_top'], fields['point_difference'],
+                           fields['turns_left'])
+
+    def table_bytes(self, num_actions: int, dtype=Q_DTYPE) -> int:
+        """size of a dense Q-table of this encoding"""
+        return self.num_states * num_actions * np.dtype(dtype).itemsize
+
+
+@register_encoder('node_role')
+class NodeRoleEncoder(StateEncoder):
+    """node * 2 + is_top, the encoding of gym_env.state_to_index and of the original q_learning"""
+    @property
+    def num_states(self) -> int:
+        return self.num_nodes * 2
+
+    def encode(self, position, on_top, point_difference=0, turns_left=0):
+        return position * 2 + on_top
+
+
+@register_encoder('node_role_score')
+class NodeRoleScoreEncoder(NodeRoleEncoder):
+    """node x role x bucket of the mover's point difference, bucketed by the score_edges it reaches"""
+    def __init__(self, num_nodes: int, max_turns: int = 100, score_edges: Sequence[int] = SCORE_EDGES):
+        super().__init__(num_nodes, max_turns)
+        self.score_edges = np.asarray(score_edges)
+
+    @property
+    def num_buckets(self) -> int:
+        return len(self.score_edges) + 1
+
+    @property
+    def num_states(self) -> int:
+        return self.num_nodes * 2 * self.num_buckets
+
+    def bucket(self, point_difference: StateIndex) -> StateIndex:
+        return np.searchsorted(self.score_edges, point_difference, side='right')
+
+    def encode(self, position, on_top, point_difference=0, turns_left=0):
+        return (position * 2 + on_top) * self.num_buckets + self.bucket(point_difference)
+
+
+@register_encoder('node_role_turns')
+class NodeRoleTurnsEncoder(NodeRoleEncoder):
+    """node x role x which of turn_buckets equal stretches of the match the turns left fall in"""
+    def __init__(self, num_nodes: int, max_turns: int = 100, turn_buckets: int = TURN_BUCKETS):
+        super().__init__(num_nodes, max_turns)
+        self.turn_buckets = turn_buckets
+
+    @property
+    def num_states(self) -> int:
+        return self.num_nodes * 2 * self.turn_buckets
+
+    def bucket(self, turns_left: StateIndex) -> StateIndex:
+        return np.minimum(turns_left, self.max_turns) * self.turn_buckets // (self.max_turns + 1)
+
+    def encode(self, position, on_top, point_difference=0, turns_left=0):
+        return (position * 2 + on_top) * self.turn_buckets + self.bucket(turns_left)
+
+
+@register_encoder('hashed_cross')
+class HashedCrossEncoder(StateEncoder):
+    """
+    The cross of node, role, score bucket and turns bucket, hashed into num_buckets states. With the default
+    buckets the full cross has num_nodes * 2 * 7 * 4 states, most of which never occur, so hashing bounds the table
+    at the cost of the odd collision between two states. When the full cross fits in num_buckets it is used as it is,
+    which is smaller and has no collisions
+    """
+    def __init__(self, num_nodes: int, max_turns: int = 100, num_buckets: int = HASH_BUCKETS,
+                 score_edges: Sequence[int] = SCORE_EDGES, turn_buckets: int = TURN_BUCKETS):
+        super().__init__(num_nodes, max_turns)
+        self._score = NodeRoleScoreEncoder(num_nodes, max_turns, score_edges)
+        self._turns = NodeRoleTurnsEncoder(num_nodes, max_turns, turn_buckets)
+        self.cross_size = self._score.num_states * turn_buckets
+        self.hashed = self.cross_size > num_buckets
+        self.num_buckets = num_buckets if self.hashed else self.cross_size
+
+    @property
+    def num_states(self) -> int:
+        return self.num_buckets
+
+    def encode(self, position, on_top, point_difference=0, turns_left=0):
+        score_state = self._score.encode(position, on_top, point_difference)
+        cross = score_state * self._turns.turn_buckets + self._turns.bucket(turns_left)
+        if not self.hashed:
+            return cross if np.ndim(cross) else int(cross)
+        # the index of the state in the full cross, scrambled with a splitmix64 finalizer before taking the modulo
+        key = np.asarray(cross, dtype=np.uint64)
+        with np.errstate(over='ignore'):
+            key = (key ^ (key >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+            key = (key ^ (key >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+            key ^= key >> np.uint64(31)
+        index = (key % np.uint64(self.num_buckets)).astype(np.int64)
+        return int(index) if index.ndim == 0 else index
+
+
+class SparseQTable:
+    """
+    A num_states x num_actions Q-table whose rows are only allocated when a state is first looked up, for
+    encodings with far more states than a run visits. Indexing a state gives its row, which can be updated in place
+    like a row of an ndarray table; table[state, action] reads and writes single Q-values
+    """
+    def __init__(self, num_states: int, num_actions: int, dtype=Q_DTYPE):
+        self.shape = (num_states, num_actions)
+        self.dtype = np.dtype(dtype)
+        self.rows: Dict[int, np.ndarray] = {}
+
+    def row(self, state: int) -> np.ndarray:
+        row = self.rows.get(state)
+        if row is None:
+            if not 0 <= state < self.shape[0]:
+                raise IndexError(f"state {state} is out of range for a table of {self.shape[0]} states")
+            row = self.rows[state] = np.zeros(self.shape[1], dtype=self.dtype)
+        return row
+
+    def __getitem__(self, index):
+        if isinstance(index, tuple):
+            state, action = index
+            return self.row(int(state))[action]
+        return self.row(int(index))
+
+    def __setitem__(self, index, value):
+        if isinstance(index, tuple):
+            state, action = index
+            self.row(int(state))[action] = value
+        else:
+            self.row(int(index))[:] = value
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.rows) * self.shape[1] * self.dtype.itemsize
+
+    def to_dense(self) -> np.ndarray:
+        table = np.zeros(self.shape, dtype=self.dtype)
+        for state, row in self.rows.items():
+            table[state] = row
+        return table
+
+
+def make_q_table(num_states: int, num_actions: int, dtype=Q_DTYPE,
+                 sparse: Optional[bool] = None) -> Union[np.ndarray, SparseQTable]:
+    """
+    A zeroed Q-table. float32 halves the memory of the float64 tables q_learning used to make, with far more
+    precision than the Q-values need. sparse=None picks a SparseQTable when the dense table would be over
+    DENSE_LIMIT_BYTES
+    """
+    if sparse is None:
+        sparse = num_states * num_actions * np.dtype(dtype).itemsize > DENSE_LIMIT_BYTES
+    if sparse:
+        return SparseQTable(num_states, num_actions, dtype)
+    return np.zeros((num_states, num_actions), dtype=dtype)
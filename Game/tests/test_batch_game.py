@@ -0,0 +1,63 @@
+import random
+import numpy as np
+import pytest
+from Graph.compiled_graph import compile_graph
+from play_game import Game, Board
+from batch_game import BatchGame, PASS, NO_WINNER, PLAYER1, PLAYER2
+
+
+@pytest.mark.parametrize('max_turns', [4, 30])
+def test_matches_scalar_game(annotated_graph, max_turns):
+    """plays the same moves in scalar Games and a BatchGame and checks that every match ends the same way"""
+    num_games = 200
+    board = Board(compile_graph(annotated_graph))
+    random.seed(0)
+    games = [Game(f'Game_{i}', max_turns=max_turns, board=board) for i in range(num_games)]
+    for game in games:
+        game.initialize_game('Player 1', 'Player 2')
+
+    batch = BatchGame(num_games, max_turns=max_turns, graph=board.compiled, seed=0)
+    batch.reset(nodes=[game.game_state.current_node for game in games],
+                player1_top=[game.player1.is_top for game in games],
+                first_mover=[PLAYER1 if game.current_player is game.player1 else PLAYER2 for game in games])
+    out_degree = np.diff(board.compiled.offsets)
+
+    for _ in range(max_turns):
+        moves = batch.sample_random_moves()
+        for i, game in enumerate(games):
+            if batch.done[i]:
+                continue
+            if game.game_state.current_node != batch.node[i]:
+                # the batch engine already moved this game off a dead end; the scalar game would do it next turn
+                assert out_degree[game.game_state.current_node] == 0
+                game.game_state.current_node = int(batch.node[i])
+            assert game.current_player.is_top == batch.mover_top[i]
+            assert game.current_player.is_bottom != batch.mover_top[i]
+            game.turn_count += 1
+            if moves[i] == PASS:
+                assert game.game_state.get_possible_moves(game.current_player.is_top,
+                                                          game.current_player.is_bottom) == ()
+                game.play_turn()
+            else:
+                game.play_turn(int(moves[i]))
+        batch.step(moves)
+        if batch.done.all():
+            break
+
+    assert batch.done.all()
+    for i, game in enumerate(games):
+        if not game.winner:
+            game.check_for_points_win()
+        expected_winner = {None: NO_WINNER, game.player1: PLAYER1, game.player2: PLAYER2}[game.winner]
+        assert batch.winner[i] == expected_winner
+        assert list(batch.scores[i]) == [game.player1.points, game.player2.points]
+        assert batch.turn[i] == game.turn_count
+
+
+def test_play_random_finishes_every_game(annotated_graph):
+    batch = BatchGame(500, max_turns=50, graph=compile_graph(annotated_graph), seed=1)
+    winners = batch.play_random()
+    assert batch.done.all()
+    assert (batch.turn <= 50).all()
+    assert set(np.unique(winners)) <= {NO_WINNER, PLAYER1, PLAYER2}
+    assert len(batch.results()) == 500
@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+from Graph.compiled_graph import compile_graph
+from play_game import Board
+from gym_env import BJJEnv, state_to_index, get_masked_q_values
+from fast_qlearning import QTrainer, njit
+
+
+def reference_q_learning(env, starts, randoms, max_turns, learning_rate, discount_factor, epsilon):
+    """gym_env.q_learning, with the start positions and random draws of every episode passed in"""
+    q_table = np.zeros((env.num_nodes * 2, env.action_space.n))
+    for (node, top), episode_randoms in zip(starts, randoms):
+        env.reset()
+        env.game.max_turns = max_turns
+        env.game.game_state.current_node = int(node)
+        player, other = env.game.current_player, env.game.choose_other_player(env.game.current_player)
+        player.is_top, player.is_bottom = bool(top), not top
+        other.is_top, other.is_bottom = not top, bool(top)
+        state_obs, info = env._get_obs(), {'action_mask': env._get_action_mask()}
+        done = False
+        turn = 0
+        while not done:
+            if not any(info['action_mask']):
+                break
+            state_index = state_to_index(state_obs)
+            explore, pick = episode_randoms[turn]
+            if explore < epsilon:
+                legal = np.where(info['action_mask'])[0]
+                action = legal[int(pick * len(legal))]
+            else:
+                action = np.argmax(get_masked_q_values(q_table[state_index, :], info['action_mask']))
+            next_state_obs, reward, done, _, info = env.step(action)
+            next_state_index = state_to_index(next_state_obs)
+            best_next_action = np.argmax(get_masked_q_values(q_table[next_state_index], info['action_mask']))
+            td_target = reward + discount_factor * q_table[next_state_index][best_next_action]
+            q_table[state_index][action] += learning_rate * (td_target - q_table[state_index][action])
+            state_obs = next_state_obs
+            turn += 1
+    return q_table
+
+
+def test_matches_reference_loop(annotated_graph):
+    graph = compile_graph(annotated_graph)
+    trainer = QTrainer(graph, max_turns=4, seed=3, use_numba=False, block_size=40)
+    # the trainer draws every block before running it, so the draws can be replayed from the same seed
+    replay = QTrainer(graph, max_turns=4, seed=3, use_numba=False, block_size=40)
+    blocks = [tuple(array.copy() for array in replay._draw_block(40)) for _ in range(3)]
+    q_table = trainer.train(120)
+    assert trainer.num_updates > 0
+
+    env = BJJEnv(board=Board(graph))
+    starts = np.concatenate([starts for starts, _ in blocks])
+    randoms = np.concatenate([randoms for _, randoms in blocks])
+    expected = reference_q_learning(env, starts, randoms, 4, 0.1, 0.95, 0.5)
+    np.testing.assert_array_equal(q_table, expected)
+
+
+@pytest.mark.skipif(njit is None, reason='numba is not installed')
+def test_numba_matches_python(annotated_graph):
+    graph = compile_graph(annotated_graph)
+    python = QTrainer(graph, max_turns=30, seed=5, use_numba=False).train(2_000)
+    jitted = QTrainer(graph, max_turns=30, seed=5, use_numba=True).train(2_000)
+    np.testing.assert_array_equal(python, jitted)
+
+
+def test_batched_learning(annotated_graph):
+    graph = compile_graph(annotated_graph)
+    trainer = QTrainer(graph, max_turns=20, seed=0, use_numba=False)
+    q_table = trainer.learn(2_000, batch_size=256)
+    assert trainer.num_updates > 2_000
+    assert np.isfinite(q_table).all()
+    # only legal (state, action) pairs are ever updated
+    assert not q_table[~graph.legal_moves.masks].any()
+    assert q_table[graph.legal_moves.masks].any()
+
+
+def test_collision_modes_agree_without_collisions(annotated_graph):
+    graph = compile_graph(annotated_graph)
+    tables = [QTrainer(graph, max_turns=20, seed=1).learn(50, batch_size=1, collisions=collisions)
+              for collisions in ('sum', 'mean')]
+    np.testing.assert_array_equal(*tables)
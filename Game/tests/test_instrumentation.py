@@ -0,0 +1,65 @@
+import json
+import random
+import numpy as np
+from Graph.compiled_graph import compile_graph
+from play_game import Game, GameState, Board
+from game_log import GameLog, VERBOSE
+from gym_env import BJJEnv, q_learning
+from instrumentation import Instrumentation, PhaseStats, SamplingProfiler
+
+
+def test_phases_are_timed_only_while_installed(annotated_graph, tmp_path):
+    board = Board(compile_graph(annotated_graph))
+    get_possible_moves = GameState.get_possible_moves
+    random.seed(0)
+    np.random.seed(0)
+    with Instrumentation() as timings:
+        assert GameState.get_possible_moves is not get_possible_moves
+        game = Game('Game', max_turns=20, board=board, verbosity=GameLog(VERBOSE, sink=None))
+        game.initialize_game('Player 1', 'Player 2')
+        game.play_game()
+        q_learning(BJJEnv(board=board), 3)
+    assert GameState.get_possible_moves is get_possible_moves
+
+    report = timings.report()
+    # dead ends replay the turn from a new position, which counts as another play_turn call
+    assert report['Game.play_turn']['count'] >= game.turn_count + report['BJJEnv.step']['count']
+    assert report['BJJEnv.reset']['count'] == 3
+    assert report['q_update']['count'] == report['BJJEnv.step']['count']
+    assert report['GameLog.emit']['count'] > 0
+    for phase in report.values():
+        assert sum(phase['histogram'].values()) == phase['count']
+        if phase['count']:
+            assert phase['min_ns'] <= phase['max_ns'] and phase['p50_ns'] <= phase['p90_ns'] <= phase['p99_ns']
+
+    timings.save_json(str(tmp_path / 'timings.json'))
+    assert json.loads((tmp_path / 'timings.json').read_text()) == report
+
+    # nothing is timed once uninstalled
+    game.game_state.get_possible_moves(True, False)
+    assert timings.report() == report
+
+
+def test_phase_stats():
+    stats = PhaseStats()
+    for duration in (1, 3, 900, 1000, 5000):
+        stats.add(duration)
+    assert (stats.count, stats.total, stats.min, stats.max) == (5, 6904, 1, 5000)
+    assert stats.quantile(0.5) == 1024 and stats.quantile(1) == 8192
+    assert stats.to_json()['histogram'] == {'2': 1, '4': 1, '1024': 2, '8192': 1}
+
+
+def test_sampling_profiler(tmp_path):
+    def spin():
+        total = 0
+        for i in range(200_000):
+            total += i * i
+        return total
+
+    with SamplingProfiler(interval=0.0005) as profiler:
+        while not profiler.samples:
+            spin()
+    profiler.save_folded(str(tmp_path / 'run.folded'))
+    lines = (tmp_path / 'run.folded').read_text().splitlines()
+    assert lines and all(line.rsplit(' ', 1)[1].isdigit() for line in lines)
+    assert any('test_sampling_profiler' in line for line in lines)
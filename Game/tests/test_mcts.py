@@ -0,0 +1,61 @@
+import random
+from Graph.compiled_graph import compile_graph
+from Graph.retrograde import solve_retrograde
+from play_game import Board, Game
+from mcts import MCTSAgent
+from tests.helpers import edge_between
+
+
+def test_finds_winning_and_avoids_losing_moves(annotated_graph):
+    board = Board(compile_graph(annotated_graph))
+    compiled = board.compiled
+    agent = MCTSAgent(board, simulations=256, seed=0)
+    # on the last turn, the back escape's points win the game
+    assert agent.search(7, False, 0, 1) == edge_between(compiled, 7, 3)
+    # with three turns left, the armbar setup ends in a forced tap and the back escape in a choke, while the scramble
+    # restarts from a random position
+    assert agent.search(7, False, 0, 3) == edge_between(compiled, 7, 6)
+
+
+def test_tree_is_reused_between_searches(annotated_graph):
+    agent = MCTSAgent(Board(compile_graph(annotated_graph)), simulations=64, rollout_batch=16, seed=0)
+    agent.search(0, True, 0, 30)
+    root = agent.keys[agent.state_key(0, True, 0, 30)]
+    assert agent.visits[root] == 64
+    num_states = agent.num_states
+    agent.search(0, True, 0, 30)
+    assert agent.visits[root] == 128
+    # leads and deficits within a bucket share a state, but never with a tie or each other
+    assert agent.state_key(0, True, 1, 30) == agent.state_key(0, True, 2, 30)
+    assert agent.state_key(0, True, -1, 30) == agent.state_key(0, True, -2, 30)
+    assert len({agent.state_key(0, True, diff, 30) for diff in (-1, 0, 1)}) == 3
+    assert agent.state_key(0, True, 100, 30) == agent.state_key(0, True, 2 * agent.max_score_bucket, 30)
+    assert agent.num_states >= num_states
+
+
+def test_plays_games_as_player_agent(annotated_graph):
+    board = Board(compile_graph(annotated_graph))
+    agent = MCTSAgent(board, simulations=32, seed=0)
+    random.seed(0)
+    for i in range(20):
+        game = Game(f'Game_{i}', max_turns=30, board=board)
+        game.initialize_game('MCTS', 'Random', player1_agent=agent)
+        assert game.player1.strategy == 'mcts'
+        # every move the agent picks is checked against the legal moves in choose_move
+        game.play_game()
+        assert game.turn_count <= 30
+    # the test graph is too small for search to beat random play (who is on top decides most games), so only the
+    # table's growth across games is checked here
+    assert agent.num_states > 1
+
+
+def test_forced_states_end_search(annotated_graph):
+    compiled = compile_graph(annotated_graph)
+    agent = MCTSAgent(Board(compiled), simulations=64, seed=0, retrograde=solve_retrograde(compiled))
+    # a forced win is played without searching
+    assert agent.search(3, True, -10, 5) == edge_between(compiled, 3, 5)
+    assert agent.num_states == 0
+    # and ends selection and rollouts as soon as it is reached
+    assert agent.search(7, False, 0, 3) == edge_between(compiled, 7, 6)
+    assert list(agent._rollout([(4, False, 0, 20, 1), (4, True, 0, 20, -1)])) == [-1.0, -1.0]
+    assert list(agent.rollouts.turn[:2]) == [0, 0]
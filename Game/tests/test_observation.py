@@ -0,0 +1,78 @@
+import random
+import numpy as np
+import pytest
+from Graph.compiled_graph import compile_graph
+from play_game import Board
+from gym_env import BJJEnv
+from vector_env import BJJVectorEnv
+from observation import FLAT_FIELDS, ObservationEncoder
+
+
+def _as_dict(obs):
+    return {name: int(value) for name, value in obs.items()}
+
+
+@pytest.mark.parametrize('mode', ['flat', 'one_hot'])
+def test_env_observations_match_dict_mode(annotated_graph, mode):
+    board = Board(compile_graph(annotated_graph))
+    envs = {'dict': BJJEnv(board=board), mode: BJJEnv(board=board, observation=mode)}
+    decoder = envs[mode]._encoder
+    observations = {}
+    for name, env in envs.items():
+        random.seed(0)
+        np.random.seed(0)
+        obs, info = env.reset()
+        buffer = obs
+        seen, rewards = [], []
+        for _ in range(60):
+            if name != 'dict':
+                assert obs is buffer and obs in env.observation_space
+                obs = decoder.decode(obs)
+            seen.append(_as_dict(obs))
+            legal = np.flatnonzero(info['action_mask'])
+            if len(legal) == 0:
+                obs, info = env.reset()
+                continue
+            obs, reward, done, _, info = env.step(int(legal[np.random.randint(len(legal))]))
+            rewards.append(reward)
+            if done:
+                obs, info = env.reset()
+        observations[name] = seen, rewards
+    assert observations[mode] == observations['dict']
+
+
+@pytest.mark.parametrize('mode', ['flat', 'one_hot'])
+def test_vector_env_observations_match_dict_mode(annotated_graph, mode):
+    graph = compile_graph(annotated_graph)
+    envs = {'dict': BJJVectorEnv(num_envs=8, max_turns=10, graph=graph),
+            mode: BJJVectorEnv(num_envs=8, max_turns=10, graph=graph, observation=mode)}
+    decoder = envs[mode]._encoder
+    steps = {}
+    for name, env in envs.items():
+        obs, info = env.reset(seed=3)
+        rng = np.random.default_rng(3)
+        seen = []
+        for _ in range(30):
+            if name != 'dict':
+                assert obs.shape == env.observation_space.shape and obs in env.observation_space
+                obs = decoder.decode(obs)
+            seen.append({key: value.tolist() for key, value in obs.items()})
+            actions = (rng.random(info['action_mask'].shape) + info['action_mask']).argmax(axis=1)
+            obs, rewards, terminations, _, info = env.step(actions)
+            if terminations.any():
+                final = info['final_obs'] if name == 'dict' else decoder.decode(info['final_obs'])
+                seen.append({key: np.asarray(value)[terminations].tolist() for key, value in final.items()})
+            seen.append(rewards.tolist())
+        steps[name] = seen
+    assert steps[mode] == steps['dict']
+
+
+def test_one_hot_layout():
+    encoder = ObservationEncoder('one_hot', num_nodes=5, max_turns=10, num_envs=2)
+    encoder.encode(np.array([1, 4]), np.array([-3, 2]), np.array([True, False]), np.array([10, 7]))
+    obs = encoder.encode(np.array([3, 4]), np.array([-3, 2]), np.array([True, False]), np.array([9, 6]))
+    assert obs.dtype == np.float32
+    assert obs.tolist() == [[0, 0, 0, 1, 0, -3, 1, 0, 9], [0, 0, 0, 0, 1, 2, 0, 1, 6]]
+    assert list(encoder.decode(obs)) == list(FLAT_FIELDS)
+    with pytest.raises(ValueError, match='dict'):
+        ObservationEncoder('dict', num_nodes=5, max_turns=10)
@@ -0,0 +1,37 @@
+import random
+from Graph.compiled_graph import compile_graph
+from play_game import Board, Game
+from parallel_mcts import LeafParallelMCTSAgent, RootParallelMCTSAgent
+from tests.helpers import edge_between
+
+
+def test_root_parallel_merges_trees(annotated_graph):
+    board = Board(compile_graph(annotated_graph))
+    with RootParallelMCTSAgent(board, num_workers=2, simulations=128, seed=0) as agent:
+        # on the last turn, the back escape's points win the game
+        assert agent.search(7, False, 0, 1) == edge_between(board.compiled, 7, 3)
+        # the two trees run 64 simulations each
+        visits = agent.root_visits(7, False, 0, 3)
+        assert visits.sum() == 2 * 64
+        assert board.legal_moves.get(7, False)[visits.argmax()] == edge_between(board.compiled, 7, 6)
+
+
+def test_leaf_parallel_search(annotated_graph):
+    board = Board(compile_graph(annotated_graph))
+    with LeafParallelMCTSAgent(board, num_workers=2, simulations=256, seed=0) as agent:
+        assert agent.rollout_batch == 64
+        assert agent.search(7, False, 0, 1) == edge_between(board.compiled, 7, 3)
+        assert agent.search(7, False, 0, 3) == edge_between(board.compiled, 7, 6)
+        assert sum(agent.root_visits(7, False, 0, 3)) == 256
+
+
+def test_parallel_agents_play_games(annotated_graph):
+    board = Board(compile_graph(annotated_graph))
+    random.seed(0)
+    with RootParallelMCTSAgent(board, num_workers=2, simulations=32, seed=0) as root_agent, \
+            LeafParallelMCTSAgent(board, num_workers=2, simulations=32, seed=0) as leaf_agent:
+        for i in range(5):
+            game = Game(f'Game_{i}', max_turns=30, board=board)
+            game.initialize_game('Root', 'Leaf', player1_agent=root_agent, player2_agent=leaf_agent)
+            game.play_game()
+            assert game.turn_count <= 30
@@ -0,0 +1,62 @@
+import functools
+import numpy as np
+from Graph.compiled_graph import compile_graph
+from Graph.shared_graph import SharedGraph, attach_compiled_graph
+from mcts import MCTSAgent
+from parallel_sim import ParallelSimulation, measure_speedup
+from recorder import read_trajectories
+
+
+def test_shared_graph_round_trip(annotated_graph):
+    compiled = compile_graph(annotated_graph)
+    with SharedGraph(compiled) as shared:
+        attached, shm = attach_compiled_graph(shared.handle)
+        for name, array in compiled.arrays().items():
+            np.testing.assert_array_equal(attached.arrays()[name], array)
+        assert attached.legal_moves.moves == compiled.legal_moves.moves
+        del attached
+        shm.close()
+
+
+def test_results_do_not_depend_on_worker_count(annotated_graph):
+    compiled = compile_graph(annotated_graph)
+    totals = []
+    for num_workers in (1, 2):
+        results = ParallelSimulation(num_games=2_500, max_turns=20, num_workers=num_workers, batch_size=1_000,
+                                     seed=7, graph=compiled).run(progress=False)
+        assert results.num_games == 2_500
+        assert results.player1_wins + results.player2_wins + results.num_ties == 2_500
+        totals.append((results.player1_wins, results.player2_wins, results.num_ties, results.total_turns,
+                       results.end_reasons.tolist()))
+    assert totals[0] == totals[1]
+
+
+def test_records_every_batch(annotated_graph, tmp_path):
+    results = ParallelSimulation(num_games=2_500, max_turns=20, num_workers=2, batch_size=1_000, seed=7,
+                                 graph=compile_graph(annotated_graph), record_dir=str(tmp_path / 'turns'),
+                                 record_format='npz').run(progress=False)
+    batches = [read_trajectories(str(path), format='npz') for path in sorted((tmp_path / 'turns').iterdir())]
+    assert len(batches) == 3
+    games = np.concatenate([batch['game'] for batch in batches])
+    assert len(games) == results.total_turns
+    assert np.array_equal(np.unique(games), np.arange(2_500))
+
+
+def test_agent_games_do_not_depend_on_worker_count(annotated_graph, tmp_path):
+    compiled = compile_graph(annotated_graph)
+    mcts = functools.partial(MCTSAgent, simulations=16, rollout_batch=8)
+    totals = []
+    for num_workers in (1, 2):
+        record_dir = tmp_path / f'turns_{num_workers}'
+        results = ParallelSimulation(num_games=60, max_turns=20, num_workers=num_workers, batch_size=25, seed=3,
+                                     graph=compiled, record_dir=str(record_dir), record_format='npz',
+                                     player1_agent=mcts).run(progress=False)
+        assert results.num_games == 60 and results.end_reasons[0] == 0
+        games = np.concatenate([read_trajectories(str(path), format='npz')['game']
+                                for path in sorted(record_dir.iterdir())])
+        assert len(games) == results.total_turns and np.array_equal(np.unique(games), np.arange(60))
+        totals.append((results.player1_wins, results.player2_wins, results.num_ties, results.total_turns,
+                       results.end_reasons.tolist()))
+    assert totals[0] == totals[1]
+    speedups = measure_speedup(compiled, mcts, worker_counts=(1, 2), num_games=20, max_turns=10)
+    assert sorted(speedups) == [1, 2] and all(speedup > 0 for speedup in speedups.values())
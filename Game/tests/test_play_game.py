@@ -0,0 +1,79 @@
+import random
+from Graph.compiled_graph import compile_graph
+from play_game import Game, Board
+from game_log import GameLog, EVENT_LEVELS, RESULTS, VERBOSE, narrate
+
+
+def test_games_share_compiled_board(annotated_graph):
+    board = Board(compile_graph(annotated_graph))
+    games = [Game(f'Game_{i}', max_turns=20, board=board) for i in range(5)]
+    random.seed(0)
+    for game in games:
+        assert game.board.compiled is board.compiled
+        game.initialize_game('Player 1', 'Player 2')
+        game.play_game()
+        assert game.turn_count <= 20
+
+
+def test_possible_moves_respect_position(annotated_graph):
+    board = Board(annotated_graph)
+    game = Game('Game', board=board)
+    game.game_state.current_node = 0
+    targets = board.compiled.targets
+    # 'pull guard' is a bottom move and 'double leg' a top move
+    assert [targets[move] for move in game.game_state.get_possible_moves(True, False)] == [7]
+    assert [targets[move] for move in game.game_state.get_possible_moves(False, True)] == [1]
+
+
+def test_quiet_games_print_nothing(annotated_graph, capsys):
+    board = Board(compile_graph(annotated_graph))
+    random.seed(0)
+    game = Game('Game', max_turns=20, board=board)
+    game.initialize_game('Player 1', 'Player 2')
+    game.play_game()
+    assert capsys.readouterr().out == ''
+
+
+def test_verbose_narration_from_events(annotated_graph, capsys):
+    board = Board(compile_graph(annotated_graph))
+    random.seed(0)
+    log = GameLog(VERBOSE, record=True)
+    game = Game('Game', max_turns=20, board=board, verbosity=log)
+    game.initialize_game('Player 1', 'Player 2')
+    game.play_game()
+    out = capsys.readouterr().out
+    assert out == ''.join(narrate(event, fields) + '\n' for event, fields in log.events)
+    assert out.startswith('Initializing game: Game\n')
+    assert '\nGame over! Final scores:\nPlayer 1: ' in out
+    assert [event for event, _ in log.events].count('turn_start') == game.turn_count
+
+    results_log = GameLog(RESULTS, sink=None, record=True)
+    game = Game('Game', max_turns=20, board=board, verbosity=results_log)
+    game.initialize_game('Player 1', 'Player 2')
+    game.play_game()
+    assert capsys.readouterr().out == ''
+    assert results_log.events[-1][0] == 'game_over'
+    assert all(EVENT_LEVELS[event] == RESULTS for event, _ in results_log.events)
+
+
+def test_reset_replays_like_a_new_game(annotated_graph):
+    board = Board(compile_graph(annotated_graph))
+    game = Game('Game', max_turns=20, board=board)
+    game.initialize_game('Player 1', 'Player 2')
+    game.play_game()
+    objects = (game.game_state, game.player1, game.player2)
+
+    def match(game, reset):
+        random.seed(1)
+        reset()
+        start = (game.game_state.current_node, game.player1.is_top, game.current_player is game.player1)
+        game.play_game()
+        return start, game.player1.points, game.player2.points, game.turn_count, game.winner is game.player1
+
+    replayed = match(game, game.reset)
+    assert (game.game_state, game.player1, game.player2) == objects
+    fresh = Game('Game', max_turns=20, board=board)
+    assert replayed == match(fresh, lambda: fresh.initialize_game('Player 1', 'Player 2'))
+    random.seed(1)
+    game.reset()
+    assert game.turn_count == 0 and game.winner is None and game.player1.points == game.player2.points == 0
@@ -0,0 +1,94 @@
+import random
+import numpy as np
+import pytest
+from Graph.compiled_graph import compile_graph
+from play_game import Game, Board, Player
+from batch_game import BatchGame, NOT_OVER, PLAYER1, PLAYER2
+import recorder as recorder_module
+from recorder import TrajectoryRecorder, read_trajectories
+
+
+def check_trajectories(rows, turns, scores, end_reasons):
+    """every game has one row per turn, its points add up to the final scores and only its last row ends it"""
+    order = np.lexsort((rows['turn'], rows['game']))
+    rows = {name: values[order] for name, values in rows.items()}
+    assert np.array_equal(np.bincount(rows['game'], minlength=len(turns)), turns)
+    for player in (PLAYER1, PLAYER2):
+        points = np.bincount(rows['game'], weights=rows['points'] * (rows['player'] == player), minlength=len(turns))
+        assert np.array_equal(points, scores[:, player])
+    last = np.cumsum(turns) - 1
+    assert np.array_equal(rows['end_reason'][last], end_reasons)
+    assert (np.delete(rows['end_reason'], last) == NOT_OVER).all()
+
+
+@pytest.mark.parametrize('chunk_size', [100, 1000])
+def test_batch_game_recording(annotated_graph, tmp_path, chunk_size):
+    graph = compile_graph(annotated_graph)
+    with TrajectoryRecorder(str(tmp_path / 'turns'), format='npz', chunk_size=chunk_size,
+                            edge_ids=graph.edge_ids) as recorder:
+        batch = BatchGame(300, max_turns=30, graph=graph, seed=0, recorder=recorder)
+        batch.play_random()
+    rows = read_trajectories(str(tmp_path / 'turns'), format='npz')
+    assert len(rows['game']) == recorder.num_rows
+    assert recorder.num_chunks >= recorder.num_rows / chunk_size
+    check_trajectories(rows, batch.turn, batch.scores, batch.end_reason)
+    played = rows['edge'] >= 0
+    assert np.array_equal(rows['edge_id'][played], graph.edge_ids[rows['edge'][played]])
+    assert np.array_equal(graph.sources[rows['edge'][played]], rows['node'][played])
+
+
+def test_scalar_game_recording(annotated_graph, tmp_path):
+    board = Board(compile_graph(annotated_graph))
+    random.seed(0)
+    with TrajectoryRecorder(str(tmp_path / 'turns'), format='npz', chunk_size=64) as recorder:
+        games = [Game(f'Game_{i}', max_turns=20, board=board, recorder=recorder, game_id=i) for i in range(50)]
+        for game in games:
+            game.initialize_game('Player 1', 'Player 2')
+            game.play_game()
+    rows = read_trajectories(str(tmp_path / 'turns'), format='npz')
+    # dead ends respawn within the same turn, so a game can't end without a recorded row
+    turns = np.array([game.turn_count for game in games])
+    scores = np.array([[game.player1.points, game.player2.points] for game in games])
+    last = np.lexsort((rows['turn'], rows['game']))[np.cumsum(turns) - 1]
+    check_trajectories(rows, turns, scores, rows['end_reason'][last])
+    assert (rows['end_reason'][last] != NOT_OVER).all()
+
+
+@pytest.mark.parametrize('format', ['parquet', 'arrow'])
+def test_arrow_formats(annotated_graph, tmp_path, format):
+    pytest.importorskip('pyarrow')
+    path = str(tmp_path / f'turns.{format}')
+    with TrajectoryRecorder(path, format=format, chunk_size=128) as recorder:
+        batch = BatchGame(100, max_turns=30, graph=compile_graph(annotated_graph), seed=0, recorder=recorder)
+        batch.play_random()
+    check_trajectories(read_trajectories(path, format=format), batch.turn, batch.scores, batch.end_reason)
+
+
+def test_scalar_rows_match_the_moves_played(annotated_graph, tmp_path, monkeypatch):
+    """the recorded rows are the turn, node, player, role and points each edge was played with"""
+    board = Board(compile_graph(annotated_graph))
+    played = set()
+    choose_move = Player.choose_move
+
+    def spy(player, possible_moves, game=None):
+        move = choose_move(player, possible_moves, game)
+        played.add((game.game_id, game.turn_count, game.game_state.current_node, move, int(player is game.player2),
+                    player.is_top, int(board.compiled.points[move])))
+        return move
+
+    monkeypatch.setattr(Player, 'choose_move', spy)
+    # games are converted several at a time, and the rest when the recorder is closed
+    monkeypatch.setattr(recorder_module, 'GAME_BATCH_ROWS', 100)
+    random.seed(1)
+    with TrajectoryRecorder(str(tmp_path / 'turns'), format='npz', chunk_size=256) as recorder:
+        for game_id in range(40):
+            game = Game('Game', max_turns=30, board=board, recorder=recorder, game_id=game_id)
+            game.initialize_game('Player 1', 'Player 2')
+            game.play_game()
+    rows = read_trajectories(str(tmp_path / 'turns'), format='npz')
+    moved = rows['edge'] >= 0
+    recorded = zip(*(rows[name][moved].tolist() for name in ('game', 'turn', 'node', 'edge', 'player', 'on_top',
+                                                              'points')))
+    assert sorted(recorded) == sorted(played)
+    # each game ends once
+    assert np.array_equal(np.bincount(rows['game'][rows['end_reason'] != NOT_OVER], minlength=40), np.ones(40))
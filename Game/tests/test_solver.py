@@ -0,0 +1,70 @@
+import random
+from functools import lru_cache
+import numpy as np
+from Graph.compiled_graph import compile_graph, WINNER_TOP
+from play_game import Board, Game
+from solver import GameSolver
+
+
+def test_values_match_plain_recursion(annotated_graph):
+    compiled = compile_graph(annotated_graph)
+    solver = GameSolver(compiled, max_turns=6, max_diff=40)
+    solver.solve()
+    assert solver.exact
+    restart = solver.restart_distribution()
+    out_degree = np.diff(compiled.offsets)
+
+    @lru_cache(maxsize=None)
+    def value(node, top, diff, turns_left):
+        if turns_left == 0:
+            return float(np.sign(diff))
+        moves = compiled.legal_moves.get(node, top)
+        if not moves:
+            if out_degree[node] == 0:
+                return sum(p * value(restart_node, top, diff, turns_left)
+                           for restart_node, p in enumerate(restart) if p > 0)
+            return -value(node, not top, -diff, turns_left - 1)
+        values = []
+        for edge in moves:
+            winner = compiled.winner[compiled.targets[edge]]
+            if compiled.tap[edge]:
+                values.append(-1.0)
+            elif winner:
+                values.append(1.0 if (winner == WINNER_TOP) == top else -1.0)
+            else:
+                values.append(-value(int(compiled.targets[edge]), top == compiled.swaps[edge],
+                                     -(diff + int(compiled.points[edge])), turns_left - 1))
+        return max(values)
+
+    for turns_left in range(7):
+        for diff in (-5, -2, 0, 3):
+            for node in list(range(8)) + [50]:
+                for top in (False, True):
+                    # restart expectations are summed in float32 by the solver
+                    assert abs(solver.value(node, top, diff, turns_left) - value(node, top, diff, turns_left)) < 1e-5
+                    if turns_left and compiled.legal_moves.get(node, top):
+                        best = solver.best_move(node, top, diff, turns_left)
+                        move_values = solver.move_values(node, top, diff, turns_left)
+                        assert move_values[compiled.legal_moves.get(node, top).index(best)] == move_values.max()
+
+
+def test_oracle_plays_and_round_trips(annotated_graph, tmp_path):
+    compiled = compile_graph(annotated_graph)
+    solver = GameSolver(compiled, max_turns=20, max_diff=16)
+    solver.solve()
+    # on the last turn the back escape's points win the game
+    assert solver.best_move(7, False, 0, 1) == 11
+    path = str(tmp_path / 'solved.npz')
+    solver.save(path)
+    loaded = GameSolver.load(path, graph=compiled)
+    np.testing.assert_array_equal(loaded.values, solver.values)
+    np.testing.assert_array_equal(loaded.policy, solver.policy)
+
+    board = Board(compiled)
+    random.seed(0)
+    for i in range(10):
+        game = Game(f'Game_{i}', max_turns=20, board=board)
+        game.initialize_game('Solver', 'Random', player1_agent=loaded)
+        game.play_game()
+    # perfect play never does worse than any move an agent picks
+    assert solver.evaluate_agent(solver, num_positions=50, turns_left=5)['optimal_moves'] == 1.0
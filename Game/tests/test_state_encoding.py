@@ -0,0 +1,113 @@
+import random
+import numpy as np
+import pytest
+from Graph.compiled_graph import compile_graph
+from play_game import Board
+from gym_env import BJJEnv, q_learning, state_to_index
+from observation import ObservationEncoder
+from state_encoding import Q_DTYPE, STATE_ENCODERS, SparseQTable, StateEncoder, make_encoder, make_q_table
+
+
+def _states(count, num_nodes, max_turns, seed=0):
+    rng = np.random.default_rng(seed)
+    return (rng.integers(0, num_nodes, count), rng.integers(0, 2, count), rng.integers(-12, 13, count),
+            rng.integers(0, max_turns + 1, count))
+
+
+@pytest.mark.parametrize('name', list(STATE_ENCODERS))
+def test_batch_encoding_matches_scalar(name):
+    encoder = make_encoder(name, num_nodes=50, max_turns=20)
+    states = _states(500, 50, 20)
+    indices = encoder.encode(*states)
+    assert indices.shape == (500,)
+    assert ((indices >= 0) & (indices < encoder.num_states)).all()
+    assert indices.tolist() == [encoder.encode(*(int(field) for field in state)) for state in zip(*states)]
+    # the same states as observations of the vector env in each mode
+    fields = dict(current_position=states[0], on_top=states[1], on_bottom=1 - states[1],
+                  point_difference=states[2], turns_left=states[3])
+    assert encoder.encode_observation(fields).tolist() == indices.tolist()
+    for mode in ('flat', 'one_hot'):
+        observations = ObservationEncoder(mode, 50, 20, num_envs=500).encode(states[0], states[2], states[1],
+                                                                             states[3])
+        assert encoder.encode_observation(observations).tolist() == indices.tolist()
+
+
+def test_encoders_tell_states_apart():
+    node_role = make_encoder('node_role', num_nodes=50)
+    assert node_role.num_states == 100
+    assert node_role.encode_observation({'current_position': 7, 'on_top': 1, 'point_difference': 3,
+                                         'turns_left': 9}) == state_to_index({'current_position': 7, 'on_top': 1})
+
+    score = make_encoder('node_role_score', num_nodes=50)
+    buckets = [score.encode(7, 1, difference) - score.encode(7, 1, -100) for difference in range(-8, 9)]
+    assert buckets == [0, 0, 1, 1, 1, 2, 2, 2, 3, 4, 4, 4, 5, 5, 5, 6, 6]
+    assert score.num_states == 50 * 2 * 7
+
+    turns = make_encoder('node_role_turns', num_nodes=50, max_turns=99, turn_buckets=4)
+    assert [turns.encode(7, 0, turns_left=left) % 4 for left in (0, 24, 25, 99, 150)] == [0, 0, 1, 3, 3]
+
+    # the full cross of 50_000 nodes has 2.8M states, more than the buckets
+    hashed = make_encoder('hashed_cross', num_nodes=50_000, max_turns=20, num_buckets=1 << 21)
+    states = _states(2000, 50_000, 20, seed=1)
+    crossed = np.stack([make_encoder('node_role_score', num_nodes=50_000).encode(*states[:3]),
+                        turns.bucket(states[3])])
+    # distinct states of the full cross hardly ever share a hashed state
+    assert len(np.unique(hashed.encode(*states))) >= len(np.unique(crossed, axis=1)) - 2
+
+    with pytest.raises(ValueError, match='node_role'):
+        make_encoder('node', num_nodes=50)
+
+
+def test_hashed_cross_is_never_larger_than_the_cross():
+    # about the GrappleMap graph: its 44_800 crossed states fit in the default buckets, and are used as they are
+    exact = make_encoder('hashed_cross', num_nodes=800)
+    assert not exact.hashed and exact.num_states == exact.cross_size == 800 * 2 * 7 * 4
+    states = _states(500, 800, 100)
+    assert np.array_equal(exact.encode(*states), exact._score.encode(*states[:3]) * 4 + exact._turns.bucket(states[3]))
+    # a larger graph is hashed into a table smaller than its cross
+    hashed = make_encoder('hashed_cross', num_nodes=5000)
+    assert hashed.hashed and hashed.num_states < hashed.cross_size
+    assert hashed.table_bytes(300) < hashed.cross_size * 300 * np.dtype(Q_DTYPE).itemsize
+
+
+def test_encoders_must_define_states_and_encode():
+    class PositionEncoder(StateEncoder):
+        def encode(self, position, on_top, point_difference=0, turns_left=0):
+            return position
+
+    with pytest.raises(TypeError, match='num_states'):
+        PositionEncoder(num_nodes=50)
+
+
+def test_sparse_q_table():
+    table = make_q_table(10 ** 9, 300)
+    assert isinstance(table, SparseQTable) and table.nbytes == 0
+    table[5][3] += 1.5
+    table[7, 2] = 2
+    assert table[5, 3] == 1.5 and table[7][2] == 2 and table[9][0] == 0
+    assert table.nbytes == 3 * 300 * 4
+    assert isinstance(make_q_table(100, 300), np.ndarray) and make_q_table(100, 300).dtype == np.float32
+    with pytest.raises(IndexError):
+        table[10 ** 9]
+
+
+@pytest.mark.parametrize('name', ['node_role', 'node_role_score', 'hashed_cross'])
+def test_q_learning_with_sparse_tables(annotated_graph, name):
+    board = Board(compile_graph(annotated_graph))
+    tables = []
+    for sparse in (False, True):
+        random.seed(0)
+        np.random.seed(0)
+        env = BJJEnv(board=board, observation='flat')
+        tables.append(q_learning(env, 20, encoder=name, dtype=np.float32, sparse=sparse))
+    dense, sparse = tables
+    assert dense.dtype == np.float32 and dense.any()
+    assert np.array_equal(sparse.to_dense(), dense)
+
+
+def test_q_learning_default_tables(annotated_graph):
+    board = Board(compile_graph(annotated_graph))
+    # the original float64 table for the default encoding, Q_DTYPE for the others
+    assert q_learning(BJJEnv(board=board), 2).dtype == np.float64
+    table = q_learning(BJJEnv(board=board, observation='flat'), 2, encoder='node_role_score')
+    assert isinstance(table, np.ndarray) and table.dtype == Q_DTYPE
@@ -0,0 +1,46 @@
+import numpy as np
+from Graph.compiled_graph import compile_graph
+from play_game import Board, GameState
+from vector_env import BJJVectorEnv
+
+
+def test_masks_match_possible_moves(annotated_graph):
+    env = BJJVectorEnv(num_envs=8, max_turns=20, graph=compile_graph(annotated_graph))
+    obs, info = env.reset(seed=0)
+    assert obs in env.observation_space
+    assert info['action_mask'].shape == (8, env.single_action_space.n)
+    game_state = GameState(Board(env.graph))
+    for i in range(8):
+        game_state.current_node = int(obs['current_position'][i])
+        moves = game_state.get_possible_moves(bool(obs['on_top'][i]), bool(obs['on_bottom'][i]))
+        assert np.flatnonzero(info['action_mask'][i]).tolist() == list(moves)
+
+
+def test_random_play_autoresets(annotated_graph):
+    env = BJJVectorEnv(num_envs=16, max_turns=10, graph=compile_graph(annotated_graph))
+    obs, info = env.reset(seed=1)
+    rng = np.random.default_rng(1)
+    num_finished = 0
+    for _ in range(50):
+        # pick a random legal action in each env, or any action if the player has to pass
+        scores = rng.random(info['action_mask'].shape) + info['action_mask']
+        actions = scores.argmax(axis=1)
+        obs, rewards, terminations, truncations, info = env.step(actions)
+        assert obs in env.observation_space
+        assert not truncations.any()
+        if terminations.any():
+            num_finished += terminations.sum()
+            assert info['_final_obs'].tolist() == terminations.tolist()
+            # finished envs were reset in the same step
+            assert (obs['turns_left'][terminations] == 10).all()
+            assert (obs['point_difference'][terminations] == 0).all()
+    assert num_finished > 0
+
+
+def test_illegal_action_is_penalised(annotated_graph):
+    env = BJJVectorEnv(num_envs=4, max_turns=10, graph=compile_graph(annotated_graph))
+    _, info = env.reset(seed=2)
+    illegal = np.array([np.flatnonzero(~mask)[0] for mask in info['action_mask']])
+    obs, rewards, _, _, _ = env.step(illegal)
+    assert (obs['turns_left'] == 9).all()
+    assert (rewards <= -1 + 0.5).all()
@@ -0,0 +1,129 @@
+import gymnasium as gym
+from gymnasium import spaces
+from gymnasium.vector import AutoresetMode
+from gymnasium.vector.utils import batch_space
+import numpy as np
+from typing import Any, Dict, Optional, Tuple, Union
+from Graph.compiled_graph import CompiledGraph
+from batch_game import BatchGame, PASS
+from observation import ObservationEncoder
+
+WIN_REWARD = 300
+
+
+def mover_rewards(batch: BatchGame, movers: np.ndarray, mover_top: np.ndarray, edges: np.ndarray) -> np.ndarray:
+    """
+    Rewards of a BatchGame.step from the point of view of the player who just moved: their point difference and
+    0.5 if they are on top after the move, plus or minus WIN_REWARD in games that ended. movers and mover_top are the
+    batch's mover arrays from before the step, edges the edges it played
+    """
+    envs = batch.games
+    point_difference = batch.scores[envs, movers] - batch.scores[envs, 1 - movers]
+    rewards = point_difference + 0.5 * (mover_top ^ (batch.graph.swaps[edges] & (edges != PASS)))
+    rewards += np.where(batch.done & (batch.winner == movers), WIN_REWARD, 0)
+    rewards -= np.where(batch.done & (batch.winner == 1 - movers), WIN_REWARD, 0)
+    return rewards
+
+
+class BJJVectorEnv(gym.vector.VectorEnv):
+    """
+    Steps num_envs BJJ matches at once on a shared BatchGame.
+
+    Observations have the same keys as BJJEnv._get_obs, stacked into arrays of shape (num_envs,), and describe the
+    player to move next. Actions are edge indices of the compiled graph, one per env. info['action_mask'] is a
+    (num_envs, num_actions) boolean array copied out of a mask table precomputed for every (node, is_top) state into
+    a buffer that is reused, and overwritten, on every step.
+
+    With observation='flat' or 'one_hot' (see observation.ObservationEncoder), observations are instead the
+    (num_envs, size) rows of a preallocated array, which is also reused and overwritten on every step.
+
+    An illegal action passes the turn with a reward of -1. This is stricter than BJJEnv.step, which only passes on
+    actions outside the edge range and plays any in-range edge, legal or not. Finished matches are reset in the same
+    step (AutoresetMode.SAME_STEP): the returned observation and mask belong to the new match, and the final
+    observation of the finished one is in info['final_obs'], with info['_final_obs'] marking which envs were reset.
+    """
+    metadata = {'autoreset_mode': AutoresetMode.SAME_STEP}
+
+    def __init__(self, num_envs: int, max_turns: int = 100, graph: Optional[CompiledGraph] = None,
+                 observation: str = 'dict'):
+        self.num_envs = num_envs
+        self.observation = observation
+        self.batch = BatchGame(num_envs, max_turns=max_turns, graph=graph)
+        self.graph = self.batch.graph
+        self.max_turns = max_turns
+        num_actions = self.graph.num_edges
+
+        # mask_table[node*2 + is_top] is the action mask of the player to move in that state
+        self.mask_table = self.graph.legal_moves.masks
+        self._mask = np.zeros((num_envs, num_actions), dtype=bool)
+
+        self.single_action_space = spaces.Discrete(num_actions)
+        self.action_space = spaces.MultiDiscrete(np.full(num_envs, num_actions))
+        self.single_observation_space = spaces.Dict({
+            'current_position': spaces.Discrete(self.graph.num_nodes),
+            'point_difference': spaces.Box(low=-np.inf, high=np.inf, shape=(), dtype=np.float64),
+            'on_top': spaces.Discrete(2),
+            'on_bottom': spaces.Discrete(2),
+            'turns_left': spaces.Box(low=0, high=max_turns, shape=(), dtype=np.int64)
+        })
+        self.observation_space = batch_space(self.single_observation_space, num_envs)
+        self._encoder = None
+        if observation != 'dict':
+            self._encoder = ObservationEncoder(observation, self.graph.num_nodes, max_turns, num_envs=num_envs)
+            self.single_observation_space = self._encoder.single_space
+            self.observation_space = self._encoder.space
+
+    def _get_obs(self) -> Union[Dict[str, np.ndarray], np.ndarray]:
+        batch = self.batch
+        envs = batch.games
+        if self._encoder is not None:
+            point_difference = batch.scores[envs, batch.mover] - batch.scores[envs, 1 - batch.mover]
+            return self._encoder.encode(batch.node, point_difference, batch.mover_top, self.max_turns - batch.turn)
+        on_top = batch.mover_top.astype(np.int64)
+        return {
+            'current_position': batch.node.astype(np.int64),
+            'point_difference': (batch.scores[envs, batch.mover] - batch.scores[envs, 1 - batch.mover]).astype(np.float64),
+            'on_top': on_top,
+            'on_bottom': 1 - on_top,
+            'turns_left': (self.max_turns - batch.turn).astype(np.int64)
+        }
+
+    def _get_action_mask(self) -> np.ndarray:
+        return np.take(self.mask_table, self.batch.states, axis=0, out=self._mask)
+
+    def reset(self, *, seed: Optional[int] = None,
+              options: Optional[Dict[str, Any]] = None) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+        if seed is not None:
+            self.batch.rng = np.random.default_rng(seed)
+        self.batch.reset()
+        return self._get_obs(), {'action_mask': self._get_action_mask()}
+
+    def step(self, actions: np.ndarray) -> Tuple[Dict[str, np.ndarray], np.ndarray, np.ndarray, np.ndarray,
+                                                  Dict[str, Any]]:
+        batch = self.batch
+        envs = batch.games
+        actions = np.asarray(actions, dtype=np.int64)
+        in_range = (actions >= 0) & (actions < self.graph.num_edges)
+        states = batch.states
+        legal = in_range & self.mask_table[states, np.where(in_range, actions, 0)]
+        has_moves = batch.legal_counts[states] > 0
+        # a player without moves passes; an illegal action also passes but is penalised, out of range or not
+        edges = np.where(legal, actions, PASS)
+        rewards = np.where(has_moves & ~legal, -1.0, 0.0)
+
+        movers, mover_top = batch.mover.copy(), batch.mover_top.copy()
+        batch.step(edges)
+        finished = batch.done.copy()
+        rewards += mover_rewards(batch, movers, mover_top, edges)
+
+        infos = {}
+        if finished.any():
+            final_obs = self._get_obs()
+            # an encoded observation is the buffer, which the reset observation overwrites
+            infos['final_obs'] = final_obs if self._encoder is None else final_obs.copy()
+            infos['_final_obs'] = finished
+            infos['winner'] = batch.winner.copy()
+            infos['_winner'] = finished
+            batch.reset(games=finished)
+        infos['action_mask'] = self._get_action_mask()
+        return self._get_obs(), rewards, finished, np.zeros(self.num_envs, dtype=bool), infos
@@ -0,0 +1,193 @@
+import numpy as np
+import networkx as nx
+from typing import Callable, Dict, List, Optional, Tuple
+from Graph.reward import MOVE_POINTS
+
+# values of CompiledGraph.winner, indexed by the 'winner' node attribute added in add_terminal_win_states
+WINNER_NONE, WINNER_TOP, WINNER_BOTTOM = 0, 1, 2
+WINNER_NAMES = (None, 'top', 'bottom')
+
+
+class CompiledGraph:
+    """
+    Immutable, array-backed snapshot of the annotated GrappleMap graph.
+
+    Nodes are indexed by their GrappleMap id (the export numbers them 0..N-1) and edges are stored in CSR order:
+    the outgoing edges of node n are the edge indices offsets[n]:offsets[n+1], in the same order as the node's
+    'outgoing' list. Every per-edge attribute the game engine needs is a flat NumPy array indexed by edge index, so
+    one snapshot can be shared by any number of games without copying or rebuilding the networkx graph.
+
+    The networkx graph is kept in `graph` for debugging and visualisation only. Snapshots loaded from the graph cache
+    pass a `graph_loader` instead, so the networkx graph is only rebuilt if something asks for it.
+    """
+    def __init__(self, offsets: np.ndarray, targets: np.ndarray, edge_ids: np.ndarray, top: np.ndarray,
+                 bottom: np.ndarray, tap: np.ndarray, swaps: np.ndarray, move_flags: np.ndarray,
+                 winner: np.ndarray, rewards: Dict[str, int], node_descriptions: List[str],
+                 edge_descriptions: List[str], graph: Optional[nx.DiGraph] = None,
+                 graph_loader: Optional[Callable[[], nx.DiGraph]] = None):
+        self.offsets = offsets
+        self.targets = targets
+        self.edge_ids = edge_ids
+        self.top = top
+        self.bottom = bottom
+        self.tap = tap
+        self.swaps = swaps
+        self.move_flags = move_flags
+        self.winner = winner
+        self.rewards = dict(rewards)
+        self.maneuvers = tuple(self.rewards)
+        self.points = (move_flags.astype(np.int16) @ np.array(list(self.rewards.values()), dtype=np.int16))
+        self.sources = np.repeat(np.arange(len(offsets) - 1, dtype=np.int32), np.diff(offsets))
+        self.node_descriptions = tuple(node_descriptions)
+        self.edge_descriptions = tuple(edge_descriptions)
+        self._graph = graph
+        self._graph_loader = graph_loader
+        self._legal_moves = None
+
+        for array in self.arrays().values():
+            array.flags.writeable = False
+
+    @property
+    def graph(self) -> Optional[nx.DiGraph]:
+        if self._graph is None and self._graph_loader is not None:
+            self._graph = self._graph_loader()
+        return self._graph
+
+    @property
+    def num_nodes(self) -> int:
+        return len(self.offsets) - 1
+
+    @property
+    def num_edges(self) -> int:
+        return len(self.targets)
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        """returns every NumPy array of the snapshot by attribute name"""
+        return {name: getattr(self, name) for name in
+                ('offsets', 'targets', 'sources', 'edge_ids', 'top', 'bottom', 'tap', 'swaps', 'move_flags',
+                 'points', 'winner')}
+
+    def out_edges(self, node: int) -> range:
+        """edge indices leaving node, in the order of the node's 'outgoing' list"""
+        return range(self.offsets[node], self.offsets[node + 1])
+
+    def edge_endpoints(self, edge: int) -> Tuple[int, int]:
+        return int(self.sources[edge]), int(self.targets[edge])
+
+    def edge_maneuvers(self, edge: int) -> List[str]:
+        """names of the point-earning maneuvers executed by this edge"""
+        return [maneuver for maneuver, flagged in zip(self.maneuvers, self.move_flags[edge]) if flagged]
+
+    def winner_name(self, node: int) -> Optional[str]:
+        return WINNER_NAMES[self.winner[node]]
+
+    @property
+    def legal_moves(self) -> 'LegalMoveIndex':
+        """legal-move index of this graph, built on first use"""
+        if self._legal_moves is None:
+            self._legal_moves = LegalMoveIndex(self)
+        return self._legal_moves
+
+
+class LegalMoveIndex:
+    """
+    Legal moves of every (node, is_top) state, built once per graph.
+
+    State node*2 + is_top (the same encoding as gym_env.state_to_index) owns the edge indices
+    edges[offsets[state]:offsets[state + 1]], in the order of the node's 'outgoing' list. A player on top can't use
+    moves tagged for bottom and vice versa; untagged moves are available to both.
+
+    The same index is also available as ready-made, immutable per-state tuples (`moves`) for the scalar game, as a
+    (num_states, num_edges) boolean action mask table (`masks`, built on first use) for the gym environments, and as a
+    padded (num_states, max legal moves) table of edge indices (`padded`, built on first use) for batched argmaxes
+    """
+    def __init__(self, compiled: CompiledGraph):
+        num_states = compiled.num_nodes * 2
+        edges = np.arange(compiled.num_edges, dtype=np.int32)
+        # (state, edge) pairs: every edge not tagged 'top' is legal from bottom and every edge not tagged 'bottom'
+        # is legal from top
+        states = np.concatenate([compiled.sources[~compiled.top] * 2, compiled.sources[~compiled.bottom] * 2 + 1])
+        legal_edges = np.concatenate([edges[~compiled.top], edges[~compiled.bottom]])
+        order = np.lexsort((legal_edges, states))
+
+        self.num_states = num_states
+        self.num_edges = compiled.num_edges
+        self.edges = legal_edges[order]
+        self.counts = np.bincount(states, minlength=num_states).astype(np.int32)
+        self.offsets = np.concatenate([[0], np.cumsum(self.counts)]).astype(np.int32)
+        self.moves = tuple(tuple(self.edges[start:end].tolist())
+                           for start, end in zip(self.offsets[:-1], self.offsets[1:]))
+        self._masks = None
+        self._padded = None
+
+        for array in (self.edges, self.counts, self.offsets):
+            array.flags.writeable = False
+
+    def state(self, node: int, is_top: bool) -> int:
+        return node * 2 + is_top
+
+    def get(self, node: int, is_top: bool) -> Tuple[int, ...]:
+        return self.moves[node * 2 + is_top]
+
+    @property
+    def masks(self) -> np.ndarray:
+        """read-only (num_states, num_edges) boolean table; masks[state] is the action mask of that state"""
+        if self._masks is None:
+            masks = np.zeros((self.num_states, self.num_edges), dtype=bool)
+            masks[np.repeat(np.arange(self.num_states), self.counts), self.edges] = True
+            masks.flags.writeable = False
+            self._masks = masks
+        return self._masks
+
+    @property
+    def padded(self) -> np.ndarray:
+        """
+        read-only (num_states, max(counts)) table whose row `state` starts with that state's legal edges, in order,
+        followed by -1s
+        """
+        if self._padded is None:
+            padded = np.full((self.num_states, max(int(self.counts.max(initial=0)), 1)), -1, dtype=np.int32)
+            states = np.repeat(np.arange(self.num_states), self.counts)
+            padded[states, np.arange(len(self.edges)) - self.offsets[states]] = self.edges
+            padded.flags.writeable = False
+            self._padded = padded
+        return self._padded
+
+
+def compile_graph(G: nx.DiGraph, rewards: Dict[str, int] = MOVE_POINTS) -> CompiledGraph:
+    """
+    Compiles the annotated graph returned by construct_graph into a CompiledGraph.
+
+    Raises a ValueError if the node ids are not the contiguous range 0..N-1 used by the GrappleMap export, since the
+    snapshot uses node ids directly as array indices
+    """
+    num_nodes = G.number_of_nodes()
+    if set(G.nodes()) != set(range(num_nodes)):
+        raise ValueError('compile_graph expects node ids to be the contiguous range 0..N-1')
+
+    offsets = np.zeros(num_nodes + 1, dtype=np.int32)
+    edges = []
+    for node in range(num_nodes):
+        # G.out_edges preserves insertion order, the same order refactor_incoming_and_outgoing used for 'outgoing'
+        out_edges = list(G.out_edges(node, data=True))
+        edges.extend(out_edges)
+        offsets[node + 1] = offsets[node] + len(out_edges)
+
+    maneuvers = list(rewards)
+    targets = np.array([end for _, end, _ in edges], dtype=np.int32)
+    edge_ids = np.array([data['id'] for _, _, data in edges], dtype=np.int32)
+    top = np.array([data.get('top', False) for _, _, data in edges], dtype=bool)
+    bottom = np.array([data.get('bottom', False) for _, _, data in edges], dtype=bool)
+    tap = np.array([data.get('tap', False) for _, _, data in edges], dtype=bool)
+    swaps = np.array([data.get('swaps_players', False) for _, _, data in edges], dtype=bool)
+    move_flags = np.array([[data.get(maneuver, False) for maneuver in maneuvers] for _, _, data in edges],
+                          dtype=bool).reshape(len(edges), len(maneuvers))
+    winner = np.array([WINNER_NAMES.index(G.nodes[node].get('winner')) for node in range(num_nodes)],
+                      dtype=np.int8)
+
+    return CompiledGraph(offsets=offsets, targets=targets, edge_ids=edge_ids, top=top, bottom=bottom, tap=tap,
+                         swaps=swaps, move_flags=move_flags, winner=winner, rewards=rewards,
+                         node_descriptions=[G.nodes[node].get('description', '') for node in range(num_nodes)],
+                         edge_descriptions=[data.get('description', '') for _, _, data in edges],
+                         graph=G)
+
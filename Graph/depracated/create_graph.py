@@ -1,10 +1,22 @@
+import numpy as np
 import pandas as pd
 import networkx as nx
 from tqdm import tqdm
-from Graph.depracated.position import positions_are_equivalent, Position
+from Graph.depracated.position import positions_are_equivalent, Position, Joint
+from Graph.depracated.position_index import PositionIndex
 
-def find_or_add_node(pos: Position,row,G):
+def position_coords(pos: Position) -> np.ndarray:
+    """the (2, 23, 3) joint coordinates of a position, for PositionIndex"""
+    return np.array([pos[(player, joint.value)] for player in range(2) for joint in Joint]).reshape(2, len(Joint), 3)
+
+def find_or_add_node(pos: Position,row,G,index: PositionIndex = None):
     # note: doesn't need row
+    if index is not None:
+        # same result as the scan below, comparing only against positions with the heads as far apart
+        node, added = index.find_or_add(pos.codeblock, position_coords(pos))
+        if added:
+            G.add_node(node, description='Unknown', tags='Unknown', is_explicit_position=False, from_transition=row['description'])
+        return node
     #check if node exists
     for node in G.nodes():
         if positions_are_equivalent(pos,Position(node)):
@@ -44,19 +56,21 @@ def main():
     transitions = grapplemap[grapplemap['is_position'] == 0]
     # Create Directed Graph
     G = nx.DiGraph()
+    index = PositionIndex()
     # Add nodes (positions)
     for _, row in positions.iterrows():
         G.add_node(row['code'], description=row['description'], tags=row['tags'], properties=row['properties'], is_explicit_position=True)
+        index.add(row['code'], position_coords(Position(row['code'])))
 
     for idx, row in tqdm(transitions.iterrows(), total=len(transitions), desc="Processing transitions"):
         start_pos = Position(row['start_position'])
         end_pos = Position(row['end_position'])
 
         # find or add start node then update df with result
-        start_node = find_or_add_node(start_pos, row, G)
+        start_node = find_or_add_node(start_pos, row, G, index)
         transitions.loc[idx, 'trans_start_node'] = start_node
         # find or add end node then update df with result
-        end_node = find_or_add_node(end_pos, row, G)
+        end_node = find_or_add_node(end_pos, row, G, index)
         transitions.loc[idx, 'trans_end_node'] = end_node
 
         # Add the edge (transition)
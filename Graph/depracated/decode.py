@@ -1,6 +1,11 @@
+import os
+import shutil
 import string
+import tempfile
 from enum import Enum
+from typing import Dict, Iterable, Sequence
 import numpy as np
+from Graph.json_stream import iter_records
 
 BASE62_DIGITS = string.ascii_lowercase + string.ascii_uppercase + string.digits
 
@@ -99,6 +104,96 @@ def decode_position(s):
 
     return p
 
+# byte value -> base62 digit, INVALID_DIGIT for anything else
+INVALID_DIGIT = 255
+BASE62_LUT = np.full(256, INVALID_DIGIT, dtype=np.uint8)
+BASE62_LUT[np.frombuffer(BASE62_DIGITS.encode(), dtype=np.uint8)] = np.arange(len(BASE62_DIGITS))
+IS_WHITESPACE = np.zeros(256, dtype=bool)
+IS_WHITESPACE[np.frombuffer(string.whitespace.encode(), dtype=np.uint8)] = True
+# added to the decoded x, y, z of every joint, like in decode_position
+COORDINATE_OFFSETS = np.array([-2, 0, -2])
+
+
+def decode_positions(codes: Sequence[str]) -> np.ndarray:
+    """
+    Decodes many position codes at once into an (N, 2, JOINT_COUNT, 3) float32 array of joint coordinates, indexed by
+    code, player, joint value and axis, with the same values as decode_position. All codes are translated to base62
+    digits in one lookup-table pass over their bytes, and whitespace anywhere in a code (like the line breaks of the
+    GrappleMap export) is dropped with a mask
+    """
+    if len(codes) == 0:
+        return np.zeros((0, 2, JOINT_COUNT, 3), dtype=np.float32)
+    raw = np.frombuffer(''.join(codes).encode(), dtype=np.uint8)
+    digits = BASE62_LUT[raw]
+    is_digit = ~IS_WHITESPACE[raw]
+    invalid = np.flatnonzero(is_digit & (digits == INVALID_DIGIT))
+    if len(invalid):
+        raise ValueError(f"Not a base 62 digit: {bytes(raw[invalid[:1]]).decode(errors='replace')}")
+    # the digits of every code are counted, since a code that is too long and one that is too short would otherwise
+    # add up to the right total
+    lengths = np.array([len(code.encode()) for code in codes])
+    starts = np.cumsum(lengths) - lengths
+    # reduceat sums a single element for empty codes, and needs a valid index for an empty last one
+    counts = np.add.reduceat(np.append(is_digit, False), starts)
+    counts[lengths == 0] = 0
+    wrong = np.flatnonzero(counts != ENCODED_POS_SIZE)
+    if len(wrong):
+        raise ValueError(f"Expected {ENCODED_POS_SIZE} digits in code {wrong[0]}, got {counts[wrong[0]]}")
+    digits = digits[is_digit]
+    pairs = digits.reshape(-1, 2).astype(np.int64)
+    values = (pairs[:, 0] * 62 + pairs[:, 1]) / 1000
+    return (values.reshape(len(codes), 2, JOINT_COUNT, 3) + COORDINATE_OFFSETS).astype(np.float32)
+
+
+def _decode_records(records: Iterable[Dict], key: str, batch_size: int):
+    """decodes the codes under key of every record in batches, returning the record ids, codes per record and joints"""
+    ids, counts, batches, batch = [], [], [], []
+    for record in records:
+        codes = record[key] if isinstance(record[key], list) else [record[key]]
+        ids.append(record['id'])
+        counts.append(len(codes))
+        batch += codes
+        if len(batch) >= batch_size:
+            batches.append(decode_positions(batch))
+            batch = []
+    batches.append(decode_positions(batch))
+    return np.array(ids, dtype=np.int64), np.array(counts, dtype=np.int64), np.concatenate(batches)
+
+
+def build_position_cache(nodes_path: str, transitions_path: str, cache_path: str, batch_size: int = 4096):
+    """
+    Decodes the position of every node and every frame of every transition of the GrappleMap JSON export and writes
+    them to cache_path, one .npy file per array, for load_position_cache:
+        node_ids, positions: node ids and their (num_nodes, 2, JOINT_COUNT, 3) positions
+        transition_ids, frame_offsets, frames: transition ids, and the frames of transition i are
+            frames[frame_offsets[i]:frame_offsets[i + 1]]
+    Records are streamed and decoded batch_size codes at a time. The directory is written under a temporary name and
+    renamed into place
+    """
+    node_ids, _, positions = _decode_records(iter_records(nodes_path, skip_keys=('frames',)), 'position', batch_size)
+    transition_ids, frame_counts, frames = _decode_records(iter_records(transitions_path, skip_keys=('position',)),
+                                                           'frames', batch_size)
+    arrays = {'node_ids': node_ids, 'positions': positions, 'transition_ids': transition_ids,
+              'frame_offsets': np.concatenate([[0], np.cumsum(frame_counts)]), 'frames': frames}
+    parent = os.path.dirname(os.path.abspath(cache_path))
+    os.makedirs(parent, exist_ok=True)
+    tmp_path = tempfile.mkdtemp(dir=parent, prefix='.tmp-')
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp_path, f'{name}.npy'), array)
+    if os.path.isdir(cache_path):
+        shutil.rmtree(cache_path)
+    os.rename(tmp_path, cache_path)
+
+
+def load_position_cache(cache_path: str, mmap: bool = True) -> Dict[str, np.ndarray]:
+    """
+    the arrays written by build_position_cache, by name. With mmap they are memory-mapped read-only, so only the
+    positions and frames that are used are read from disk
+    """
+    return {name: np.load(os.path.join(cache_path, f'{name}.npy'), mmap_mode='r' if mmap else None)
+            for name in ('node_ids', 'positions', 'transition_ids', 'frame_offsets', 'frames')}
+
+
 def main():
     # Example usage on 'far knee finish' :
     encoded_position = "Kjbf9jYHaX2kJ7eF7XU5aM2TJUdm7mVWbJ2jIWaY0WUlhJZgKlhI1UNPiM1uHeoqVLMdnMT5EhkWWALBjmSCGCiKTOHUh7UzHlhKTLGGhTUxHUg1UBF0hSVFKTk8ZdJHo7UuJMqySdLRaERbIpaFZoIpaKPIGraEWdJkbEQjG2bJW2KSioQgHoiBVVHoogPlFuooSzLwvxQZHTwQUgNwrtP0E5tgTjM7o5TtHoqaVnNqpIUzHZqzWvNipcVJIHpDW6GusfQKKqw4S7MMxeUq"  # Your 276-character encoded position string goes here
@@ -0,0 +1,55 @@
+import numpy as np
+from typing import Dict, Hashable, List, Optional, Tuple
+from Graph.depracated.position_kernels import (HEAD_TOLERANCE, NUM_JOINTS, as_stack, head_to_head, reoriented_to,
+                                               standardize)
+
+
+class PositionIndex:
+    """
+    Finds the first added position equivalent to a query under is_reoriented, without comparing it to every position.
+
+    Positions are bucketed by their head-to-head distance, in buckets as wide as its tolerance, so only the query's
+    bucket and its two neighbours can hold matches: about 2% of the GrappleMap positions. The candidates in them are
+    checked all at once with position_kernels.reoriented_to, against positions standardized when they were added.
+    Matches are the same as those of a linear scan with is_reoriented, which returns the first equivalent position
+    in the order they were added
+    """
+    def __init__(self, capacity: int = 1024):
+        self.keys: List[Hashable] = []
+        self._coords = np.zeros((capacity, NUM_JOINTS, 3))
+        self._standardized = np.zeros((capacity, NUM_JOINTS, 3))
+        self._head_distances = np.zeros(capacity)
+        self._buckets: Dict[int, List[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def add(self, key: Hashable, coords: np.ndarray):
+        index = len(self.keys)
+        if index == len(self._coords):
+            for name in ('_coords', '_standardized', '_head_distances'):
+                array = getattr(self, name)
+                setattr(self, name, np.concatenate([array, np.zeros_like(array)]))
+        self.keys.append(key)
+        self._coords[index] = as_stack(coords)[0]
+        self._standardized[index] = standardize(coords)[0]
+        self._head_distances[index] = head_to_head(coords)[0]
+        self._buckets.setdefault(int(self._head_distances[index] // HEAD_TOLERANCE), []).append(index)
+
+    def find(self, coords: np.ndarray) -> Optional[Hashable]:
+        """key of the first added position equivalent to coords, or None"""
+        bucket = int(head_to_head(coords)[0] // HEAD_TOLERANCE)
+        candidates = np.sort(np.array([index for nearby in (bucket - 1, bucket, bucket + 1)
+                                       for index in self._buckets.get(nearby, ())], dtype=np.int64))
+        if len(candidates) == 0:
+            return None
+        equivalent = reoriented_to(coords, self._coords[candidates], self._standardized[candidates])
+        return self.keys[candidates[np.argmax(equivalent)]] if equivalent.any() else None
+
+    def find_or_add(self, key: Hashable, coords: np.ndarray) -> Tuple[Hashable, bool]:
+        """the key of the first equivalent position, adding coords under key if there is none, and whether it was added"""
+        match = self.find(coords)
+        if match is not None:
+            return match, False
+        self.add(key, coords)
+        return key, True
@@ -0,0 +1,148 @@
+import numpy as np
+from typing import Optional
+
+# positions are stacked as (N, 46, 3) arrays: joint j of player p is row p * 23 + j, in Joint order
+JOINTS_PER_PLAYER = 23
+NUM_JOINTS = 2 * JOINTS_PER_PLAYER
+HEAD = 22  # Joint.Head
+# the tolerances of is_reoriented in position.py
+HEAD_TOLERANCE = 0.05
+LIMB_TOLERANCE = 0.05
+PROCRUSTES_TOLERANCE = 0.05
+
+# row orders of the same position with the players swapped, and mirrored (left and right joints exchanged)
+SWAP_ORDER = np.r_[JOINTS_PER_PLAYER:NUM_JOINTS, 0:JOINTS_PER_PLAYER]
+_MIRROR_JOINTS = np.array([1, 0, 3, 2, 5, 4, 7, 6, 9, 8, 11, 10, 13, 12, 15, 14, 17, 16, 19, 18, 20, 21, 22])
+MIRROR_ORDER = np.r_[_MIRROR_JOINTS, _MIRROR_JOINTS + JOINTS_PER_PLAYER]
+# pairs per batch of pairwise_reoriented, bounding its memory use to a few tens of MB
+PAIR_CHUNK = 1 << 15
+
+
+def as_stack(positions: np.ndarray) -> np.ndarray:
+    """positions as an (N, 46, 3) float64 array, from one or many positions shaped (46, 3) or (2, 23, 3)"""
+    positions = np.asarray(positions, dtype=np.float64)
+    return positions.reshape(-1, NUM_JOINTS, 3)
+
+
+def head_to_head(positions: np.ndarray) -> np.ndarray:
+    """squared distance between the players' heads of every position, like head2head"""
+    positions = as_stack(positions)
+    return np.sum((positions[:, HEAD] - positions[:, JOINTS_PER_PLAYER + HEAD]) ** 2, axis=-1)
+
+
+def limb_vectors(positions: np.ndarray) -> np.ndarray:
+    """every joint's offset from its player's head, like distance_from_head for both players"""
+    positions = as_stack(positions)
+    heads = np.repeat(positions[:, [HEAD, JOINTS_PER_PLAYER + HEAD]], JOINTS_PER_PLAYER, axis=1)
+    return heads - positions
+
+
+def swapped(positions: np.ndarray) -> np.ndarray:
+    """the positions with the players swapped, like swap_players"""
+    return as_stack(positions)[:, SWAP_ORDER]
+
+
+def mirrored(positions: np.ndarray) -> np.ndarray:
+    """the positions reflected across the x = 0 plane, with every left joint exchanged for the right one"""
+    return as_stack(positions)[:, MIRROR_ORDER] * [-1, 1, 1]
+
+
+def _limbs_agree(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """np.allclose(a, b, atol=LIMB_TOLERANCE) of every pair of stacked limb vectors, broadcast like isclose"""
+    return np.all(np.abs(a - b) <= LIMB_TOLERANCE + 1e-5 * np.abs(b), axis=(-2, -1))
+
+
+def standardize(positions: np.ndarray) -> np.ndarray:
+    """the positions centered on their centroid and scaled to unit norm, as procrustes does before fitting"""
+    positions = as_stack(positions)
+    centered = positions - positions.mean(axis=1, keepdims=True)
+    return centered / np.sqrt(np.sum(centered ** 2, axis=(1, 2), keepdims=True))
+
+
+def _disparities(cross_products: np.ndarray) -> np.ndarray:
+    # 1 - (sum of singular values of reference^T @ query)^2 is the residual of the best rotation, reflection and
+    # scaling of one standardized position onto the other, which scipy.spatial.procrustes reports
+    return 1 - np.linalg.svd(cross_products, compute_uv=False).sum(axis=-1) ** 2
+
+
+def _paired_disparities(queries: np.ndarray, references: np.ndarray) -> np.ndarray:
+    """disparities of queries[i] and references[i], both standardized"""
+    return _disparities(np.swapaxes(references, 1, 2) @ queries)
+
+
+def procrustes_disparities(queries: np.ndarray, references: np.ndarray, standardized: bool = False) -> np.ndarray:
+    """
+    (Q, R) matrix of the Procrustes disparities between every query and every reference, with the 3x3 cross products
+    of all pairs decomposed in one stacked SVD. Set standardized if both have gone through standardize already
+    """
+    if not standardized:
+        queries, references = standardize(queries), standardize(references)
+    return _disparities(np.swapaxes(as_stack(references), 1, 2)[None] @ as_stack(queries)[:, None])
+
+
+def reoriented_to(query: np.ndarray, references: np.ndarray,
+                  standardized_references: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    One-vs-many is_reoriented: whether the query is equivalent to each of the references, as a boolean array.
+    Procrustes only runs on references whose heads are as far apart but whose joint offsets from the heads differ,
+    for them and for them with their players swapped, in one stacked SVD. standardized_references can be passed to
+    reuse standardize(references) across calls
+    """
+    query, references = as_stack(query), as_stack(references)
+    near = np.abs(head_to_head(references) - head_to_head(query)) <= HEAD_TOLERANCE
+    same_limbs = np.zeros(len(references), dtype=bool)
+    same_limbs[near] = _limbs_agree(limb_vectors(query), limb_vectors(references[near]))
+    fitted = np.flatnonzero(near & ~same_limbs)
+    if standardized_references is None:
+        others = standardize(references[fitted])
+    else:
+        others = as_stack(standardized_references)[fitted]
+    others = np.concatenate([others, others[:, SWAP_ORDER]])
+    disparities = procrustes_disparities(standardize(query), others, standardized=True).reshape(2, -1)
+    equivalent = same_limbs
+    equivalent[fitted] = disparities.min(axis=0) < PROCRUSTES_TOLERANCE
+    return equivalent
+
+
+def pairwise_reoriented(queries: np.ndarray, references: np.ndarray, pair_chunk: int = PAIR_CHUNK) -> np.ndarray:
+    """
+    Many-vs-many is_reoriented: a (Q, R) boolean matrix of which queries are equivalent to which references. Head
+    distances are compared for all pairs at once, and the joint offsets and Procrustes fits of the pairs left are
+    computed pair_chunk pairs at a time
+    """
+    queries, references = as_stack(queries), as_stack(references)
+    equivalent = np.zeros((len(queries), len(references)), dtype=bool)
+    query_index, reference_index = np.nonzero(np.abs(head_to_head(queries)[:, None] - head_to_head(references)[None])
+                                              <= HEAD_TOLERANCE)
+    query_limbs, reference_limbs = limb_vectors(queries), limb_vectors(references)
+    standardized_queries, standardized_references = standardize(queries), standardize(references)
+    for start in range(0, len(query_index), pair_chunk):
+        rows, columns = query_index[start:start + pair_chunk], reference_index[start:start + pair_chunk]
+        same_limbs = _limbs_agree(query_limbs[rows], reference_limbs[columns])
+        fitted = ~same_limbs
+        fitted_queries = standardized_queries[rows[fitted]]
+        fitted_references = standardized_references[columns[fitted]]
+        disparities = np.minimum(_paired_disparities(fitted_queries, fitted_references),
+                                 _paired_disparities(fitted_queries, fitted_references[:, SWAP_ORDER]))
+        matched = same_limbs
+        matched[fitted] = disparities < PROCRUSTES_TOLERANCE
+        equivalent[rows, columns] = matched
+    return equivalent
+
+
+def is_reoriented(a: np.ndarray, b: np.ndarray) -> bool:
+    """
+    is_reoriented of position.py for the joint coordinates of two positions: heads as far apart and then the same
+    joint offsets from the heads, or a Procrustes match of b or b with its players swapped. Procrustes already allows
+    reflections, and position.py's mirror only negates x without reordering the joints, so mirroring adds nothing
+    """
+    if abs(head_to_head(a)[0] - head_to_head(b)[0]) > HEAD_TOLERANCE:
+        return False
+    if np.allclose(limb_vectors(a), limb_vectors(b), atol=LIMB_TOLERANCE):
+        return True
+    return bool(procrustes_disparities(a, np.concatenate([as_stack(b), swapped(b)])).min() < PROCRUSTES_TOLERANCE)
+
+
+def procrustes_disparity(a: np.ndarray, b: np.ndarray) -> float:
+    """the disparity scipy.spatial.procrustes returns for the joints of two positions"""
+    return float(procrustes_disparities(a, b)[0, 0])
@@ -0,0 +1,124 @@
+import numpy as np
+from typing import Optional, Sequence
+from Graph.compiled_graph import CompiledGraph
+from Graph.graph_cache import CACHE_DIR, cached_artifact, save_npz
+
+
+class DistanceIndex:
+    """
+    Precomputed move counts between GrappleMap positions, for O(1) lookups by the game engine:
+
+        distances: (N, N) matrix, distances[a, b] is the least number of moves (edges, whoever plays them) from node a
+            to node b
+        tag_distances: (num_tags, N), the least number of moves from each node to a node with tags[i], matched like
+            find_move_by_node_tags (the tag is a substring of one of the node's tags)
+        tap_distance: least number of moves from each node to the end of a tap edge
+        winner_distance: least number of moves from each node to a winning position
+
+    Distances are stored as uint8, or uint16 if the graph is too deep for it, and `unreachable` (the dtype's maximum)
+    marks pairs without a path
+    """
+    def __init__(self, distances: np.ndarray, tags: Sequence[str], tag_distances: np.ndarray,
+                 tap_distance: np.ndarray, winner_distance: np.ndarray):
+        self.distances = distances
+        self.tags = tuple(tags)
+        self.tag_distances = tag_distances
+        self.tap_distance = tap_distance
+        self.winner_distance = winner_distance
+        self.unreachable = np.iinfo(distances.dtype).max
+        self._tag_rows = {tag: row for row, tag in enumerate(self.tags)}
+
+    def distance(self, start: int, end: int) -> int:
+        return int(self.distances[start, end])
+
+    def distance_to_tag(self, node: int, tag: str) -> int:
+        return int(self.tag_distances[self._tag_rows[tag], node])
+
+    def to_tag(self, tag: str) -> np.ndarray:
+        """distance from every node to the nearest node with the tag, for vectorized lookups"""
+        return self.tag_distances[self._tag_rows[tag]]
+
+    def save(self, path: str):
+        save_npz(path, distances=self.distances, tags=np.array(self.tags, dtype=str), tag_distances=self.tag_distances,
+                 tap_distance=self.tap_distance, winner_distance=self.winner_distance)
+
+    @classmethod
+    def load(cls, path: str) -> 'DistanceIndex':
+        with np.load(path) as arrays:
+            return cls(arrays['distances'], arrays['tags'].tolist(), arrays['tag_distances'], arrays['tap_distance'],
+                       arrays['winner_distance'])
+
+
+def all_pairs_distances(compiled: CompiledGraph) -> np.ndarray:
+    """
+    Breadth-first search from every node at once. The frontier holds, for every node, the bit-packed set of sources
+    that reached it at the current depth. Each level follows every edge for every source in one step: the frontier
+    rows of the edges' sources are gathered in edges-by-target order and OR-reduced per target node, which costs
+    O(N * E / 8) bytes per level. Returns an int32 matrix with -1 for unreachable pairs
+    """
+    num_nodes = compiled.num_nodes
+    # built transposed, distances[target, source], as the frontier is indexed by the nodes reached
+    distances = np.full((num_nodes, num_nodes), -1, dtype=np.int32)
+    np.fill_diagonal(distances, 0)
+    if compiled.num_edges == 0:
+        return distances
+    order = np.argsort(compiled.targets, kind='stable')
+    sources = compiled.sources[order]
+    targets, target_starts = np.unique(compiled.targets[order], return_index=True)
+
+    frontier = np.packbits(np.eye(num_nodes, dtype=bool), axis=1)
+    reached = frontier.copy()
+    depth = 0
+    while frontier.any():
+        depth += 1
+        next_frontier = np.zeros_like(frontier)
+        next_frontier[targets] = np.bitwise_or.reduceat(frontier[sources], target_starts, axis=0)
+        frontier = next_frontier & ~reached
+        reached |= frontier
+        distances[np.unpackbits(frontier, axis=1, count=num_nodes).view(bool)] = depth
+    return np.ascontiguousarray(distances.T)
+
+
+def _nearest(distances: np.ndarray, nodes: np.ndarray, offset: int = 0) -> np.ndarray:
+    """distance from every node to the nearest of the given nodes, plus offset, with -1 where none is reachable"""
+    if len(nodes) == 0:
+        return np.full(len(distances), -1, dtype=np.int32)
+    reachable = np.where(distances[:, nodes] >= 0, distances[:, nodes], np.iinfo(np.int32).max)
+    nearest = reachable.min(axis=1)
+    return np.where(nearest < np.iinfo(np.int32).max, nearest + offset, -1)
+
+
+def build_distance_index(compiled: CompiledGraph, node_tags: Optional[Sequence[Sequence[str]]] = None,
+                         tags: Optional[Sequence[str]] = None) -> DistanceIndex:
+    """
+    Builds the index of a compiled graph. node_tags holds the tags of every node and defaults to the 'tags' attribute
+    of the networkx view; tags are the ones to index and default to every node tag
+    """
+    if node_tags is None:
+        node_tags = [compiled.graph.nodes[node].get('tags', []) for node in range(compiled.num_nodes)]
+    if tags is None:
+        tags = sorted({tag for tags_of_node in node_tags for tag in tags_of_node})
+    distances = all_pairs_distances(compiled)
+    tag_distances = np.array([_nearest(distances, np.array([node for node, tags_of_node in enumerate(node_tags)
+                                                            if any(tag in node_tag for node_tag in tags_of_node)],
+                                                           dtype=np.int64))
+                              for tag in tags]).reshape(len(tags), compiled.num_nodes)
+    # a tap is one move past the start of a tap edge
+    tap_distance = _nearest(distances, np.unique(compiled.sources[compiled.tap]), offset=1)
+    winner_distance = _nearest(distances, np.flatnonzero(compiled.winner))
+
+    deepest = max(int(distances.max()), int(tag_distances.max(initial=0)), int(tap_distance.max()),
+                  int(winner_distance.max()))
+    dtype = np.uint8 if deepest < np.iinfo(np.uint8).max else np.uint16
+    unreachable = np.iinfo(dtype).max
+
+    def compact(values: np.ndarray) -> np.ndarray:
+        return np.where(values >= 0, values, unreachable).astype(dtype)
+
+    return DistanceIndex(compact(distances), tags, compact(tag_distances), compact(tap_distance),
+                         compact(winner_distance))
+
+
+def get_distance_index(compiled: CompiledGraph, cache_dir: str = CACHE_DIR) -> DistanceIndex:
+    """the distance index of a compiled graph, built once and then loaded from the graph cache directory"""
+    return cached_artifact(compiled, 'distances', build_distance_index, DistanceIndex.load, cache_dir)
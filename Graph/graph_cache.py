@@ -0,0 +1,237 @@
+import functools
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+import networkx as nx
+from typing import Any, Callable, Dict, Optional, Tuple, TypeVar
+from Graph.compiled_graph import CompiledGraph, compile_graph
+from Graph.graph_constructor import build_graph, load_records, NODES_PATH, TRANSITIONS_PATH
+from Graph.incremental import source_records, update_graph
+from Graph.reward import MOVE_POINTS, WINSTATE_PATH
+
+# bump whenever construct_graph, the reward passes or the snapshot layout change, so stale caches are never loaded
+CACHE_VERSION = 1
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'files', 'cache')
+# arrays written to disk. points and sources are derived from these when the snapshot is constructed
+CACHED_ARRAYS = ('offsets', 'targets', 'edge_ids', 'top', 'bottom', 'tap', 'swaps', 'move_flags', 'winner')
+
+Artifact = TypeVar('Artifact')
+
+
+def cache_key(nodes_path: str, transitions_path: str, winstate_path: str, rewards: Dict[str, int]) -> str:
+    """sha256 of the cache version, the reward config and the contents of every input JSON file"""
+    digest = hashlib.sha256(f'version={CACHE_VERSION}\n'.encode())
+    digest.update(json.dumps(rewards, sort_keys=True).encode())
+    for path in (nodes_path, transitions_path, winstate_path):
+        with open(path, 'rb') as file:
+            for chunk in iter(lambda: file.read(1 << 20), b''):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def graph_digest(compiled: CompiledGraph) -> str:
+    """sha256 of a snapshot's arrays and reward config, naming the tables derived from it that are cached on disk"""
+    digest = hashlib.sha256(json.dumps(compiled.rewards, sort_keys=True).encode())
+    for name in CACHED_ARRAYS:
+        digest.update(np.ascontiguousarray(getattr(compiled, name)).tobytes())
+    return digest.hexdigest()
+
+
+def _graph_to_json(G: nx.DiGraph) -> Dict:
+    # nodes and edges are written in insertion order so the rebuilt graph keeps the same 'outgoing' ordering
+    return {'nodes': [[node, data] for node, data in G.nodes(data=True)],
+            'edges': [[start, end, data] for start, end, data in G.edges(data=True)]}
+
+
+def _graph_from_json(path: str) -> nx.DiGraph:
+    with open(path, 'r') as file:
+        data = json.load(file)
+    G = nx.DiGraph()
+    G.add_nodes_from((node, attrs) for node, attrs in data['nodes'])
+    G.add_edges_from((start, end, attrs) for start, end, attrs in data['edges'])
+    return G
+
+
+def save_compiled_graph(compiled: CompiledGraph, cache_path: str, metadata: Dict[str, Any] = None):
+    """
+    Writes the snapshot to cache_path: one .npy file per array, a small metadata.json blob and the annotated
+    networkx graph (graph.json) for debugging. The directory is written under a temporary name and renamed into place,
+    so concurrent workers never see a partially written cache
+    """
+    parent = os.path.dirname(os.path.abspath(cache_path))
+    os.makedirs(parent, exist_ok=True)
+    tmp_path = tempfile.mkdtemp(dir=parent, prefix='.tmp-')
+    try:
+        for name in CACHED_ARRAYS:
+            np.save(os.path.join(tmp_path, f'{name}.npy'), getattr(compiled, name))
+        with open(os.path.join(tmp_path, 'metadata.json'), 'w') as file:
+            json.dump({'version': CACHE_VERSION,
+                       'rewards': compiled.rewards,
+                       'node_descriptions': compiled.node_descriptions,
+                       'edge_descriptions': compiled.edge_descriptions,
+                       **(metadata or {})}, file)
+        if compiled.graph is not None:
+            with open(os.path.join(tmp_path, 'graph.json'), 'w') as file:
+                json.dump(_graph_to_json(compiled.graph), file)
+        os.rename(tmp_path, cache_path)
+    except OSError:
+        # another process finished writing the same cache entry first
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        if not os.path.isdir(cache_path):
+            raise
+
+
+def save_npz(path: str, **arrays: np.ndarray):
+    """writes arrays to an .npz file under a temporary name and renames it into place, so readers never see a partial
+    file"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    descriptor, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-', suffix='.npz')
+    try:
+        with os.fdopen(descriptor, 'wb') as file:
+            np.savez(file, **arrays)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def cached_artifact(compiled: CompiledGraph, name: str, build: Callable[[CompiledGraph], Artifact],
+                    load: Callable[[str], Artifact], cache_dir: str = CACHE_DIR) -> Artifact:
+    """
+    An artifact derived from a compiled graph, cached in cache_dir as <name>-<graph digest>.npz: loaded with load if
+    it is there, and otherwise built with build and written with its save(path) method
+    """
+    path = os.path.join(cache_dir, f'{name}-{graph_digest(compiled)}.npz')
+    if os.path.exists(path):
+        return load(path)
+    artifact = build(compiled)
+    artifact.save(path)
+    return artifact
+
+
+def load_compiled_graph(cache_path: str) -> CompiledGraph:
+    """
+    Loads a snapshot written by save_compiled_graph. Arrays are memory-mapped read-only, and the networkx graph is
+    only parsed if CompiledGraph.graph is accessed
+    """
+    with open(os.path.join(cache_path, 'metadata.json'), 'r') as file:
+        metadata = json.load(file)
+    if metadata['version'] != CACHE_VERSION:
+        raise ValueError(f"graph cache at {cache_path} has version {metadata['version']}, expected {CACHE_VERSION}")
+    # plain ndarray views of the memory maps: indexing an np.memmap goes through a slow Python-level __getitem__
+    arrays = {name: np.asarray(np.load(os.path.join(cache_path, f'{name}.npy'), mmap_mode='r'))
+              for name in CACHED_ARRAYS}
+    graph_path = os.path.join(cache_path, 'graph.json')
+    return CompiledGraph(**arrays, rewards=metadata['rewards'],
+                         node_descriptions=metadata['node_descriptions'],
+                         edge_descriptions=metadata['edge_descriptions'],
+                         graph_loader=functools.partial(_graph_from_json, graph_path) if os.path.exists(graph_path) else None)
+
+
+def _latest_snapshot(cache_dir: str, rewards: Dict[str, int]) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """the most recently written cache entry for the same reward config that has source records, and its metadata"""
+    latest, latest_time = None, None
+    if not os.path.isdir(cache_dir):
+        return None
+    for name in os.listdir(cache_dir):
+        metadata_path = os.path.join(cache_dir, name, 'metadata.json')
+        if name.startswith('.') or not os.path.exists(metadata_path):
+            continue
+        modified = os.path.getmtime(metadata_path)
+        if latest_time is None or modified > latest_time:
+            with open(metadata_path, 'r') as file:
+                metadata = json.load(file)
+            if metadata.get('version') == CACHE_VERSION and metadata.get('rewards') == rewards and \
+                    'records' in metadata and os.path.exists(os.path.join(cache_dir, name, 'graph.json')):
+                latest, latest_time = (os.path.join(cache_dir, name), metadata), modified
+    return latest
+
+
+def load_graph(nodes_path: str = NODES_PATH, transitions_path: str = TRANSITIONS_PATH,
+               winstate_path: str = WINSTATE_PATH, rewards: Dict[str, int] = MOVE_POINTS,
+               cache_dir: str = CACHE_DIR, incremental: bool = False,
+               stream: bool = False) -> Tuple[CompiledGraph, Dict[str, Any]]:
+    """
+    Returns the compiled GrappleMap graph, loading it from the cache when the input files and reward config are
+    unchanged and building + caching it otherwise.
+
+    With incremental=True, a cache miss updates the most recent cached snapshot instead of building from scratch:
+    the source records are diffed against that snapshot's and only the changed nodes and transitions and their
+    neighbours are annotated again (see Graph.incremental.update_graph). The result is cached under the new key.
+    Source records are only computed and stored by incremental loads, so only their snapshots can be updated later.
+    With stream=True, a cache miss reads the input files with the streaming loader, which never loads their 3D data
+    (see construct_graph). Source records are then fingerprinted without it, so an incremental build from a
+    snapshot written without stream rebuilds every edge.
+
+    Also returns a report of where the startup time went:
+        key: cache key (hash of the inputs)
+        cache_hit: whether the snapshot was loaded from disk
+        base_key: key of the snapshot an incremental build started from, None for full builds and cache hits
+        hash_seconds: time spent hashing the input files
+        load_seconds: time spent loading (cache hit) or constructing, compiling and writing (cache miss) the graph
+        total_seconds: hash_seconds + load_seconds
+    """
+    start = time.perf_counter()
+    key = cache_key(nodes_path, transitions_path, winstate_path, rewards)
+    hashed = time.perf_counter()
+    cache_path = os.path.join(cache_dir, key)
+
+    cache_hit = os.path.isdir(cache_path)
+    base_key = None
+    if cache_hit:
+        compiled = load_compiled_graph(cache_path)
+    else:
+        nodes, transitions = list(load_records(nodes_path, stream)), list(load_records(transitions_path, stream))
+        records = source_records(nodes, transitions, winstate_path) if incremental else None
+        base = _latest_snapshot(cache_dir, rewards) if incremental else None
+        G = None
+        if base is not None:
+            base_path, base_metadata = base
+            G = update_graph(_graph_from_json(os.path.join(base_path, 'graph.json')), base_metadata['records'],
+                             nodes, transitions, winstate_path, records=records)
+            base_key = base_metadata.get('key') if G is not None else None
+        if G is None:
+            G = build_graph(nodes, transitions, winstate_path=winstate_path)
+        compiled = compile_graph(G, rewards=rewards)
+        metadata = {'key': key, 'records': records} if incremental else {'key': key}
+        save_compiled_graph(compiled, cache_path, metadata=metadata)
+    end = time.perf_counter()
+
+    report = {'key': key, 'cache_hit': cache_hit, 'cache_path': cache_path, 'base_key': base_key,
+              'hash_seconds': hashed - start, 'load_seconds': end - hashed, 'total_seconds': end - start}
+    return compiled, report
+
+
+def format_load_report(report: Dict[str, Any]) -> str:
+    if report['cache_hit']:
+        source = 'loaded from cache'
+    elif report.get('base_key'):
+        source = f"updated from snapshot {report['base_key'][:12]} and cached"
+    else:
+        source = 'built and cached (cold start)'
+    return (f"GrappleMap graph {source} in {report['total_seconds'] * 1000:.1f} ms "
+            f"(hashing inputs: {report['hash_seconds'] * 1000:.1f} ms, key {report['key'][:12]})")
+
+
+@functools.lru_cache(maxsize=None)
+def _load_once(**load_kwargs) -> Tuple[CompiledGraph, Dict[str, Any]]:
+    return load_graph(**load_kwargs)
+
+
+def get_compiled_graph(**load_kwargs) -> CompiledGraph:
+    """
+    Loads the compiled GrappleMap graph once per process, going through the on-disk cache. Repeated calls with the
+    same arguments return the same shared snapshot, so creating many games does not rebuild the graph. Nothing is
+    printed: command-line callers print format_load_report(get_load_report()) themselves
+    """
+    return _load_once(**load_kwargs)[0]
+
+
+def get_load_report(**load_kwargs) -> Dict[str, Any]:
+    """the load_graph report of the snapshot get_compiled_graph returns for the same arguments"""
+    return _load_once(**load_kwargs)[1]
@@ -1,6 +1,11 @@
 import json
+import multiprocessing
+import resource
+import sys
+import time
 import networkx as nx
-from Graph.reward import add_rewards_to_graph
+from Graph.json_stream import iter_records
+from Graph.reward import add_rewards_to_graph, WINSTATE_PATH
 from typing import List, Tuple, Dict
 import copy
 
@@ -61,13 +66,13 @@ def add_edges(transitions: list, G: nx.DiGraph):
 
     return G
 
-def refactor_incoming_and_outgoing(G: nx.DiGraph) -> nx.DiGraph:
+def refactor_incoming_and_outgoing(G: nx.DiGraph, nodes=None) -> nx.DiGraph:
     """
     Rewrites the values of the 'incoming' and 'outgoing' attributes of each node to reflect the actual edges in this
     graph, not the edge names imported from GrappleMap. Otherwise, they would miss some edges
 
     This will also add some information on the edge that the agent can observe easily, rather than calculate at
-    each timestep
+    each timestep. nodes limits the rewrite to those nodes
     """
     def create_edge_dict(edge_data: List[Tuple[int, int, Dict]]) -> list[dict[str, bool]]:
         transitions_in_or_out = []
@@ -82,7 +87,7 @@ def refactor_incoming_and_outgoing(G: nx.DiGraph) -> nx.DiGraph:
                                           'top': edge_data['top'],
                                           'bottom': edge_data['bottom']})
         return transitions_in_or_out
-    for node in G.nodes:
+    for node in (G.nodes if nodes is None else nodes):
         # get edges in and out
         out_edges = list(G.out_edges(node, data=True))
         in_edges = list(G.in_edges(node, data=True))
@@ -101,20 +106,63 @@ def load_json(fpath):
     with open(fpath, 'r') as file:
         return json.load(file)
 
-def construct_graph(nodes_path='/Users/afmorsi/dev/JJ_RL/Graph/files/nodes.json',
-                    transitions_path='/Users/afmorsi/dev/JJ_RL/Graph/files/transitions.json') -> nx.classes.digraph.DiGraph:
+def load_records(fpath, stream=False):
+    """
+    the records of a GrappleMap JSON export: the whole file with json.load, or, if stream, an iterator reading one
+    record at a time and skipping the 3D 'frames' and 'position' data without decoding it
+    """
+    return iter_records(fpath) if stream else load_json(fpath)
 
-    nodes = load_json(nodes_path)
-    transitions = load_json(transitions_path)
+NODES_PATH = '/Users/afmorsi/dev/JJ_RL/Graph/files/nodes.json'
+TRANSITIONS_PATH = '/Users/afmorsi/dev/JJ_RL/Graph/files/transitions.json'
+
+def construct_graph(nodes_path=NODES_PATH, transitions_path=TRANSITIONS_PATH,
+                    winstate_path=WINSTATE_PATH, stream=False) -> nx.classes.digraph.DiGraph:
+    """
+    builds the annotated graph from the GrappleMap export. With stream, nodes and edges are added as the files are
+    read, and the animation data that would otherwise dominate peak memory is never loaded
+    """
+    nodes = load_records(nodes_path, stream=stream)
+    transitions = load_records(transitions_path, stream=stream)
     #tags = load_json('files/tags.json')
+    return build_graph(nodes, transitions, winstate_path=winstate_path)
 
+def build_graph(nodes: list, transitions: list, winstate_path=WINSTATE_PATH) -> nx.classes.digraph.DiGraph:
+    """construct_graph from already loaded node and transition records, which are modified in place"""
     G = add_nodes(nodes)
     G = add_edges(transitions, G)
     G = refactor_incoming_and_outgoing(G)
 
     # add rewards signal to GrappleMap data
-    G = add_rewards_to_graph(G)
+    G = add_rewards_to_graph(G, winstate_path=winstate_path)
 
     return G
 
-G = construct_graph()
+def _measure_construct(nodes_path, transitions_path, winstate_path, stream) -> Dict[str, float]:
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    to_mb = 1 / (1 << 20) if sys.platform == 'darwin' else 1 / (1 << 10)
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    G = construct_graph(nodes_path, transitions_path, winstate_path, stream=stream)
+    seconds = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {'seconds': seconds, 'peak_rss_mb': peak * to_mb, 'added_rss_mb': (peak - baseline) * to_mb,
+            'nodes': G.number_of_nodes(), 'edges': G.number_of_edges()}
+
+def compare_loaders(nodes_path=NODES_PATH, transitions_path=TRANSITIONS_PATH,
+                    winstate_path=WINSTATE_PATH) -> Dict[str, Dict[str, float]]:
+    """
+    Builds the graph with the json.load loader and with the streaming one, each in a fresh interpreter so their peak
+    resident memory can be compared, and returns the build time, the peak RSS and the RSS added by the build of each
+    """
+    context = multiprocessing.get_context('spawn')
+    results = {}
+    for name, stream in (('json.load', False), ('stream', True)):
+        with context.Pool(1) as pool:
+            results[name] = pool.apply(_measure_construct, (nodes_path, transitions_path, winstate_path, stream))
+    return results
+
+if __name__ == "__main__":
+    for name, result in compare_loaders().items():
+        print(f"{name}: {result['seconds']:.2f}s, peak RSS {result['peak_rss_mb']:.0f} MB "
+              f"(+{result['added_rss_mb']:.0f} MB for the build)")
@@ -0,0 +1,104 @@
+import hashlib
+import json
+import networkx as nx
+from typing import Dict, List, Optional, Set
+from Graph.graph_constructor import add_nodes, add_edges, refactor_incoming_and_outgoing
+from Graph.reward import add_terminal_win_states, add_tap_flag, find_and_tag_all_moves, MOVE_FLAGS
+
+
+def _record_hash(record: Dict) -> str:
+    return hashlib.sha256(json.dumps(record).encode()).hexdigest()[:16]
+
+
+def _is_bidirectional(transition: Dict) -> bool:
+    return any(['bidirectional' in prop for prop in transition['properties']])
+
+
+def source_records(nodes: List[Dict], transitions: List[Dict], winstate_path: str) -> Dict:
+    """
+    Per-record fingerprints of the GrappleMap source data, stored in the graph cache metadata so the next build can
+    tell which records changed: a hash per node id, a [hash, from node, to node, bidirectional] entry per transition
+    id, and a hash of the winstate file. Must be taken before the records are cleaned up by add_nodes and add_edges
+    """
+    with open(winstate_path, 'rb') as file:
+        winstate_hash = hashlib.sha256(file.read()).hexdigest()[:16]
+    return {'nodes': {str(node['id']): _record_hash(node) for node in nodes},
+            'transitions': {str(transition['id']): [_record_hash(transition), transition['from']['node'],
+                                                    transition['to']['node'], _is_bidirectional(transition)]
+                            for transition in transitions},
+            'winstate': winstate_hash}
+
+
+def update_graph(previous: nx.DiGraph, previous_records: Dict, nodes: List[Dict], transitions: List[Dict],
+                 winstate_path: str, records: Optional[Dict] = None) -> Optional[nx.DiGraph]:
+    """
+    Builds the same annotated graph as construct_graph(nodes, transitions, winstate_path), reusing the node and edge
+    annotations of `previous`, the graph built from the source data described by previous_records.
+
+    Only changed records and their neighbourhood are processed again:
+        - the outgoing edges of every node that is the source of an edge of a changed, added or removed transition
+          (its 'from' node, and its 'to' node if it is bidirectional) are rebuilt from the transitions that write them
+        - tap flags are recomputed for those nodes
+        - point-earning move flags are recomputed for the edges leaving those nodes, changed nodes and the
+          predecessors of changed nodes, since mount and back flags depend on the tags at both ends of an edge
+        - 'incoming' and 'outgoing' lists are rewritten for changed nodes and the nodes at either end of a rebuilt edge
+        - winning positions are reapplied from the winstate file
+    The graph is reassembled in the original transition order, so node and edge order match a full build.
+
+    Returns None if nodes were added or removed, which needs a full build. The records are modified in place
+    """
+    records = records if records is not None else source_records(nodes, transitions, winstate_path)
+    node_ids = [node['id'] for node in nodes]
+    if set(node_ids) != set(previous.nodes) or len(node_ids) != len(set(node_ids)):
+        return None
+    changed_nodes = {int(node) for node, node_hash in records['nodes'].items()
+                     if previous_records['nodes'].get(node) != node_hash}
+
+    old_transitions, new_transitions = previous_records['transitions'], records['transitions']
+    affected_sources: Set[int] = set()
+    for transition_id in set(old_transitions) | set(new_transitions):
+        old, new = old_transitions.get(transition_id), new_transitions.get(transition_id)
+        if old is not None and new is not None and old[0] == new[0]:
+            continue
+        for _, start, end, bidirectional in filter(None, (old, new)):
+            affected_sources.add(start)
+            if bidirectional:
+                affected_sources.add(end)
+
+    # edges in the order add_edges first creates them, and the transitions rebuilding the edges of affected sources
+    edge_order = {}
+    rebuilt_transitions = []
+    for transition in transitions:
+        start, end, bidirectional = transition['from']['node'], transition['to']['node'], _is_bidirectional(transition)
+        edge_order.setdefault((start, end))
+        if bidirectional:
+            edge_order.setdefault((end, start))
+        if start in affected_sources or (bidirectional and end in affected_sources):
+            rebuilt_transitions.append(transition)
+    rebuilt = add_edges(rebuilt_transitions, nx.DiGraph())
+
+    cleaned = add_nodes([node for node in nodes if node['id'] in changed_nodes])
+    G = nx.DiGraph()
+    G.add_nodes_from((node, cleaned.nodes[node] if node in changed_nodes else previous.nodes[node])
+                     for node in node_ids)
+    G.add_edges_from((start, end, rebuilt.adj[start][end] if start in affected_sources else previous.adj[start][end])
+                     for start, end in edge_order)
+
+    rewritten = set(changed_nodes) | affected_sources
+    for node in affected_sources:
+        rewritten.update(G.successors(node))
+        rewritten.update(previous.successors(node))
+    G = refactor_incoming_and_outgoing(G, nodes=sorted(rewritten))
+
+    for node in G.nodes:
+        G.nodes[node].pop('winner', None)
+    G = add_terminal_win_states(G, json_path=winstate_path)
+    G = add_tap_flag(G, nodes=sorted(affected_sources))
+
+    retagged = set(changed_nodes) | affected_sources
+    for node in changed_nodes:
+        retagged.update(G.predecessors(node))
+    for start, end in G.out_edges(sorted(retagged)):
+        for flag in MOVE_FLAGS:
+            G.edges[start, end].pop(flag, None)
+    return find_and_tag_all_moves(G, nodes=sorted(retagged))
@@ -0,0 +1,148 @@
+import json
+import re
+from typing import Dict, Iterator, Optional, Sequence
+
+# 3D animation data of the GrappleMap export that the graph never uses
+SKIPPED_KEYS = ('frames', 'position')
+CHUNK_SIZE = 1 << 16
+
+_WHITESPACE = re.compile(r'\s*')
+_STRUCTURE = re.compile(r'[\[\]{}"]')
+_SCALAR_END = re.compile(r'[\s,\]}]')
+
+
+class _JsonStream:
+    """
+    A JSON tokenizer reading a file chunk by chunk. Values are first scanned for their extent only (with str.find and
+    regular expressions), then either decoded with json.loads or skipped. The buffer only holds the unread part of the
+    current chunk and the value being read, so skipped values are never held in memory in full
+    """
+    def __init__(self, file, chunk_size: int = CHUNK_SIZE):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.pos = 0
+        # start of the value being read, kept in the buffer across refills. None while skipping
+        self.mark: Optional[int] = None
+
+    def _fill(self) -> bool:
+        """drops what has been read from the buffer and reads another chunk, False at the end of the file"""
+        keep_from = self.pos if self.mark is None else self.mark
+        chunk = self.file.read(self.chunk_size)
+        self.buffer = self.buffer[keep_from:] + chunk
+        self.pos -= keep_from
+        if self.mark is not None:
+            self.mark -= keep_from
+        return bool(chunk)
+
+    def next_char(self) -> str:
+        """the next character that isn't whitespace, without consuming it, or '' at the end of the file"""
+        while True:
+            self.pos = _WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, chars: str) -> str:
+        """consumes and returns the next character, which must be one of chars"""
+        char = self.next_char()
+        if not char or char not in chars:
+            raise ValueError(f"expected one of {chars!r} in JSON data, got {char or 'the end of the file'!r}")
+        self.pos += 1
+        return char
+
+    def _skip_string(self):
+        # pos is on the opening quote. str.find is several times faster than a regular expression on long strings
+        self.pos += 1
+        while True:
+            quote = self.buffer.find('"', self.pos)
+            if quote == -1:
+                # a run of backslashes at the end of the chunk may escape the first quote of the next one
+                self.pos = len(self.buffer.rstrip('\\'))
+                if not self._fill():
+                    raise ValueError('unterminated string in JSON data')
+                continue
+            backslash = quote
+            while backslash > 0 and self.buffer[backslash - 1] == '\\':
+                backslash -= 1
+            self.pos = quote + 1
+            # a quote after an odd number of backslashes is escaped
+            if (quote - backslash) % 2 == 0:
+                return
+
+    def skip_value(self):
+        char = self.next_char()
+        if char == '"':
+            self._skip_string()
+        elif char == '[' or char == '{':
+            depth = 0
+            while True:
+                match = _STRUCTURE.search(self.buffer, self.pos)
+                if match is None:
+                    self.pos = len(self.buffer)
+                    if not self._fill():
+                        raise ValueError('unterminated array or object in JSON data')
+                    continue
+                self.pos = match.start()
+                if match.group() == '"':
+                    self._skip_string()
+                    continue
+                self.pos += 1
+                depth += 1 if match.group() in '[{' else -1
+                if depth == 0:
+                    return
+        elif char:
+            # numbers, true, false and null
+            while True:
+                match = _SCALAR_END.search(self.buffer, self.pos)
+                if match is not None:
+                    self.pos = match.start()
+                    return
+                self.pos = len(self.buffer)
+                if not self._fill():
+                    return
+        else:
+            raise ValueError('unexpected end of JSON data')
+
+    def read_value(self):
+        self.next_char()
+        self.mark = self.pos
+        self.skip_value()
+        text = self.buffer[self.mark:self.pos]
+        self.mark = None
+        return json.loads(text)
+
+    def read_object(self, skip_keys: Sequence[str]) -> Dict:
+        """decodes the object starting at the next character, leaving out the values of skip_keys"""
+        record = {}
+        self.expect('{')
+        if self.next_char() == '}':
+            self.pos += 1
+            return record
+        while True:
+            key = self.read_value()
+            self.expect(':')
+            if key in skip_keys:
+                self.skip_value()
+            else:
+                record[key] = self.read_value()
+            if self.expect(',}') == '}':
+                return record
+
+
+def iter_records(path: str, skip_keys: Sequence[str] = SKIPPED_KEYS, chunk_size: int = CHUNK_SIZE) -> Iterator[Dict]:
+    """
+    Yields the objects of a JSON file holding an array of objects (like the GrappleMap nodes.json and
+    transitions.json) one at a time as the file is read, without the values of their skip_keys keys. Memory use is
+    bounded by the largest record that is kept, whatever the size of the file and the skipped values
+    """
+    with open(path, 'r') as file:
+        stream = _JsonStream(file, chunk_size)
+        stream.expect('[')
+        if stream.next_char() == ']':
+            return
+        while True:
+            yield stream.read_object(skip_keys)
+            if stream.expect(',]') == ']':
+                return
@@ -0,0 +1,136 @@
+import numpy as np
+from typing import Optional, Tuple
+from Graph.compiled_graph import CompiledGraph, WINNER_TOP
+from Graph.graph_cache import CACHE_DIR, cached_artifact, save_npz
+
+# outcomes of RetrogradeTable.outcome, for the player to move
+FORCED_LOSS, UNKNOWN, FORCED_WIN = -1, 0, 1
+# best move of a state whose player has no legal move and passes
+PASS = -1
+
+
+class RetrogradeTable:
+    """
+    Forced results of every state node*2 + is_top, from the point of view of the player to move:
+
+        outcome: FORCED_WIN if they can force a tap or winning position whatever the other player does, FORCED_LOSS if
+            the other player can, UNKNOWN otherwise
+        plies: number of turns, counting both players', until the forced result at the latest under best play (the
+            winner hurries, the loser delays), 0 for unknown states
+        best_move: an edge index achieving it, PASS for a player without legal moves, -1 for unknown states
+
+    A forced win in k of the mover's own moves takes 2k - 1 plies. Points play no part: the results hold whenever at
+    least `plies` turns are left. Positions without outgoing edges restart the game at random and are never forced
+    """
+    def __init__(self, outcome: np.ndarray, plies: np.ndarray, best_move: np.ndarray):
+        self.outcome = outcome
+        self.plies = plies
+        self.best_move = best_move
+
+    @property
+    def num_states(self) -> int:
+        return len(self.outcome)
+
+    def lookup(self, node: int, is_top: bool) -> Tuple[int, int]:
+        """(outcome, plies) of the player to move"""
+        state = node * 2 + is_top
+        return int(self.outcome[state]), int(self.plies[state])
+
+    def forced_win_in(self, node: int, is_top: bool) -> Optional[int]:
+        """number of their own moves the player to move needs to force a win, or None if they can't"""
+        outcome, plies = self.lookup(node, is_top)
+        return (plies + 1) // 2 if outcome == FORCED_WIN else None
+
+    def forced_move(self, node: int, is_top: bool, turns_left: int) -> Optional[int]:
+        """the best move of the player to move if their result is forced within turns_left turns, None otherwise"""
+        state = node * 2 + is_top
+        if self.outcome[state] == UNKNOWN or self.plies[state] > turns_left or self.best_move[state] < 0:
+            return None
+        return int(self.best_move[state])
+
+    def save(self, path: str):
+        save_npz(path, outcome=self.outcome, plies=self.plies, best_move=self.best_move)
+
+    @classmethod
+    def load(cls, path: str) -> 'RetrogradeTable':
+        with np.load(path) as arrays:
+            return cls(arrays['outcome'], arrays['plies'], arrays['best_move'])
+
+
+def _incoming(reverse_offsets: np.ndarray, states: np.ndarray) -> np.ndarray:
+    """indices into the reversed CSR arrays of every move leading into the given states"""
+    starts, ends = reverse_offsets[states], reverse_offsets[states + 1]
+    counts = ends - starts
+    return np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+
+
+def solve_retrograde(compiled: CompiledGraph, max_plies: Optional[int] = None) -> RetrogradeTable:
+    """
+    Labels forced wins and losses by retrograde analysis, backwards from the taps and winning positions.
+
+    A state is won in 1 ply if a legal move wins on the spot and lost in 1 ply if every legal move loses on the spot.
+    Every other move (or the pass of a player without legal moves) leads to the next mover's state, and those moves
+    are indexed by the state they lead to in a reversed CSR. Labels then spread one ply at a time: a state with a move
+    into a state lost in d plies is won in d + 1, and a state all of whose moves lead to won states (or lose on the
+    spot) is lost in d + 1 plies, d being the longest of them. Stops when nothing changes, or after max_plies
+    """
+    legal_moves = compiled.legal_moves
+    num_states = legal_moves.num_states
+    states = np.repeat(np.arange(num_states), legal_moves.counts)
+    edges = legal_moves.edges.astype(np.int64)
+    tops = states % 2 == 1
+    node_winner = compiled.winner[compiled.targets[edges]]
+    wins = ~compiled.tap[edges] & (node_winner != 0) & ((node_winner == WINNER_TOP) == tops)
+    losses = compiled.tap[edges] | ((node_winner != 0) & ~wins)
+
+    # moves that don't end the game, plus the passes of players without legal moves on nodes with outgoing edges
+    out_degree = np.diff(compiled.offsets)
+    passing = np.flatnonzero((legal_moves.counts == 0) & (out_degree[np.arange(num_states) // 2] > 0))
+    ongoing = ~wins & ~losses
+    parents = np.concatenate([states[ongoing], passing])
+    children = np.concatenate([compiled.targets[edges[ongoing]] * 2 + (tops[ongoing] == compiled.swaps[edges[ongoing]]),
+                               passing ^ 1])
+    move_edges = np.concatenate([edges[ongoing], np.full(len(passing), PASS)])
+    order = np.argsort(children, kind='stable')
+    reverse_parents, reverse_edges = parents[order], move_edges[order]
+    reverse_offsets = np.concatenate([[0], np.cumsum(np.bincount(children, minlength=num_states))])
+    remaining = np.bincount(parents, minlength=num_states)
+
+    outcome = np.zeros(num_states, dtype=np.int8)
+    plies = np.zeros(num_states, dtype=np.int16)
+    best_move = np.full(num_states, -1, dtype=np.int32)
+    won_states, first_wins = np.unique(states[wins], return_index=True)
+    lost_states = np.flatnonzero((legal_moves.counts > 0) & (remaining == 0) & ~np.isin(np.arange(num_states),
+                                                                                        won_states))
+    outcome[won_states], plies[won_states], best_move[won_states] = FORCED_WIN, 1, edges[wins][first_wins]
+    outcome[lost_states], plies[lost_states] = FORCED_LOSS, 1
+    best_move[lost_states] = legal_moves.edges[legal_moves.offsets[lost_states]]
+
+    depth = 1
+    frontier = np.concatenate([won_states, lost_states])
+    while len(frontier) and (max_plies is None or depth < max_plies):
+        incoming = _incoming(reverse_offsets, frontier)
+        frontier_outcome = np.repeat(outcome[frontier], np.diff(reverse_offsets)[frontier])
+        incoming_parents, incoming_edges = reverse_parents[incoming], reverse_edges[incoming]
+
+        # a move into a lost state wins
+        into_loss = (frontier_outcome == FORCED_LOSS) & (outcome[incoming_parents] == UNKNOWN)
+        new_wins, first = np.unique(incoming_parents[into_loss], return_index=True)
+        outcome[new_wins], plies[new_wins], best_move[new_wins] = FORCED_WIN, depth + 1, incoming_edges[into_loss][first]
+
+        # a state loses once its last move into a won state is found, which is then its longest defence
+        into_win = (frontier_outcome == FORCED_WIN) & (outcome[incoming_parents] == UNKNOWN)
+        np.subtract.at(remaining, incoming_parents[into_win], 1)
+        exhausted = into_win & (remaining[incoming_parents] == 0)
+        new_losses, first = np.unique(incoming_parents[exhausted], return_index=True)
+        outcome[new_losses], plies[new_losses] = FORCED_LOSS, depth + 1
+        best_move[new_losses] = incoming_edges[exhausted][first]
+
+        frontier = np.concatenate([new_wins, new_losses])
+        depth += 1
+    return RetrogradeTable(outcome, plies, best_move)
+
+
+def get_retrograde_table(compiled: CompiledGraph, cache_dir: str = CACHE_DIR) -> RetrogradeTable:
+    """the retrograde table of a compiled graph, solved once and then loaded from the graph cache directory"""
+    return cached_artifact(compiled, 'retrograde', solve_retrograde, RetrogradeTable.load, cache_dir)
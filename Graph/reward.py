@@ -1,23 +1,33 @@
 import json
 
+WINSTATE_PATH = '/Users/afmorsi/dev/JJ_RL/Graph/files/terminal_node_winstate.json'
+
+# IBJJF points awarded for each maneuver flag that find_and_tag_all_moves adds to an edge
+MOVE_POINTS = {
+    'sweep': 2, 'mount': 4, 'back': 4,
+    'throw': 2, 'takedown': 2, 'pass': 3}
+
 
 def load_json(fpath):
     with open(fpath, 'r') as file:
         return json.load(file)
 
 
-def add_terminal_win_states(G, json_path='/Users/afmorsi/dev/JJ_RL/Graph/files/terminal_node_winstate.json'):
+def add_terminal_win_states(G, json_path=WINSTATE_PATH):
     """add annotations of which nodes are considered a win """
     with open(json_path, 'r') as file:
         terminal_win_nodes = json.load(file)
     for node_dict in terminal_win_nodes:
         G.nodes[node_dict['node']]['winner'] = node_dict['winner']
     return G
-def add_tap_flag(G):
-    """Marks that this move is a tap, telling game engine that this player lost"""
+def add_tap_flag(G, nodes=None):
+    """
+    Marks that this move is a tap, telling game engine that this player lost. nodes limits the pass to the outgoing
+    edges of those nodes
+    """
     # to do: 4 of the 'tap' transitions have properties that don't match the position
 
-    for node in G.nodes():
+    for node in (G.nodes() if nodes is None else nodes):
         # Get all outgoing edges
         out_edges = list(G.out_edges(node, data=True))
         # Check if there's only one outgoing edge and if its description is "tap"
@@ -29,28 +39,29 @@ def add_tap_flag(G):
 
     return G
 
-def flag_point_earning_move(G,move: str):
+def flag_point_earning_move(G,move: str, nodes=None):
     """
     Checks the 'tags' values of every transition in the graph for the inputted flag, then adds a new edge attribute with a boolean.
-    This is meant to be used to check for transitions that should earn points for the player who executed it
+    This is meant to be used to check for transitions that should earn points for the player who executed it. nodes
+    limits the check to the outgoing edges of those nodes
     """
     def is_move_in_tags(start,end, move=move, G=G) -> bool:
         # checks if flag is in any of the edge's tags
         tags = G.edges[start,end].get('tags')
         return any([move in tag for tag in tags])
 
-    for u, v in G.edges():
+    for u, v in (G.edges() if nodes is None else G.out_edges(nodes)):
         if is_move_in_tags(u,v):
             G.edges[u, v][move] = True
     return G
 
 
-def find_move_by_node_tags(G, position: str):
+def find_move_by_node_tags(G, position: str, nodes=None):
     """
     finds transitions from:
     node without <position> in tags --> node with <position> in tags
 
-    and then marks that transition with a new dict item
+    and then marks that transition with a new dict item. nodes limits the search to the transitions leaving those nodes
     """
     # to do: 3 of the mount transitions need to have their top/bottom tags switched
     def node_is_position(node: str,position=position ,G=G) -> bool:
@@ -58,7 +69,7 @@ def find_move_by_node_tags(G, position: str):
         tags = G.nodes[node].get('tags')
         return any([position in tag for tag in tags])
 
-    for node in G.nodes():
+    for node in (G.nodes() if nodes is None else nodes):
         # if this node does not have <position> in tags
         if not node_is_position(node):
             # Check all successors of the current node
@@ -70,26 +81,31 @@ def find_move_by_node_tags(G, position: str):
 
     return G
 
-def find_and_tag_all_moves(G):
+# edge attributes added by find_and_tag_all_moves
+MOVE_FLAGS = ('sweep', 'mount', 'back', 'throw', 'takedown', 'pass')
+
+
+def find_and_tag_all_moves(G, nodes=None):
+    """flags every point-earning move, or only the moves leaving `nodes`"""
     # sweeps
-    G = flag_point_earning_move(G, 'sweep')
+    G = flag_point_earning_move(G, 'sweep', nodes=nodes)
     # mounts
-    G = find_move_by_node_tags(G, 'mount')
+    G = find_move_by_node_tags(G, 'mount', nodes=nodes)
     # backtakes
-    G = find_move_by_node_tags(G, 'back')
+    G = find_move_by_node_tags(G, 'back', nodes=nodes)
     # takedowns: note that both of these describe the same point earning move
-    G = flag_point_earning_move(G, 'throw')
-    G = flag_point_earning_move(G, 'takedown')
+    G = flag_point_earning_move(G, 'throw', nodes=nodes)
+    G = flag_point_earning_move(G, 'takedown', nodes=nodes)
     # guard passes
-    G = flag_point_earning_move(G, 'pass')
+    G = flag_point_earning_move(G, 'pass', nodes=nodes)
     # knee on belly
     # to do
     return G
 
-def add_rewards_to_graph(G):
+def add_rewards_to_graph(G, winstate_path=WINSTATE_PATH):
     ## Identifying terminal game states
     # Flagging positions where one player has won. This identified checkmates positions to terminate the game at
-    G = add_terminal_win_states(G)
+    G = add_terminal_win_states(G, json_path=winstate_path)
     # Identifying moves where one player submits and flagging it
     G = add_tap_flag(G)
 
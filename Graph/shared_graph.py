@@ -0,0 +1,63 @@
+import sys
+import numpy as np
+from multiprocessing import shared_memory
+from typing import Dict, NamedTuple, Tuple
+from Graph.compiled_graph import CompiledGraph
+from Graph.graph_cache import CACHED_ARRAYS
+
+ALIGNMENT = 64
+
+
+class SharedGraphHandle(NamedTuple):
+    """picklable description of a compiled graph placed in shared memory, passed to worker processes"""
+    shm_name: str
+    layout: Tuple[Tuple[str, str, Tuple[int, ...], int], ...]  # (array name, dtype, shape, byte offset)
+    rewards: Dict[str, int]
+
+
+class SharedGraph:
+    """
+    Copies the arrays of a CompiledGraph into one multiprocessing.shared_memory block, so worker processes can attach
+    to the same board without pickling or rebuilding it. The creating process owns the block and must call close()
+    (or use it as a context manager) to release it.
+    """
+    def __init__(self, compiled: CompiledGraph):
+        layout = []
+        size = 0
+        for name in CACHED_ARRAYS:
+            array = getattr(compiled, name)
+            layout.append((name, array.dtype.str, array.shape, size))
+            size += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+        self.shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        for name, dtype, shape, offset in layout:
+            np.ndarray(shape, dtype=dtype, buffer=self.shm.buf, offset=offset)[...] = getattr(compiled, name)
+        self.handle = SharedGraphHandle(self.shm.name, tuple(layout), dict(compiled.rewards))
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self) -> 'SharedGraph':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def attach_compiled_graph(handle: SharedGraphHandle) -> Tuple[CompiledGraph, shared_memory.SharedMemory]:
+    """
+    Builds a CompiledGraph whose arrays are read-only views of the shared memory block. Descriptions and the networkx
+    view are not shared, since workers don't narrate games. The SharedMemory object is returned as well and has to be
+    kept alive for as long as the graph is used
+    """
+    if sys.version_info >= (3, 13):
+        # only the creating process should unlink the block
+        shm = shared_memory.SharedMemory(name=handle.shm_name, track=False)
+    else:
+        shm = shared_memory.SharedMemory(name=handle.shm_name)
+    arrays = {name: np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)
+              for name, dtype, shape, offset in handle.layout}
+    num_nodes, num_edges = len(arrays['offsets']) - 1, len(arrays['targets'])
+    compiled = CompiledGraph(**arrays, rewards=handle.rewards,
+                             node_descriptions=[''] * num_nodes, edge_descriptions=[''] * num_edges)
+    return compiled, shm
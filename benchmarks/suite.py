@@ -0,0 +1,375 @@
+"""
+Benchmarks of the hot paths of the graph loader, game engine, gym env and Q-learning, with a JSON history of past runs
+to catch regressions.
+
+    python benchmarks/suite.py                     # run everything, append to the history and compare
+    python benchmarks/suite.py --only env_step     # run some of the benchmarks
+    python benchmarks/suite.py --no-save --scale 0.1
+
+Every repeat of a benchmark reseeds `random` and numpy's global RNG, so all repeats (and all runs) do the same work
+and their times only differ by noise. A benchmark regresses when its median time per operation is more than
+`threshold` slower than the median of the last `window` runs on the same machine and scale. The exit status is 1 if
+any did
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import ExitStack
+from dataclasses import dataclass, field, replace
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# the Game modules import each other as top-level modules, like in conftest.py
+for path in (ROOT, os.path.join(ROOT, 'Game')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+import numpy as np
+from Graph.graph_cache import load_graph
+from Graph.graph_constructor import NODES_PATH, TRANSITIONS_PATH
+from Graph.reward import WINSTATE_PATH
+from play_game import Board, Game, GameState
+from gym_env import BJJEnv, q_learning
+from batch_game import BatchGame
+from recorder import TrajectoryRecorder
+
+HISTORY_PATH = os.path.join(ROOT, 'benchmarks', 'results', 'history.json')
+SEED = 0
+REPEAT = 5
+THRESHOLD = 0.25
+WINDOW = 5
+
+
+@dataclass
+class BenchmarkContext:
+    """
+    What the benchmarks run on: the GrappleMap files, a board compiled from them and how much work to do. cache_dir
+    holds the graph cache and other scratch files; run_suite uses a temporary directory when it isn't set. Resources
+    a benchmark opens go on `resources`, which run_benchmark closes once the benchmark is done
+    """
+    nodes_path: str = NODES_PATH
+    transitions_path: str = TRANSITIONS_PATH
+    winstate_path: str = WINSTATE_PATH
+    scale: float = 1.0
+    cache_dir: Optional[str] = None
+    _board: Optional[Board] = None
+    resources: ExitStack = field(default_factory=ExitStack)
+
+    @property
+    def board(self) -> Board:
+        if self._board is None:
+            compiled, _ = load_graph(self.nodes_path, self.transitions_path, self.winstate_path,
+                                     cache_dir=self.cache_dir)
+            self._board = Board(compiled)
+        return self._board
+
+    def count(self, operations: int) -> int:
+        return max(1, int(operations * self.scale))
+
+
+# A benchmark sets up its inputs from the context and returns (run, operations): run does `operations` operations
+# once, and is timed once per repeat
+Benchmark = Callable[[BenchmarkContext], Tuple[Callable[[], Any], int]]
+BENCHMARKS: Dict[str, Tuple[str, Benchmark]] = {}
+
+
+def benchmark(name: str, unit: str):
+    """registers a benchmark under name; unit is what one of its operations is, e.g. 'game'"""
+    def register(function: Benchmark) -> Benchmark:
+        BENCHMARKS[name] = (unit, function)
+        return function
+    return register
+
+
+@benchmark('construct_graph_cold', 'build')
+def bench_construct_cold(context: BenchmarkContext):
+    # every build goes to an empty cache directory, so it parses, annotates, compiles and writes the graph
+    def run():
+        with tempfile.TemporaryDirectory(prefix='bjj_bench_') as cache_dir:
+            load_graph(context.nodes_path, context.transitions_path, context.winstate_path, cache_dir=cache_dir)
+    return run, 1
+
+
+@benchmark('construct_graph_warm', 'load')
+def bench_construct_warm(context: BenchmarkContext):
+    load_graph(context.nodes_path, context.transitions_path, context.winstate_path, cache_dir=context.cache_dir)
+    loads = context.count(20)
+
+    def run():
+        for _ in range(loads):
+            compiled, report = load_graph(context.nodes_path, context.transitions_path, context.winstate_path,
+                                          cache_dir=context.cache_dir)
+            assert report['cache_hit']
+    return run, loads
+
+
+@benchmark('get_possible_moves', 'call')
+def bench_get_possible_moves(context: BenchmarkContext):
+    board = context.board
+    calls = context.count(200_000)
+    rng = np.random.default_rng(SEED)
+    nodes = rng.integers(0, board.num_nodes, calls).tolist()
+    tops = (rng.random(calls) < 0.5).tolist()
+    game_state = GameState(board)
+
+    def run():
+        for node, top in zip(nodes, tops):
+            game_state.current_node = node
+            game_state.get_possible_moves(top, not top)
+    return run, calls
+
+
+def _games(context: BenchmarkContext, record: bool):
+    board = context.board
+    games = context.count(200)
+    recorder = _recorder(context, record)
+
+    def run():
+        for game_id in range(games):
+            game = Game('Benchmark', board=board, recorder=recorder, game_id=game_id)
+            game.initialize_game('Player1', 'Player2')
+            game.play_game()
+    return run, games
+
+
+def _batch_games(context: BenchmarkContext, record: bool):
+    graph = context.board.compiled
+    games = context.count(4096)
+    recorder = _recorder(context, record)
+
+    def run():
+        BatchGame(games, graph=graph, seed=SEED, recorder=recorder).play_random()
+    return run, games
+
+
+def _recorder(context: BenchmarkContext, record: bool) -> Optional[TrajectoryRecorder]:
+    """
+    an npz TrajectoryRecorder writing under the context's scratch directory, or None. It stays open across repeats,
+    so its chunks are written as they fill up, like in a long simulation, rather than once per run
+    """
+    if not record:
+        return None
+    path = context.resources.enter_context(tempfile.TemporaryDirectory(prefix='turns_', dir=context.cache_dir))
+    return context.resources.enter_context(TrajectoryRecorder(path, format='npz'))
+
+
+@benchmark('play_game', 'game')
+def bench_play_game(context: BenchmarkContext):
+    return _games(context, record=False)
+
+
+@benchmark('play_game_recorded', 'game')
+def bench_play_game_recorded(context: BenchmarkContext):
+    return _games(context, record=True)
+
+
+@benchmark('batch_game', 'game')
+def bench_batch_game(context: BenchmarkContext):
+    return _batch_games(context, record=False)
+
+
+@benchmark('batch_game_recorded', 'game')
+def bench_batch_game_recorded(context: BenchmarkContext):
+    return _batch_games(context, record=True)
+
+
+def _env_steps(context: BenchmarkContext, observation: str):
+    env = BJJEnv(board=context.board, observation=observation)
+    steps = context.count(20_000)
+
+    def run():
+        _, info = env.reset(seed=SEED)
+        for _ in range(steps):
+            legal = np.flatnonzero(info['action_mask'])
+            if len(legal) == 0:
+                _, info = env.reset()
+                continue
+            _, _, done, _, info = env.step(int(legal[np.random.randint(len(legal))]))
+            if done:
+                _, info = env.reset()
+    return run, steps
+
+
+@benchmark('env_step', 'step')
+def bench_env_step(context: BenchmarkContext):
+    return _env_steps(context, 'dict')
+
+
+@benchmark('env_step_flat', 'step')
+def bench_env_step_flat(context: BenchmarkContext):
+    return _env_steps(context, 'flat')
+
+
+@benchmark('env_reset', 'reset')
+def bench_env_reset(context: BenchmarkContext):
+    env = BJJEnv(board=context.board)
+    resets = context.count(20_000)
+
+    def run():
+        for _ in range(resets):
+            env.reset()
+    return run, resets
+
+
+@benchmark('q_learning', 'episode')
+def bench_q_learning(context: BenchmarkContext):
+    env = BJJEnv(board=context.board)
+    episodes = context.count(50)
+    return (lambda: q_learning(env, episodes)), episodes
+
+
+@dataclass
+class Measurement:
+    name: str
+    unit: str
+    operations: int
+    seconds: List[float]  # wall time of each repeat
+
+    @property
+    def median(self) -> float:
+        """median seconds per operation"""
+        return float(np.median(self.seconds)) / self.operations
+
+    @property
+    def best(self) -> float:
+        return min(self.seconds) / self.operations
+
+    @property
+    def rate(self) -> float:
+        """operations per second, at the median time"""
+        return 1 / self.median
+
+    def to_json(self) -> Dict[str, Any]:
+        return {'unit': self.unit, 'operations': self.operations, 'seconds': self.seconds, 'median': self.median,
+                'best': self.best, 'rate': self.rate}
+
+
+def seed_everything(seed: int = SEED):
+    random.seed(seed)
+    np.random.seed(seed)
+
+
+def run_benchmark(name: str, context: BenchmarkContext, repeat: int = REPEAT) -> Measurement:
+    unit, function = BENCHMARKS[name]
+    seed_everything()
+    with context.resources:
+        run, operations = function(context)
+        seconds = []
+        for _ in range(repeat):
+            seed_everything()
+            start = time.perf_counter()
+            run()
+            seconds.append(time.perf_counter() - start)
+    return Measurement(name, unit, operations, seconds)
+
+
+def run_suite(context: BenchmarkContext, names: Optional[Sequence[str]] = None,
+              repeat: int = REPEAT) -> Dict[str, Measurement]:
+    names = list(BENCHMARKS) if names is None else names
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        raise ValueError(f"unknown benchmarks {unknown}, expected some of {list(BENCHMARKS)}")
+    if context.cache_dir is None:
+        with tempfile.TemporaryDirectory(prefix='bjj_bench_') as cache_dir:
+            return run_suite(replace(context, cache_dir=cache_dir), names, repeat)
+    return {name: run_benchmark(name, context, repeat) for name in names}
+
+
+def machine_id() -> str:
+    """runs are only compared to runs of the same machine and Python"""
+    return f"{platform.node()}-{platform.machine()}-py{platform.python_version()}"
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def make_run(results: Dict[str, Measurement], scale: float = 1.0) -> Dict[str, Any]:
+    return {'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'), 'commit': git_commit(),
+            'machine': machine_id(), 'scale': scale,
+            'results': {name: measurement.to_json() for name, measurement in results.items()}}
+
+
+def load_history(path: str = HISTORY_PATH) -> List[Dict[str, Any]]:
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r') as file:
+        return json.load(file)
+
+
+def save_history(history: List[Dict[str, Any]], path: str = HISTORY_PATH):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as file:
+        json.dump(history, file, indent=2)
+
+
+def find_regressions(run: Dict[str, Any], history: List[Dict[str, Any]], threshold: float = THRESHOLD,
+                     window: int = WINDOW) -> List[Dict[str, Any]]:
+    """
+    Benchmarks of run whose median time per operation is more than threshold (0.25 = 25%) above the median of their
+    last `window` times in history, counting only runs on the same machine and at the same scale
+    """
+    regressions = []
+    previous = [past for past in history if past['machine'] == run['machine'] and past['scale'] == run['scale']]
+    for name, result in run['results'].items():
+        times = [past['results'][name]['median'] for past in previous if name in past['results']][-window:]
+        if not times:
+            continue
+        baseline = float(np.median(times))
+        slowdown = result['median'] / baseline - 1
+        if slowdown > threshold:
+            regressions.append({'name': name, 'baseline': baseline, 'median': result['median'], 'slowdown': slowdown})
+    return regressions
+
+
+def format_results(results: Dict[str, Measurement]) -> str:
+    lines = [f"{'benchmark':<24}{'median':>14}{'best':>14}{'rate':>18}"]
+    for name, measurement in results.items():
+        lines.append(f"{name:<24}{measurement.median * 1e6:>11.2f} us{measurement.best * 1e6:>11.2f} us"
+                     f"{measurement.rate:>12.1f} {measurement.unit}/s")
+    return '\n'.join(lines)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark the graph loader, game engine, gym env and Q-learning')
+    parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS), help='benchmarks to run (default: all)')
+    parser.add_argument('--repeat', type=int, default=REPEAT)
+    parser.add_argument('--scale', type=float, default=1.0, help='multiplies the operations of every benchmark')
+    parser.add_argument('--nodes', default=NODES_PATH)
+    parser.add_argument('--transitions', default=TRANSITIONS_PATH)
+    parser.add_argument('--winstate', default=WINSTATE_PATH)
+    parser.add_argument('--history', default=HISTORY_PATH)
+    parser.add_argument('--cache-dir', help='graph cache and scratch directory (default: a temporary one)')
+    parser.add_argument('--no-save', action='store_true', help="don't append this run to the history")
+    parser.add_argument('--threshold', type=float, default=THRESHOLD)
+    parser.add_argument('--window', type=int, default=WINDOW)
+    args = parser.parse_args(argv)
+
+    context = BenchmarkContext(args.nodes, args.transitions, args.winstate, scale=args.scale, cache_dir=args.cache_dir)
+    results = run_suite(context, args.only, repeat=args.repeat)
+    print(format_results(results))
+
+    history = load_history(args.history)
+    run = make_run(results, scale=args.scale)
+    regressions = find_regressions(run, history, args.threshold, args.window)
+    for regression in regressions:
+        print(f"REGRESSION {regression['name']}: {regression['median'] * 1e6:.2f} us per operation, "
+              f"{regression['slowdown']:.0%} slower than {regression['baseline'] * 1e6:.2f} us")
+    if not args.no_save:
+        save_history(history + [run], args.history)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
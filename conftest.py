@@ -0,0 +1,73 @@
+import json
+import os
+import sys
+import pytest
+
+# Game/ modules import their siblings directly (e.g. `from play_game import Game`), so both the repository root and
+# Game/ need to be importable when running the test suite
+ROOT = os.path.dirname(os.path.abspath(__file__))
+for path in (ROOT, os.path.join(ROOT, 'Game')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from Graph.graph_constructor import add_nodes, add_edges, refactor_incoming_and_outgoing
+from Graph.reward import add_terminal_win_states, add_tap_flag, find_and_tag_all_moves
+
+NUM_NODES = 100  # GameState.initialize always considers node 94, so test graphs need at least 95 nodes
+
+
+def _transition(trans_id, start, end, description, properties, tags, swap=False):
+    return {'id': trans_id, 'description': [description, 'line 2'], 'properties': properties, 'tags': tags,
+            'frames': ['frame code'], 'line_nr': trans_id,
+            'from': {'node': start, 'reo': {'swap_players': False, 'mirror': False}},
+            'to': {'node': end, 'reo': {'swap_players': swap, 'mirror': False}}}
+
+
+def grapplemap_records():
+    """
+    Small GrappleMap-shaped dataset covering every rule of the game: top/bottom moves, point-earning moves, a player
+    swap, a tap, a winning node, a dead end and a bidirectional transition. Returns (nodes, transitions, winstates)
+    """
+    tags = {0: ['standing'], 1: ['closed_guard'], 2: ['mount'], 3: ['back'], 4: ['armbar'], 5: ['back', 'rnc'],
+            6: ['turtle'], 7: ['side_control']}
+    nodes = [{'id': node, 'description': f'position\n{node}', 'tags': tags.get(node, ['filler']),
+              'position': 'position code', 'incoming': [], 'outgoing': []} for node in range(NUM_NODES)]
+    transitions = [
+        _transition(0, 0, 1, 'pull guard', ['bottom'], ['guard_pull']),
+        _transition(1, 0, 7, 'double leg', ['top'], ['takedown']),
+        _transition(2, 1, 7, 'guard pass', ['top'], ['pass']),
+        _transition(3, 1, 2, 'scissor sweep', ['bottom'], ['sweep'], swap=True),
+        _transition(4, 7, 2, 'step over', ['top'], ['mount_entry']),
+        _transition(5, 2, 3, 'take back', ['top'], ['back_take']),
+        _transition(6, 3, 5, 'sink choke', ['top'], ['choke']),
+        _transition(7, 7, 4, 'armbar setup', ['bottom'], ['armbar']),
+        _transition(8, 4, 0, 'tap', ['bottom'], ['tap']),
+        _transition(9, 7, 6, 'scramble', [], ['scramble']),
+        _transition(10, 3, 7, 'back escape', ['bottom', 'bidirectional'], ['escape']),
+    ]
+    # filler nodes all lead back to standing
+    transitions += [_transition(node + 3, node, 0, 'stand up', [], ['stand_up']) for node in range(8, NUM_NODES)]
+    winstates = [{'node': 5, 'winner': 'top'}]
+    return nodes, transitions, winstates
+
+
+@pytest.fixture
+def grapplemap_files(tmp_path):
+    """writes the test dataset to nodes.json, transitions.json and terminal_node_winstate.json"""
+    paths = {}
+    for name, records in zip(('nodes', 'transitions', 'winstate'), grapplemap_records()):
+        paths[name] = tmp_path / f'{name}.json'
+        paths[name].write_text(json.dumps(records))
+    return paths
+
+
+@pytest.fixture
+def annotated_graph(grapplemap_files):
+    """the test dataset run through the same passes as construct_graph"""
+    nodes, transitions, _ = grapplemap_records()
+    G = add_nodes(nodes)
+    G = add_edges(transitions, G)
+    G = refactor_incoming_and_outgoing(G)
+    G = add_terminal_win_states(G, json_path=str(grapplemap_files['winstate']))
+    G = add_tap_flag(G)
+    return find_and_tag_all_moves(G)
@@ -0,0 +1,19 @@
+"""Helpers shared by the test modules of tests/ and Game/tests/"""
+import numpy as np
+
+
+def random_positions(count, seed=0, shape=(2, 23, 3)):
+    """count random positions: two players of 23 joints in 3D, or those 46 joints flat with shape=(46, 3)"""
+    rng = np.random.default_rng(seed)
+    return rng.uniform(-1, 1, size=(count, *shape))
+
+
+def rotate_on_mat(coords, angle, offset):
+    """coords turned about the vertical axis and moved along the mat, which keeps the heads as far apart"""
+    rotation = np.array([[np.cos(angle), 0, -np.sin(angle)], [0, 1, 0], [np.sin(angle), 0, np.cos(angle)]])
+    return coords @ rotation.T + offset
+
+
+def edge_between(compiled, source, target):
+    """the edge of a compiled test graph from source to target"""
+    return next(edge for edge in compiled.out_edges(source) if compiled.targets[edge] == target)
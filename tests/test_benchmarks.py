@@ -0,0 +1,36 @@
+from benchmarks.suite import (BENCHMARKS, BenchmarkContext, find_regressions, load_history, main, make_run,
+                              run_suite, save_history)
+
+
+def test_suite_runs_every_benchmark(grapplemap_files, tmp_path):
+    context = BenchmarkContext(str(grapplemap_files['nodes']), str(grapplemap_files['transitions']),
+                               str(grapplemap_files['winstate']), scale=0.01, cache_dir=str(tmp_path / 'cache'))
+    results = run_suite(context, repeat=2)
+    assert list(results) == list(BENCHMARKS)
+    for measurement in results.values():
+        assert len(measurement.seconds) == 2
+        assert 0 < measurement.best <= measurement.median and measurement.rate > 0
+
+
+def test_history_and_regressions(grapplemap_files, tmp_path):
+    history_path = str(tmp_path / 'results' / 'history.json')
+    args = ['--nodes', str(grapplemap_files['nodes']), '--transitions', str(grapplemap_files['transitions']),
+            '--winstate', str(grapplemap_files['winstate']), '--history', history_path,
+            '--cache-dir', str(tmp_path / 'cache'),
+            '--only', 'get_possible_moves', '--scale', '0.01', '--repeat', '1']
+    main(args)
+    main(args + ['--no-save'])
+    history = load_history(history_path)
+    assert len(history) == 1 and list(history[0]['results']) == ['get_possible_moves']
+
+    run = make_run({})
+    run['results'] = {'play_game': {'median': 1.3}, 'env_step': {'median': 1.1}, 'q_learning': {'median': 9.0}}
+    past = [dict(run, results={'play_game': {'median': median}, 'env_step': {'median': 1.0}}) for median in (1, 1, 2)]
+    other_machine = dict(run, machine='elsewhere', results={'env_step': {'median': 0.1}})
+    regressions = find_regressions(run, past + [other_machine], threshold=0.25)
+    # play_game is 30% over its median of 1, env_step 10% over, and q_learning has no history
+    assert [regression['name'] for regression in regressions] == ['play_game']
+    assert find_regressions(run, past, threshold=0.25, window=1) == []
+
+    save_history(past, history_path)
+    assert load_history(history_path) == past
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+from Graph.compiled_graph import compile_graph, WINNER_TOP, WINNER_NONE
+
+
+def test_csr_matches_outgoing(annotated_graph):
+    compiled = compile_graph(annotated_graph)
+    assert compiled.num_nodes == annotated_graph.number_of_nodes()
+    assert compiled.num_edges == annotated_graph.number_of_edges()
+    for node in annotated_graph.nodes():
+        outgoing = annotated_graph.nodes[node]['outgoing']
+        edges = compiled.out_edges(node)
+        assert [compiled.targets[edge] for edge in edges] == [move['to'] for move in outgoing]
+        assert [compiled.top[edge] for edge in edges] == [move['top'] for move in outgoing]
+        assert [compiled.bottom[edge] for edge in edges] == [move['bottom'] for move in outgoing]
+        assert all(compiled.sources[edge] == node for edge in edges)
+
+
+def test_flags_and_points(annotated_graph):
+    compiled = compile_graph(annotated_graph)
+    edge = {compiled.edge_endpoints(index): index for index in range(compiled.num_edges)}
+    # sweep into mount
+    assert compiled.points[edge[1, 2]] == 2 + 4
+    assert compiled.swaps[edge[1, 2]]
+    assert sorted(compiled.edge_maneuvers(edge[1, 2])) == ['mount', 'sweep']
+    assert compiled.points[edge[1, 7]] == 3
+    assert compiled.tap[edge[4, 0]]
+    assert compiled.tap.sum() == 1
+    assert compiled.winner[5] == WINNER_TOP and compiled.winner_name(5) == 'top'
+    assert compiled.winner[0] == WINNER_NONE and compiled.winner_name(0) is None
+
+
+def test_snapshot_is_immutable(annotated_graph):
+    compiled = compile_graph(annotated_graph)
+    for array in compiled.arrays().values():
+        with pytest.raises(ValueError):
+            array[...] = 0
+
+
+def test_rejects_non_contiguous_node_ids(annotated_graph):
+    annotated_graph.remove_node(50)
+    with pytest.raises(ValueError):
+        compile_graph(annotated_graph)
+
+
+def test_legal_move_index(annotated_graph):
+    compiled = compile_graph(annotated_graph)
+    legal_moves = compiled.legal_moves
+    for node in range(compiled.num_nodes):
+        for is_top in (False, True):
+            expected = [edge for edge in compiled.out_edges(node)
+                        if not (compiled.bottom[edge] if is_top else compiled.top[edge])]
+            state = legal_moves.state(node, is_top)
+            assert list(legal_moves.get(node, is_top)) == expected
+            assert legal_moves.edges[legal_moves.offsets[state]:legal_moves.offsets[state + 1]].tolist() == expected
+            assert np.flatnonzero(legal_moves.masks[state]).tolist() == expected
+            padded = legal_moves.padded[state]
+            assert padded[:len(expected)].tolist() == expected and (padded[len(expected):] == -1).all()
+    assert compiled.legal_moves is legal_moves
@@ -0,0 +1,59 @@
+import json
+import numpy as np
+import pytest
+from Graph.depracated.decode import (BASE62_DIGITS, ENCODED_POS_SIZE, PLAYER_JOINTS, build_position_cache,
+                                     decode_position, decode_positions, load_position_cache)
+
+
+def _random_codes(count, seed=0):
+    rng = np.random.default_rng(seed)
+    return [''.join(rng.choice(list(BASE62_DIGITS), size=ENCODED_POS_SIZE)) for _ in range(count)]
+
+
+def _wrap(code):
+    # the line breaks and indentation of the GrappleMap export
+    return ''.join(f'    {code[start:start + 69]}\n' for start in range(0, len(code), 69))
+
+
+def test_decode_positions_matches_decode_position():
+    codes = _random_codes(20)
+    joints = decode_positions(codes)
+    assert joints.shape == (20, 2, 23, 3) and joints.dtype == np.float32
+    for code, decoded in zip(codes, joints):
+        position = decode_position(code)
+        expected = np.array([position[joint] for joint in PLAYER_JOINTS]).reshape(2, 23, 3)
+        assert np.allclose(decoded, expected, atol=1e-6)
+    assert np.array_equal(decode_positions([_wrap(code) for code in codes]), joints)
+    assert decode_positions([]).shape == (0, 2, 23, 3)
+
+
+def test_decode_positions_rejects_bad_codes():
+    code = _random_codes(1)[0]
+    with pytest.raises(ValueError, match='base 62'):
+        decode_positions([code[:-1] + '!'])
+    with pytest.raises(ValueError, match='code 1'):
+        decode_positions([code, code[:-2]])
+    # the extra digits of one code make up for the missing ones of the next
+    with pytest.raises(ValueError, match='code 0'):
+        decode_positions([code + 'ab', code[:-2]])
+    with pytest.raises(ValueError, match='code 2'):
+        decode_positions([code, code, ''])
+
+
+def test_position_cache(tmp_path):
+    codes = _random_codes(7, seed=1)
+    nodes = [{'id': 3, 'description': 'a', 'position': _wrap(codes[0])},
+             {'id': 5, 'description': 'b', 'position': _wrap(codes[1])}]
+    transitions = [{'id': 0, 'frames': [_wrap(code) for code in codes[2:5]]},
+                   {'id': 1, 'frames': [_wrap(code) for code in codes[5:]]}]
+    (tmp_path / 'nodes.json').write_text(json.dumps(nodes))
+    (tmp_path / 'transitions.json').write_text(json.dumps(transitions))
+    build_position_cache(str(tmp_path / 'nodes.json'), str(tmp_path / 'transitions.json'), str(tmp_path / 'cache'),
+                         batch_size=2)
+
+    cache = load_position_cache(str(tmp_path / 'cache'))
+    assert isinstance(cache['frames'], np.memmap)
+    assert cache['node_ids'].tolist() == [3, 5] and cache['transition_ids'].tolist() == [0, 1]
+    assert cache['frame_offsets'].tolist() == [0, 3, 5]
+    assert np.array_equal(cache['positions'], decode_positions(codes[:2]))
+    assert np.array_equal(cache['frames'], decode_positions(codes[2:]))
@@ -0,0 +1,40 @@
+import networkx as nx
+import numpy as np
+from Graph.compiled_graph import compile_graph
+from Graph.distances import all_pairs_distances, build_distance_index, get_distance_index
+
+
+def test_matches_networkx_bfs(annotated_graph):
+    compiled = compile_graph(annotated_graph)
+    distances = all_pairs_distances(compiled)
+    for source, lengths in nx.all_pairs_shortest_path_length(annotated_graph):
+        expected = np.full(compiled.num_nodes, -1)
+        expected[list(lengths)] = list(lengths.values())
+        np.testing.assert_array_equal(distances[source], expected)
+
+
+def test_tag_and_terminal_distances(annotated_graph):
+    index = build_distance_index(compile_graph(annotated_graph))
+    assert index.distances.dtype == np.uint8
+    # standing -> pull guard -> closed guard -> scissor sweep -> mount
+    assert index.distance(0, 2) == 2
+    assert index.distance_to_tag(0, 'mount') == 2
+    # 'back' matches both the back and the rear naked choke
+    assert index.distance_to_tag(2, 'back') == 1
+    assert index.to_tag('rnc')[2] == 2
+    # the tap is played from the armbar, reached by the armbar setup from side control
+    assert index.tap_distance[7] == 2
+    assert index.winner_distance[3] == 1
+    # nothing leads out of the choke
+    assert index.distance(5, 0) == index.unreachable
+    assert index.tap_distance[5] == index.unreachable
+
+
+def test_cached_on_disk(annotated_graph, tmp_path):
+    compiled = compile_graph(annotated_graph)
+    index = get_distance_index(compiled, cache_dir=str(tmp_path))
+    cached = get_distance_index(compiled, cache_dir=str(tmp_path))
+    assert len(list(tmp_path.glob('distances-*.npz'))) == 1
+    assert cached.tags == index.tags
+    np.testing.assert_array_equal(cached.distances, index.distances)
+    np.testing.assert_array_equal(cached.tag_distances, index.tag_distances)
@@ -0,0 +1,52 @@
+import json
+import numpy as np
+from Graph.graph_cache import get_compiled_graph, get_load_report, load_graph, save_npz
+from Graph.reward import MOVE_POINTS
+
+
+def _load(files, cache_dir, rewards=MOVE_POINTS):
+    return load_graph(nodes_path=str(files['nodes']), transitions_path=str(files['transitions']),
+                      winstate_path=str(files['winstate']), rewards=rewards, cache_dir=str(cache_dir))
+
+
+def test_cache_round_trip(grapplemap_files, tmp_path):
+    built, report = _load(grapplemap_files, tmp_path / 'cache')
+    assert not report['cache_hit']
+    cached, report = _load(grapplemap_files, tmp_path / 'cache')
+    assert report['cache_hit']
+    for name, array in built.arrays().items():
+        np.testing.assert_array_equal(array, cached.arrays()[name])
+    assert cached.edge_descriptions == built.edge_descriptions
+    assert cached.rewards == built.rewards
+    # the networkx view is rebuilt lazily with the same annotations and edge order
+    assert list(cached.graph.edges(data=True)) == list(built.graph.edges(data=True))
+
+
+def test_cache_invalidated_by_inputs(grapplemap_files, tmp_path):
+    _, first = _load(grapplemap_files, tmp_path / 'cache')
+    _, other_rewards = _load(grapplemap_files, tmp_path / 'cache', rewards={**MOVE_POINTS, 'sweep': 3})
+    assert not other_rewards['cache_hit'] and other_rewards['key'] != first['key']
+
+    grapplemap_files['winstate'].write_text(json.dumps([{'node': 5, 'winner': 'bottom'}]))
+    compiled, edited = _load(grapplemap_files, tmp_path / 'cache')
+    assert not edited['cache_hit'] and edited['key'] != first['key']
+    assert compiled.winner_name(5) == 'bottom'
+
+
+def test_compiled_graph_loaded_once_and_quietly(grapplemap_files, tmp_path, capsys):
+    paths = dict(nodes_path=str(grapplemap_files['nodes']), transitions_path=str(grapplemap_files['transitions']),
+                 winstate_path=str(grapplemap_files['winstate']), cache_dir=str(tmp_path / 'cache'))
+    compiled = get_compiled_graph(**paths)
+    assert get_compiled_graph(**paths) is compiled
+    assert capsys.readouterr().out == ''
+    report = get_load_report(**paths)
+    assert not report['cache_hit'] and report['cache_path'].startswith(paths['cache_dir'])
+
+
+def test_save_npz_replaces_atomically(tmp_path):
+    path = tmp_path / 'artifacts' / 'table.npz'
+    save_npz(str(path), values=np.arange(3))
+    save_npz(str(path), values=np.arange(5))
+    with np.load(path) as data:
+        assert data['values'].tolist() == [0, 1, 2, 3, 4]
+    assert [file.name for file in path.parent.iterdir()] == ['table.npz']
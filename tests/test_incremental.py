@@ -0,0 +1,87 @@
+import json
+import numpy as np
+import pytest
+from Graph.compiled_graph import compile_graph
+from Graph.graph_cache import load_graph
+from Graph.graph_constructor import construct_graph
+
+
+def _load(files, cache_dir, incremental=False):
+    return load_graph(nodes_path=str(files['nodes']), transitions_path=str(files['transitions']),
+                      winstate_path=str(files['winstate']), cache_dir=str(cache_dir), incremental=incremental)
+
+
+def _edit_transitions(transitions):
+    # retag a transition, turn the scramble bidirectional, drop the double leg and add a new sweep
+    transitions[4]['tags'] = ['mount_entry', 'sweep']
+    transitions[9]['properties'] = ['bidirectional']
+    del transitions[1]
+    transitions.append({**transitions[0], 'id': 500, 'description': ['hip bump', 'line 2'], 'tags': ['sweep'],
+                        'properties': ['bottom'], 'from': {'node': 1, 'reo': {'swap_players': False, 'mirror': False}},
+                        'to': {'node': 2, 'reo': {'swap_players': True, 'mirror': False}}})
+
+
+def _edit_nodes(nodes):
+    # side control becomes a mount variation, and a filler node becomes a back position
+    nodes[7]['tags'] = ['side_control', 'mount']
+    nodes[20]['tags'] = ['back']
+    nodes[20]['description'] = 'new\nback position'
+
+
+@pytest.mark.parametrize('edit', ['transitions', 'nodes', 'winstate', 'all'])
+def test_matches_full_build(grapplemap_files, tmp_path, edit):
+    _, first = _load(grapplemap_files, tmp_path / 'cache', incremental=True)
+    assert first['base_key'] is None
+
+    if edit in ('transitions', 'all'):
+        transitions = json.loads(grapplemap_files['transitions'].read_text())
+        _edit_transitions(transitions)
+        grapplemap_files['transitions'].write_text(json.dumps(transitions))
+    if edit in ('nodes', 'all'):
+        nodes = json.loads(grapplemap_files['nodes'].read_text())
+        _edit_nodes(nodes)
+        grapplemap_files['nodes'].write_text(json.dumps(nodes))
+    if edit in ('winstate', 'all'):
+        grapplemap_files['winstate'].write_text(json.dumps([{'node': 5, 'winner': 'top'}, {'node': 6, 'winner': 'bottom'}]))
+
+    updated, report = _load(grapplemap_files, tmp_path / 'cache', incremental=True)
+    assert not report['cache_hit'] and report['base_key'] == first['key']
+    full = construct_graph(nodes_path=str(grapplemap_files['nodes']),
+                           transitions_path=str(grapplemap_files['transitions']),
+                           winstate_path=str(grapplemap_files['winstate']))
+    expected = compile_graph(full)
+    for name, array in expected.arrays().items():
+        np.testing.assert_array_equal(updated.arrays()[name], array, err_msg=name)
+    assert updated.node_descriptions == expected.node_descriptions
+    assert updated.edge_descriptions == expected.edge_descriptions
+    assert list(updated.graph.nodes(data=True)) == list(full.nodes(data=True))
+    assert list(updated.graph.edges(data=True)) == list(full.edges(data=True))
+
+    # the updated snapshot is cached under its own key
+    _, again = _load(grapplemap_files, tmp_path / 'cache', incremental=True)
+    assert again['cache_hit']
+
+
+def test_added_nodes_need_full_build(grapplemap_files, tmp_path):
+    _load(grapplemap_files, tmp_path / 'cache', incremental=True)
+    nodes = json.loads(grapplemap_files['nodes'].read_text())
+    nodes.append({**nodes[-1], 'id': len(nodes)})
+    grapplemap_files['nodes'].write_text(json.dumps(nodes))
+    compiled, report = _load(grapplemap_files, tmp_path / 'cache', incremental=True)
+    assert report['base_key'] is None
+    assert compiled.num_nodes == len(nodes)
+
+
+def test_plain_loads_store_no_records(grapplemap_files, tmp_path, monkeypatch):
+    def fail(*args):
+        raise AssertionError('source records computed by a plain load')
+
+    monkeypatch.setattr('Graph.graph_cache.source_records', fail)
+    _, first = _load(grapplemap_files, tmp_path / 'cache')
+    metadata = json.loads((tmp_path / 'cache' / first['key'] / 'metadata.json').read_text())
+    assert 'records' not in metadata
+
+    monkeypatch.undo()
+    grapplemap_files['winstate'].write_text(json.dumps([{'node': 6, 'winner': 'bottom'}]))
+    _, report = _load(grapplemap_files, tmp_path / 'cache', incremental=True)
+    assert not report['cache_hit'] and report['base_key'] is None
@@ -0,0 +1,46 @@
+import json
+import numpy as np
+import pytest
+from Graph.graph_cache import load_graph
+from Graph.graph_constructor import construct_graph
+from Graph.json_stream import iter_records
+
+# escaped quotes and backslashes, nested values with brackets inside strings, and every kind of scalar
+RECORDS = [{'id': 0, 'description': 'say "tap"\\', 'frames': ['\\"]', [1, {'b': ']}'}]], 'position': -1.5e3,
+            'from': {'node': 3, 'reo': {'swap_players': True}}, 'tags': [None, False, 'é']},
+           {},
+           {'id': 2, 'frames': [], 'description': '\\\\'}]
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 5, 64])
+def test_iter_records_matches_json_load(tmp_path, chunk_size):
+    path = tmp_path / 'records.json'
+    path.write_text(json.dumps(RECORDS, indent=2))
+    assert list(iter_records(str(path), skip_keys=(), chunk_size=chunk_size)) == RECORDS
+    skipped = [{key: value for key, value in record.items() if key not in ('frames', 'position')} for record in RECORDS]
+    assert list(iter_records(str(path), chunk_size=chunk_size)) == skipped
+
+
+def test_iter_records_empty_and_truncated(tmp_path):
+    path = tmp_path / 'records.json'
+    path.write_text(' [ ] ')
+    assert list(iter_records(str(path))) == []
+    path.write_text(json.dumps(RECORDS)[:60])
+    with pytest.raises(ValueError):
+        list(iter_records(str(path), chunk_size=8))
+
+
+def test_streamed_graph_matches_json_load(grapplemap_files):
+    paths = [str(grapplemap_files[name]) for name in ('nodes', 'transitions', 'winstate')]
+    loaded, streamed = construct_graph(*paths), construct_graph(*paths, stream=True)
+    assert list(streamed.nodes(data=True)) == list(loaded.nodes(data=True))
+    assert list(streamed.edges(data=True)) == list(loaded.edges(data=True))
+
+
+def test_streamed_cache_miss_matches(grapplemap_files, tmp_path):
+    paths = {f'{name}_path': str(grapplemap_files[name]) for name in ('nodes', 'transitions', 'winstate')}
+    loaded, _ = load_graph(cache_dir=str(tmp_path / 'loaded'), **paths)
+    streamed, report = load_graph(cache_dir=str(tmp_path / 'streamed'), stream=True, **paths)
+    assert not report['cache_hit']
+    for name, array in loaded.arrays().items():
+        assert np.array_equal(getattr(streamed, name), array), name
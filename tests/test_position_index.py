@@ -0,0 +1,33 @@
+import numpy as np
+from Graph.depracated.position_index import PositionIndex
+from Graph.depracated.position_kernels import is_reoriented
+from tests.helpers import random_positions, rotate_on_mat
+
+
+def test_index_matches_linear_scan():
+    rng = np.random.default_rng(1)
+    positions = random_positions(60, seed=2)
+    # positions in every which way, some with their players swapped, and new ones
+    queries = [rotate_on_mat(positions[i], rng.uniform(0, 2 * np.pi), rng.uniform(-1, 1, 3) * [1, 0, 1])
+               for i in rng.integers(0, 60, 80)]
+    queries = [query[::-1] if i % 3 == 0 else query for i, query in enumerate(queries)]
+    queries += list(random_positions(40, seed=3))
+    queries = [queries[i] for i in rng.permutation(len(queries))]
+
+    index = PositionIndex(capacity=16)
+    scanned_keys, scanned = [], []
+    for key, coords in enumerate(positions):
+        index.add(key, coords)
+        scanned_keys.append(key)
+        scanned.append(coords)
+    for key, query in enumerate(queries, start=len(positions)):
+        expected = next((other_key for other_key, other in zip(scanned_keys, scanned) if is_reoriented(query, other)),
+                        None)
+        if expected is None:
+            scanned_keys.append(key)
+            scanned.append(query)
+        found, added = index.find_or_add(key, query)
+        assert found == (key if expected is None else expected)
+        assert added == (expected is None)
+    assert index.keys == scanned_keys
+    assert len(index) == 100
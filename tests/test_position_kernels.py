@@ -0,0 +1,84 @@
+import os
+import numpy as np
+import pytest
+from Graph.depracated.position_kernels import (head_to_head, is_reoriented, limb_vectors, mirrored,
+                                               pairwise_reoriented, procrustes_disparities, procrustes_disparity,
+                                               reoriented_to, swapped)
+from Graph.depracated import decode
+from tests.helpers import random_positions, rotate_on_mat
+
+# the kernels take the 46 joints of both players in one array
+FLAT = (46, 3)
+
+
+def test_variants():
+    a = random_positions(1, shape=FLAT)[0]
+    assert np.array_equal(swapped(a)[0], np.concatenate([a[23:], a[:23]]))
+    assert np.array_equal(mirrored(mirrored(a))[0], a)
+    # left and right toes trade places, the head stays
+    assert np.array_equal(mirrored(a)[0, 0], a[1] * [-1, 1, 1])
+    assert np.array_equal(mirrored(a)[0, 22], a[22] * [-1, 1, 1])
+    assert np.isclose(head_to_head(a)[0], np.sum((a[22] - a[45]) ** 2))
+    assert np.array_equal(limb_vectors(a)[0, 30], a[45] - a[30])
+    assert np.allclose(head_to_head(swapped(a)), head_to_head(a))
+
+
+def test_procrustes_disparity():
+    a, b = random_positions(2, shape=FLAT)
+    assert procrustes_disparity(a, rotate_on_mat(a, 1.0, [0.3, 0, -0.2]) * 1.5) < 1e-12
+    # reflections are allowed
+    assert procrustes_disparity(a, a * [-1, 1, 1]) < 1e-12
+    # the residual of the best rotation and scaling of standardized b onto standardized a
+    a0, b0 = a - a.mean(axis=0), b - b.mean(axis=0)
+    a0, b0 = a0 / np.linalg.norm(a0), b0 / np.linalg.norm(b0)
+    u, singular_values, vt = np.linalg.svd(b0.T @ a0)
+    fitted = b0 @ (u @ vt) * singular_values.sum()
+    assert np.isclose(procrustes_disparity(a, b), np.sum((a0 - fitted) ** 2))
+
+
+def test_is_reoriented():
+    a, b = random_positions(2, shape=FLAT)
+    assert is_reoriented(a, a + [0.01, 0, 0])
+    assert is_reoriented(a, rotate_on_mat(a, 2.0, [0.5, 0, 0.5]))
+    assert is_reoriented(a, swapped(rotate_on_mat(a, 2.0, [0.5, 0, 0.5])))
+    assert is_reoriented(a, rotate_on_mat(a, 2.0, 0) * [-1, 1, 1])
+    assert not is_reoriented(a, b)
+
+
+def test_batched_kernels_match_pairs():
+    rng = np.random.default_rng(1)
+    references = random_positions(30, seed=2, shape=FLAT)
+    queries = np.concatenate([[rotate_on_mat(references[i], rng.uniform(0, 2 * np.pi), [0.2, 0, 0.1])
+                               for i in range(0, 30, 3)], swapped(references[1:12:2]),
+                              random_positions(10, seed=3, shape=FLAT)])
+    expected = np.array([[is_reoriented(query, reference) for reference in references] for query in queries])
+    assert expected.sum() >= 16
+    assert np.array_equal(pairwise_reoriented(queries, references, pair_chunk=7), expected)
+    for query, row in zip(queries, expected):
+        assert np.array_equal(reoriented_to(query, references), row)
+    disparities = procrustes_disparities(queries[:4], references[:5])
+    assert disparities.shape == (4, 5)
+    assert np.allclose(disparities, [[procrustes_disparity(q, r) for r in references[:5]] for q in queries[:4]])
+
+
+def test_is_reoriented_matches_position_module(monkeypatch):
+    pytest.importorskip('pandas')
+    pytest.importorskip('scipy')
+    # position.py reads files/grapplemap_df.csv relative to the working directory when it is imported
+    monkeypatch.chdir(os.path.dirname(decode.__file__))
+    from Graph.depracated import position
+
+    rng = np.random.default_rng(4)
+    codes = [''.join(rng.choice(list(decode.BASE62_DIGITS), size=decode.ENCODED_POS_SIZE)) for _ in range(6)]
+    originals = [np.array(list(position.Position(code).coords.values())) for code in codes]
+    heads = np.isin(np.arange(46), [22, 45])[:, None]
+    pairs = []
+    for index, a in enumerate(originals):
+        pairs += [(a, a + [0.01, 0, 0]), (a, rotate_on_mat(a, rng.uniform(0, 2 * np.pi), [0.4, 0, -0.3])),
+                  (a, swapped(rotate_on_mat(a, 1.0, 0))[0]), (a, mirrored(a)[0]), (a, originals[index - 1])]
+        # the heads stay put, so procrustes decides: small jitters match and large ones do not
+        pairs += [(a, a + np.where(heads, 0, rng.normal(scale=scale, size=a.shape))) for scale in (0.02, 0.3)]
+    expected = [bool(position.is_reoriented(position.Position(list(a)), position.Position(list(b))))
+                for a, b in pairs]
+    assert 0 < sum(expected) < len(expected)
+    assert [is_reoriented(a, b) for a, b in pairs] == expected
@@ -0,0 +1,47 @@
+import numpy as np
+from Graph.compiled_graph import compile_graph
+from Graph.retrograde import FORCED_LOSS, FORCED_WIN, UNKNOWN, PASS, get_retrograde_table, solve_retrograde
+from solver import GameSolver
+
+
+def test_forced_sequences(annotated_graph):
+    compiled = compile_graph(annotated_graph)
+    table = solve_retrograde(compiled)
+    # on top of the back, the choke wins on the spot
+    assert table.lookup(3, True) == (FORCED_WIN, 1)
+    assert table.forced_win_in(3, True) == 1
+    assert table.forced_move(3, True, 1) == 5
+    # under the armbar, the only move is the tap
+    assert table.lookup(4, False) == (FORCED_LOSS, 1)
+    # on top of the armbar there is nothing to do but pass, after which the bottom player has to tap
+    assert table.lookup(4, True) == (FORCED_WIN, 2)
+    assert table.best_move[4 * 2 + 1] == PASS
+    assert table.forced_move(4, True, 2) is None
+    # from bottom side control, the scramble to a dead end restarts the game, so nothing is forced
+    assert table.lookup(7, False) == (UNKNOWN, 0)
+    assert table.forced_move(3, True, 0) is None
+
+    limited = solve_retrograde(compiled, max_plies=1)
+    assert limited.lookup(4, True) == (UNKNOWN, 0)
+
+
+def test_agrees_with_solver(annotated_graph):
+    compiled = compile_graph(annotated_graph)
+    table = solve_retrograde(compiled)
+    solver = GameSolver(compiled, max_turns=10, max_diff=40)
+    solver.solve()
+    forced = np.flatnonzero(table.outcome != UNKNOWN)
+    assert len(forced) > 0
+    for state in forced:
+        for diff in (-20, 0, 20):
+            # forced results hold whatever the points, as soon as there are enough turns left
+            assert solver.value(state // 2, state % 2 == 1, diff, int(table.plies[state])) == table.outcome[state]
+
+
+def test_cached_on_disk(annotated_graph, tmp_path):
+    compiled = compile_graph(annotated_graph)
+    table = get_retrograde_table(compiled, cache_dir=str(tmp_path))
+    assert len(list(tmp_path.glob('retrograde-*.npz'))) == 1
+    cached = get_retrograde_table(compiled, cache_dir=str(tmp_path))
+    for name in ('outcome', 'plies', 'best_move'):
+        np.testing.assert_array_equal(getattr(cached, name), getattr(table, name))